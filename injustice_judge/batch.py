@@ -0,0 +1,100 @@
+import numpy as np
+from .shanten import _calculate_shanten
+from .constants import TILES, TILE_INDEX
+from .shanten_store import to_wait_mask
+from .tables import DIGIT, suit_summary
+from typing import *
+
+# This file contains a batched version of the shanten calculation, for
+#   computing the shanten of a large number of hands at once.
+# It requires numpy, which is otherwise not a dependency of InjusticeJudge,
+#   so it isn't imported anywhere else. (numpy is a dev package in the
+#   Pipfile, so `pipenv install --dev` installs it.)
+#
+# Hands are passed in as an (N, 34) array of tile counts, where the columns
+#   are 1-9m, 1-9p, 1-9s, 1-7z (the same order as TILES in constants.py).
+# Each suit of each row is packed into the same key as in tables.py, and each
+#   distinct key is looked up once in `suit_summary`. The rest of the shanten
+#   calculation is then done with array operations over all rows.
+
+# the columns of the counts array for each suit
+SUIT_COLUMNS = ((0, 9), (9, 18), (18, 27), (27, 34))
+# multiplying a suit's counts by this packs it into a key
+PACK = np.array(DIGIT[1:], dtype=np.int64)
+
+def to_counts(hands: Iterable[Iterable[int]]) -> np.ndarray:
+    """Convert a list of hands (tuples of tile ids, red fives allowed) into an (N, 34) count array"""
+    hands = list(hands)
+    counts = np.zeros((len(hands), 34), dtype=np.int8)
+    for row, hand in enumerate(hands):
+        for tile in hand:
+            counts[row, TILE_INDEX[tile]] += 1
+    return counts
+
+def get_summaries(counts: np.ndarray) -> np.ndarray:
+    """Return an (N, 4, 9) array of `suit_summary` for every suit of every row"""
+    summaries = np.zeros((counts.shape[0], 4, 9), dtype=np.int64)
+    for suit, (start, end) in enumerate(SUIT_COLUMNS):
+        keys = counts[:, start:end].astype(np.int64) @ PACK[:end-start]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        table = np.array([suit_summary(int(key), suit == 3) for key in unique_keys], dtype=np.int64).reshape(-1, 9)
+        summaries[:, suit, :] = table[inverse.reshape(-1)]
+    return summaries
+
+def get_shanten_numbers(summaries: np.ndarray) -> np.ndarray:
+    """Vectorized version of `_calculate_shanten_number`, minus the tanki iishanten special case"""
+    totals = summaries.sum(axis=1)
+    floating, pair_floating = summaries[:, :, 1], summaries[:, :, 2]
+    groups_needed = (totals[:, 0] - 1) // 3
+
+    # same as get_shanten in get_hand_shanten
+    def get_shanten(total_floating: np.ndarray, pair_exists: bool) -> np.ndarray:
+        needs_pair = (not pair_exists) & (groups_needed > total_floating)
+        must_discard_taatsu = (groups_needed >= 3) & (total_floating <= 1)
+        return needs_pair.astype(np.int64) + must_discard_taatsu + (groups_needed + total_floating - 1) // 2
+
+    total_floating = floating.sum(axis=1)
+    shanten = get_shanten(total_floating, False)
+    extra_floating = (pair_floating - floating).min(axis=1)
+    has_pair_suit = extra_floating < 50
+    shanten = np.where(has_pair_suit, np.minimum(shanten, get_shanten(total_floating + extra_floating, True)), shanten)
+
+    # compare with chiitoitsu and kokushi shanten
+    num_tiles, num_pairs, useless_tiles, num_kokushi_tiles, has_pair = totals[:, 3], totals[:, 4], totals[:, 5], totals[:, 6], totals[:, 7]
+    chiitoitsu_shanten = np.maximum(useless_tiles, 7 - num_pairs - 1)
+    kokushi_shanten = np.where(has_pair > 0, 12, 13) - num_kokushi_tiles
+    return np.where(num_tiles == 13, np.minimum(shanten, np.minimum(chiitoitsu_shanten, kokushi_shanten)), shanten)
+
+@overload
+def calculate_shanten_batch(counts: np.ndarray, with_waits: Literal[False] = False) -> np.ndarray: ...
+@overload
+def calculate_shanten_batch(counts: np.ndarray, with_waits: Literal[True]) -> Tuple[np.ndarray, np.ndarray]: ...
+def calculate_shanten_batch(counts: np.ndarray, with_waits: bool = False) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Given an (N, 34) array of tile counts, return an array of the N shanten numbers,
+      where each is int(calculate_shanten(hand)[0]) for the corresponding hand.
+    If with_waits is True, also return an array of N 34-bit wait masks (see `to_wait_mask`),
+      which are nonzero only for tenpai and iishanten hands.
+    """
+    counts = np.asarray(counts)
+    assert counts.ndim == 2 and counts.shape[1] == 34, f"calculate_shanten_batch() expects an (N, 34) array, got shape {counts.shape}"
+    lengths = counts.sum(axis=1)
+    assert (np.isin(lengths % 3, 1) & (lengths <= 13)).all(), "calculate_shanten_batch() was passed a hand whose length isn't 1, 4, 7, 10, or 13"
+    assert counts.min(initial=0) >= 0 and counts.max(initial=0) <= 4, "calculate_shanten_batch() was passed a hand with a tile count outside 0-4"
+    summaries = get_summaries(counts)
+    shanten = get_shanten_numbers(summaries)
+    waits = np.zeros(counts.shape[0], dtype=np.uint64)
+
+    # tenpai hands can turn out to be tanki iishanten (see `_calculate_shanten`),
+    #   which requires calculating waits, and we might want the waits anyways
+    # so get the full result for those rows, once per distinct hand
+    needs_waits = (shanten < 2) if with_waits else (shanten == 0) & (summaries[:, :, 8].sum(axis=1) > 0)
+    rows = np.flatnonzero(needs_waits)
+    if len(rows) > 0:
+        unique_hands, inverse = np.unique(counts[rows], axis=0, return_inverse=True)
+        results = [_calculate_shanten(tuple(tile for tile, count in zip(TILES, hand) for _ in range(count))) for hand in unique_hands]
+        inverse = inverse.reshape(-1)
+        shanten[rows] = np.array([int(s) for s, _ in results], dtype=np.int64)[inverse]
+        if with_waits:
+            waits[rows] = np.array([to_wait_mask(w) for _, w in results], dtype=np.uint64)[inverse]
+    return (shanten, waits) if with_waits else shanten
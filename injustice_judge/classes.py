@@ -1,16 +1,18 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import IntEnum
 import functools
 from typing import *
 
-from .constants import PRED, SUCC, TOGGLE_RED_FIVE, YAOCHUUHAI
+from .constants import PRED, SUCC, TILES, TILE_INDEX, TOGGLE_RED_FIVE, YAOCHUUHAI
 from .display import ph, pt, shanten_name
-from .utils import apply_delta_scores, get_waits, normalize_red_five, normalize_red_fives, sorted_hand, to_placement, try_remove_all_tiles
+from .tables import DIGIT, SuitKey
+from .utils import apply_delta_scores, bounded_cache, get_waits, normalize_red_five, normalize_red_fives, sorted_hand, to_placement, try_remove_all_tiles
 
 # This file and classes2.py contain most of the classes used in InjusticeJudge.
 # In this file, we have:
 # - Dir: enum representing the direction of a call.
 # - CallInfo: stores all information about a call (name, tiles, direction)
+# - TileCounts: compact multiset of tiles (34 counts plus which red fives are held)
 # - Interpretation: represents one way to break up a given hand into sets and a pair.
 # - GameRules: parses all game rules that InjusticeJudge cares about.
 # - GameMetadata: stores data about the players and round-to-round scores of a game.
@@ -57,23 +59,98 @@ class CallInfo:
     def __str__(self) -> str:
         return self.to_str()
     
-add_group = lambda groups, group: tuple(sorted((*groups, tuple(sorted(group)))))
+# bit in TileCounts.red_mask for each red five
+RED_FIVE_BIT = {51: 1, 52: 2, 53: 4}
+
+class TileCounts:
+    """
+    Mutable multiset of tiles, as a 34-slot count array (see TILES) plus a mask of held red fives.
+    Red fives share a slot with their normal five, so `count(15)` and `count(51)`
+      both return the number of fives, red or not -- the same as counting a
+      hand that has gone through `normalize_red_fives`.
+    The packed suit keys used by tables.py are kept up to date as well,
+      so the shanten functions can use this without re-counting the hand.
+    """
+    __slots__ = ("counts", "red_mask", "suit_keys", "length")
+    def __init__(self, tiles: Iterable[int] = ()) -> None:
+        self.counts: List[int] = [0] * 34
+        self.red_mask: int = 0
+        self.suit_keys: List[SuitKey] = [0, 0, 0, 0]
+        self.length: int = 0
+        for tile in tiles:
+            self.add(tile)
+    def add(self, tile: int) -> None:
+        normal_tile = TOGGLE_RED_FIVE[tile] if tile in RED_FIVE_BIT else tile
+        self.counts[TILE_INDEX[tile]] += 1
+        self.suit_keys[normal_tile//10 - 1] += DIGIT[normal_tile%10]
+        self.red_mask |= RED_FIVE_BIT.get(tile, 0)
+        self.length += 1
+    def remove(self, tile: int) -> None:
+        normal_tile = TOGGLE_RED_FIVE[tile] if tile in RED_FIVE_BIT else tile
+        i = TILE_INDEX[tile]
+        if tile in RED_FIVE_BIT:
+            assert self.red_mask & RED_FIVE_BIT[tile], f"tried to remove {pt(tile)} from {ph(tuple(self))}"
+            self.red_mask &= ~RED_FIVE_BIT[tile]
+        else:
+            # can't remove a normal five if the only five left is red
+            has_red = normal_tile in TOGGLE_RED_FIVE and self.red_mask & RED_FIVE_BIT[TOGGLE_RED_FIVE[normal_tile]]
+            assert self.counts[i] > (1 if has_red else 0), f"tried to remove {pt(tile)} from {ph(tuple(self))}"
+        self.counts[i] -= 1
+        self.suit_keys[normal_tile//10 - 1] -= DIGIT[normal_tile%10]
+        self.length -= 1
+    def count(self, tile: int) -> int:
+        return self.counts[TILE_INDEX[tile]]
+    def copy(self) -> "TileCounts":
+        ret = TileCounts()
+        ret.counts = self.counts.copy()
+        ret.red_mask = self.red_mask
+        ret.suit_keys = self.suit_keys.copy()
+        ret.length = self.length
+        return ret
+    def __contains__(self, tile: int) -> bool:
+        return self.counts[TILE_INDEX[tile]] > 0 and (tile not in RED_FIVE_BIT or bool(self.red_mask & RED_FIVE_BIT[tile]))
+    def __len__(self) -> int:
+        return self.length
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the tiles in sorted order, with any red five listed first among its fives"""
+        for tile, count in zip(TILES, self.counts):
+            if count > 0 and tile in TOGGLE_RED_FIVE and self.red_mask & RED_FIVE_BIT[TOGGLE_RED_FIVE[tile]]:
+                yield TOGGLE_RED_FIVE[tile]
+                count -= 1
+            for _ in range(count):
+                yield tile
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TileCounts) and (self.counts, self.red_mask) == (other.counts, other.red_mask)
+    def __str__(self) -> str:
+        return ph(tuple(self))
+
+# groups (sequences and triplets) of an Interpretation are packed into ints,
+#   6 bits per tile, which keeps their sorted order the same as sorted tuples
+pack_group = lambda group: (group[0] << 12) | (group[1] << 6) | group[2]
+unpack_group = lambda packed: (packed >> 12, (packed >> 6) & 63, packed & 63)
+add_group = lambda groups, group: tuple(sorted((*groups, pack_group(sorted(group)))))
 
 # hand interpretations and yaku
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Interpretation:
-    """A single interpretation of a single hand (decomposed into triplets, sequences, and pair)"""
+    """Immutable object representing a single interpretation of a single hand (decomposed into triplets, sequences, and pair)"""
     hand: Tuple[int, ...]                           # The non-decomposed part of the original hand
     ron_fu: int = 20                                # ron fu using this interpretation of the hand (not rounded)
     tsumo_fu: int = 22                              # tsumo fu using this interpretation of the hand (not rounded)
-    sequences: Tuple[Tuple[int, ...], ...] = ()     # Sequences taken from the original hand
-    triplets: Tuple[Tuple[int, ...], ...] = ()      # Triplets taken from the original hand
+    packed_sequences: Tuple[int, ...] = ()          # Sequences taken from the original hand (see pack_group)
+    packed_triplets: Tuple[int, ...] = ()           # Triplets taken from the original hand (see pack_group)
     pair: Optional[Tuple[int, int]] = None          # A pair taken from the original hand
     calls: Tuple[CallInfo, ...] = ()                # A frozen list of calls from the original hand
+    @property
+    def sequences(self) -> Tuple[Tuple[int, ...], ...]:
+        return tuple(map(unpack_group, self.packed_sequences))
+    @property
+    def triplets(self) -> Tuple[Tuple[int, ...], ...]:
+        return tuple(map(unpack_group, self.packed_triplets))
     def unpack(self) -> Tuple[Any, ...]:
         return (self.hand, self.ron_fu, self.tsumo_fu, self.sequences, self.triplets, self.pair)
     def __hash__(self) -> int:
-        return hash(self.unpack())
+        return hash((self.hand, self.ron_fu, self.tsumo_fu, self.packed_sequences, self.packed_triplets, self.pair))
     def __str__(self) -> str:
         full_hand = (*self.sequences, *self.triplets, self.pair, self.hand) if self.pair is not None else (*self.sequences, *self.triplets, self.hand)
         return " ".join(map(ph, full_hand)) + f" ron {self.ron_fu} tsumo {self.tsumo_fu}" + ("" if len(self.calls) == 0 else f" ({len(self.calls)} calls)")
@@ -107,15 +184,15 @@ class Interpretation:
         return Interpretation(self.hand if call else try_remove_all_tiles(self.hand, triplet),
                               self.ron_fu + triplet_fu,
                               self.tsumo_fu + triplet_fu,
-                              self.sequences,
-                              add_group(self.triplets, triplet),
+                              self.packed_sequences,
+                              add_group(self.packed_triplets, triplet),
                               self.pair, calls=self.calls)
     def add_sequence(self, sequence: Tuple[int, int, int], call: bool = False) -> "Interpretation":
         return Interpretation(self.hand if call else try_remove_all_tiles(self.hand, sequence),
                               self.ron_fu,
                               self.tsumo_fu,
-                              add_group(self.sequences, sequence),
-                              self.triplets,
+                              add_group(self.packed_sequences, sequence),
+                              self.packed_triplets,
                               self.pair, calls=self.calls)
     def add_pair(self, pair: Tuple[int, int], yakuhai: Tuple[int, ...]) -> "Interpretation":
         if self.pair is None:
@@ -124,31 +201,27 @@ class Interpretation:
             return Interpretation(try_remove_all_tiles(self.hand, pair),
                                   self.ron_fu + yakuhai_fu,
                                   self.tsumo_fu + yakuhai_fu,
-                                  self.sequences, self.triplets,
+                                  self.packed_sequences, self.packed_triplets,
                                   pair, calls=self.calls)
         return self
-    def add_wait_fu(self, yakuhai: Tuple[int, ...]) -> bool:
-        """return True if the final wait is valid"""
+    def add_wait_fu(self, yakuhai: Tuple[int, ...]) -> Optional["Interpretation"]:
+        """return this interpretation plus wait fu, or None if the final wait is invalid"""
         if len(self.hand) == 2:
             # taatsu wait -- might be a single wait
             is_shanpon = self.is_shanpon()
             waits = self.get_waits()
             if is_shanpon or len(waits) > 0:
                 single_wait_fu = 2 if (len(waits) == 1 and not is_shanpon) else 0
-                self.ron_fu += single_wait_fu
-                self.tsumo_fu += single_wait_fu
                 # print(f"add {single_wait_fu} for single wait {ph(self.hand)}")
-                return True
+                return replace(self, ron_fu=self.ron_fu + single_wait_fu, tsumo_fu=self.tsumo_fu + single_wait_fu)
         elif len(self.hand) == 1:
             # tanki wait -- is a single wait, and might be yakuhai
             yakuhai_fu = 2 * yakuhai.count(self.hand[0])
-            self.ron_fu += yakuhai_fu + 2
-            self.tsumo_fu += yakuhai_fu + 2
             # print(f"add 2 for single wait {pt(self.hand[0])}")
             # print(f"add {yakuhai_fu} for yakuhai pair {pt(self.hand[0])}")
-            return True
-        return False
-    def generate_all_interpretations(self, yakuhai: Tuple[int, ...] = (), is_closed_hand: bool = False) -> Set["Interpretation"]:
+            return replace(self, ron_fu=self.ron_fu + yakuhai_fu + 2, tsumo_fu=self.tsumo_fu + yakuhai_fu + 2)
+        return None
+    def generate_all_interpretations(self, yakuhai: Tuple[int, ...] = (), is_closed_hand: bool = False) -> FrozenSet["Interpretation"]:
         """
         From this Interpretation, remove all combinations of sequences,
         triplets, and pair from self.hand to arrive at several
@@ -157,66 +230,73 @@ class Interpretation:
         by completing a triplet as a final wait (shanpon fu) -- that's taken
         care of in `get_yaku` in yaku.py.
 
-        Note: calling this will reset self.ron_fu and self.tsumo_fu
+        Note: the resulting interpretations start from 20 (closed: 30) ron fu and 22 tsumo fu,
+        ignoring self.ron_fu and self.tsumo_fu. The result is cached, so the same
+        hand+calls is only ever decomposed once.
         """
+        base_interpretation = replace(self, ron_fu=20 + (10 if is_closed_hand else 0), tsumo_fu=22)
+        return _generate_all_interpretations(base_interpretation, yakuhai, is_closed_hand)
 
-        base_interpretation = self
-        self.ron_fu = 20 + (10 if is_closed_hand else 0)
-        self.tsumo_fu = 22
+@bounded_cache(maxsize=4096)
+def _generate_all_interpretations(initial: Interpretation, yakuhai: Tuple[int, ...], is_closed_hand: bool) -> FrozenSet[Interpretation]:
+    """Cached implementation of Interpretation.generate_all_interpretations, given the interpretation with fu reset"""
+    base_interpretation = initial
+    # the call info forces some sequences/triplets
+    for call in initial.calls:
+        mktuple = lambda t: cast(Tuple[int, int, int], tuple(t))
+        if call.type == "chii":
+            base_interpretation = base_interpretation.add_sequence(mktuple(call.tiles), call=True)
+        elif call.type == "pon":
+            base_interpretation = base_interpretation.add_triplet(mktuple(call.tiles), call=True, closed=False)
+        elif "kan" in call.type: 
+            base_interpretation = base_interpretation.add_triplet(mktuple(call.tiles[:3]), call=True, closed=(call.type == "ankan"), kan=True)
 
-        # the call info forces some sequences/triplets
-        for call in self.calls:
-            mktuple = lambda t: cast(Tuple[int, int, int], tuple(t))
-            if call.type == "chii":
-                base_interpretation = base_interpretation.add_sequence(mktuple(call.tiles), call=True)
-            elif call.type == "pon":
-                base_interpretation = base_interpretation.add_triplet(mktuple(call.tiles), call=True, closed=False)
-            elif "kan" in call.type: 
-                base_interpretation = base_interpretation.add_triplet(mktuple(call.tiles[:3]), call=True, closed=(call.type == "ankan"), kan=True)
+    # finally, iterate through all possible interpretations of the hand
+    interpretations: Set[Interpretation] = set()
+    to_update: Set[Interpretation] = {base_interpretation}
+    already_processed: Set[Tuple[int, ...]] = set()
 
-        # finally, iterate through all possible interpretations of the hand
-        interpretations: Set[Interpretation] = set()
-        to_update: Set[Interpretation] = {base_interpretation}
-        already_processed: Set[Tuple[int, ...]] = set()
-
-        while len(to_update) > 0:
-            interpretation = to_update.pop()
-            # skip if we've already seen this one
-            if interpretation.hand in already_processed:
-                continue
-            else:
-                already_processed.add(interpretation.hand)
-            # either output the interpretation, or recurse with smaller hands
-            if len(interpretation.hand) <= 2:
-                if interpretation.add_wait_fu(yakuhai):
-                    interpretations.add(interpretation)
-            else:
-                for tile in set(interpretation.hand):
-                    tile2 = normalize_red_five(tile) # non red version
-                    nodes = [interpretation.add_triplet((tile, tile2, tile2)),
-                             interpretation.add_sequence((SUCC[SUCC[tile]], SUCC[tile], tile)),
-                             interpretation.add_pair((tile, tile2), yakuhai=yakuhai)]
-                    to_update |= {n for n in nodes if n is not None}
+    while len(to_update) > 0:
+        interpretation = to_update.pop()
+        # skip if we've already seen this one
+        if interpretation.hand in already_processed:
+            continue
+        else:
+            already_processed.add(interpretation.hand)
+        # either output the interpretation, or recurse with smaller hands
+        if len(interpretation.hand) <= 2:
+            final_interpretation = interpretation.add_wait_fu(yakuhai)
+            if final_interpretation is not None:
+                interpretations.add(final_interpretation)
+        else:
+            for tile in set(interpretation.hand):
+                tile2 = normalize_red_five(tile) # non red version
+                nodes = [interpretation.add_triplet((tile, tile2, tile2)),
+                         interpretation.add_sequence((SUCC[SUCC[tile]], SUCC[tile], tile)),
+                         interpretation.add_pair((tile, tile2), yakuhai=yakuhai)]
+                to_update |= {n for n in nodes if n is not None}
 
-            # special case: aryanmen pinfu requires a single sequence remain unprocessed
-            if len(interpretation.hand) == 1:
-                # check pinfu conditions
-                no_calls_except_kita = all(call.type == "kita" for call in self.calls)
-                all_sequences = len(interpretation.sequences) == 4
-                no_yakuhai_pair = interpretation.hand[0] not in yakuhai
-                if no_calls_except_kita and all_sequences and no_yakuhai_pair:
-                    # interpret as aryanmen wait for pinfu
-                    tanki = interpretation.hand[0]
-                    # look for sequences that form aryanmen with the tanki,
-                    # where the ryanmen part is not penchan
-                    for i, (t1,t2,t3) in enumerate(interpretation.sequences):
-                        remaining_seqs = (*interpretation.sequences[:i], *interpretation.sequences[i+1:])
-                        if tanki == t1 and SUCC[t3] != 0:
-                            interpretations.add(Interpretation((t2,t3), 30, 22, remaining_seqs, interpretation.triplets, (tanki, tanki), calls=self.calls))
-                        elif tanki == t3 and PRED[t1] != 0:
-                            interpretations.add(Interpretation((t1,t2), 30, 22, remaining_seqs, interpretation.triplets, (tanki, tanki), calls=self.calls))
+        # special case: aryanmen pinfu requires a single sequence remain unprocessed
+        if len(interpretation.hand) == 1:
+            # check pinfu conditions
+            no_calls_except_kita = all(call.type == "kita" for call in initial.calls)
+            all_sequences = len(interpretation.packed_sequences) == 4
+            no_yakuhai_pair = interpretation.hand[0] not in yakuhai
+            if no_calls_except_kita and all_sequences and no_yakuhai_pair:
+                # interpret as aryanmen wait for pinfu
+                tanki = interpretation.hand[0]
+                # look for sequences that form aryanmen with the tanki,
+                # where the ryanmen part is not penchan
+                packed_sequences = interpretation.packed_sequences
+                for i, packed in enumerate(packed_sequences):
+                    t1, t2, t3 = unpack_group(packed)
+                    remaining_seqs = (*packed_sequences[:i], *packed_sequences[i+1:])
+                    if tanki == t1 and SUCC[t3] != 0:
+                        interpretations.add(Interpretation((t2,t3), 30, 22, remaining_seqs, interpretation.packed_triplets, (tanki, tanki), calls=initial.calls))
+                    elif tanki == t3 and PRED[t1] != 0:
+                        interpretations.add(Interpretation((t1,t2), 30, 22, remaining_seqs, interpretation.packed_triplets, (tanki, tanki), calls=initial.calls))
             
-        return interpretations if len(interpretations) > 0 else {self}
+    return frozenset(interpretations) if len(interpretations) > 0 else frozenset({initial})
 
 @dataclass
 class GameRules:
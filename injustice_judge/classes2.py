@@ -3,11 +3,11 @@ from enum import IntEnum
 import functools
 from typing import *
 
-from .classes import CallInfo, Dir, GameRules, Interpretation
+from .classes import CallInfo, Dir, GameRules, Interpretation, TileCounts
 from .constants import Event, Shanten, MANZU, PINZU, SOUZU, PRED, SUCC, DOUBLE_YAKUMAN, LIMIT_HANDS, PAO_YAKUMAN, TRANSLATE
 from .display import ph, pt, shanten_name
-from .utils import apply_delta_scores, calc_ko_oya_points, get_score, is_mangan, normalize_red_five, normalize_red_fives, sorted_hand, to_dora_indicator, try_remove_all_tiles
-from .shanten import calculate_shanten
+from .utils import apply_delta_scores, bounded_cache, calc_ko_oya_points, get_score, is_mangan, normalize_red_five, normalize_red_fives, sorted_hand, to_dora_indicator, try_remove_all_tiles
+from .shanten import DiscardResult, analyze_discards, calculate_shanten, calculate_shanten_number
 
 # These classes depend on shanten.py, which depends on classes.py, so we can't
 #   put these classes in classes.py.
@@ -16,11 +16,12 @@ from .shanten import calculate_shanten
 # - Hand: represents a hand. Provides easy access to its open/closed/hidden parts and its shanten/waits.
 # - Score: summarizes a score for a single hand (han, fu, yaku), use .to_points() to calculate points.
 # - Win, Ron, Tsumo, Draw: objects representing the result of a game.
+# - KyokuTimeline: index over a round's events, for looking up the state that stateful yaku depend on.
 # - Kyoku: object representing a parsed round. Flags are calculated using a Kyoku object.
 
-@functools.lru_cache(maxsize=2048)
+@bounded_cache(maxsize=2048)
 def _hidden_part(hand: Tuple[int], calls: Tuple[int]) -> Tuple[int, ...]:
-    """Cached helper for getting the hidden part of a hand, used below in __post_init__"""
+    """Cached helper for getting the hidden part of a hand, used below in Hand.hidden_part"""
     ret = try_remove_all_tiles(hand, calls)
     assert len(ret) + len(calls) == len(hand), f"with hand = {ph(hand)} and calls = {ph(calls)}, somehow hidden part is {ph(ret)}"
     return ret
@@ -32,57 +33,71 @@ class Hand:
     tiles: Tuple[int, ...]                                      # all tiles in the hand
     calls: List[CallInfo] = field(default_factory=list)         # every call the hand has made, in order of appearance
     ordered_calls: List[CallInfo] = field(default_factory=list) # every call the hand has made, in order of calling them
-    open_part: Tuple[int, ...] = ()                             # all tiles currently shown as a call
-    hidden_part: Tuple[int, ...] = ()                           # tiles - open_part
-    closed_part: Tuple[int, ...] = ()                           # hidden_part + any ankans
-    shanten: Shanten = (-1, ())                                 # shanten for the hand, or -1 if the hand is 14 tiles
-                                                                # (like when it's in the middle of a draw or call)
     prev_shanten: Shanten = (-1, ())                            # shanten for the hand right before said draw or call
-    tiles_with_kans: Tuple[int, ...] = ()                       # all tiles in the hand including kans
-    best_discards: Tuple[int, ...] = ()                         # best discards for this hand (only for 14-tile hands)
     kita_count: int = 0                                         # number of kita calls for this hand
     
     def __post_init__(self) -> None:
-        """You only need to provide `tiles` (and `calls`, if any), this calculates the rest"""
+        """You only need to provide `tiles` (and `calls`, if any), the rest is calculated on first access"""
+        assert len(self.tiles) in {1, 2, 4, 5, 7, 8, 10, 11, 13, 14}, f"passed a length {len(self.tiles)} hand to Hand"
         # sort the passed-in hand
         super().__setattr__("tiles", sorted_hand(self.tiles))
-        # store all tiles visible on the table as calls (kans are stored as triplets)
-        super().__setattr__("open_part", tuple(tile for call in self.calls if call.type != "kita" for tile in call.tiles[:3]))
-        # store the hidden part (complement of open_part)
-        super().__setattr__("hidden_part", _hidden_part(self.tiles, self.open_part))
-        # store the passed-in hand, but don't represent kans as triplets
-        super().__setattr__("tiles_with_kans", (*self.hidden_part, *(tile for call in self.calls for tile in call.tiles)))
-        # store the closed part, which is the hidden part plus ankans
+
+    @functools.cached_property
+    def open_part(self) -> Tuple[int, ...]:
+        """All tiles currently shown as a call (kans are stored as triplets)"""
+        return tuple(tile for call in self.calls if call.type != "kita" for tile in call.tiles[:3])
+    @functools.cached_property
+    def hidden_part(self) -> Tuple[int, ...]:
+        """`tiles` - `open_part`"""
+        return _hidden_part(self.tiles, self.open_part)
+    @functools.cached_property
+    def closed_part(self) -> Tuple[int, ...]:
+        """`hidden_part` + any ankans"""
         closed_part = self.hidden_part
         for call in self.calls:
             if call.type == "ankan":
                 closed_part = (*closed_part, call.tile, call.tile, call.tile)
-        super().__setattr__("closed_part", closed_part)
-        # if we just discarded, calculate shanten of the resulting hand
+        return closed_part
+    @functools.cached_property
+    def tiles_with_kans(self) -> Tuple[int, ...]:
+        """All tiles in the hand, but don't represent kans as triplets"""
+        return (*self.hidden_part, *(tile for call in self.calls for tile in call.tiles))
+    @functools.cached_property
+    def shanten(self) -> Shanten:
+        """
+        Shanten for the hand, or the previous hand's shanten if the hand just drew or called
+        (use `analyze_discards` to get the shanten after each possible discard)
+        """
         if len(self.tiles) in {1, 4, 7, 10, 13}:
-            super().__setattr__("shanten", calculate_shanten(self.hidden_part))
-        # if we just drew, set shanten to previous hand's shanten
-        elif len(self.tiles) in {2, 5, 8, 11, 14}: # this disables the below
-            super().__setattr__("shanten", self.prev_shanten)
-        # (disabled because expensive) calculate the best shanten obtainable from this 14-tile hand
-        elif len(self.tiles) in {2, 5, 8, 11, 14}:
-            best_shanten: Shanten = self.prev_shanten
-            best_discards: List[int] = []
-            for i, tile in enumerate(self.hidden_part):
-                if self.prev_shanten[0] < 2 and tile not in self.prev_shanten[1]:
-                    continue
-                hand = (*self.hidden_part[:i], *self.hidden_part[i+1:])
-                shanten = calculate_shanten(hand)
-                (s1, w1), (s2, w2) = shanten, best_shanten
-                if int(s1) < int(s2) or (int(s1) == int(s2) and len(w1) > len(w2)):
-                    best_shanten = shanten
-                    best_discards = []
-                if shanten == best_shanten:
-                    best_discards.append(tile)
-            super().__setattr__("shanten", best_shanten)
-            super().__setattr__("best_discards", sorted_hand(best_discards))
+            return calculate_shanten(self.hidden_part)
+        else:
+            return self.prev_shanten
+    @functools.cached_property
+    def shanten_number(self) -> int:
+        """The integer part of `shanten`, which is much cheaper to get if you don't need the waits"""
+        if "shanten" in self.__dict__:
+            return int(self.shanten[0])
+        elif len(self.tiles) in {1, 4, 7, 10, 13}:
+            return calculate_shanten_number(self.hidden_counts)
         else:
-            assert False, f"passed a length {len(self.tiles)} hand to Hand"
+            return int(self.prev_shanten[0])
+    @functools.cached_property
+    def counts(self) -> TileCounts:
+        """`tiles` as a TileCounts. Don't modify it, since it's shared with the Hand"""
+        return TileCounts(self.tiles)
+    @functools.cached_property
+    def hidden_counts(self) -> TileCounts:
+        """`hidden_part` as a TileCounts. Don't modify it, since it's shared with the Hand"""
+        return TileCounts(self.hidden_part)
+    def _with_counts(self, hand: "Hand", tile: int, n: int) -> "Hand":
+        # carry over any counts already computed for this hand to `hand`,
+        #   which is this hand plus n copies of `tile` in the hidden part
+        for name in ("counts", "hidden_counts"):
+            if name in self.__dict__:
+                counts = self.__dict__[name].copy()
+                counts.add(tile) if n > 0 else counts.remove(tile)
+                hand.__dict__[name] = counts
+        return hand
 
     def to_str(self, doras: List[int] = [], uras: List[int] = []) -> str:
         to_str = lambda call: call.to_str(doras, uras)
@@ -95,14 +110,14 @@ class Hand:
 
     def add(self, tile: int) -> "Hand":
         """Immutable update for drawing a tile"""
-        return Hand((*self.tiles, tile), [*self.calls], [*self.ordered_calls], prev_shanten=self.shanten, kita_count=self.kita_count)
+        return self._with_counts(Hand((*self.tiles, tile), [*self.calls], [*self.ordered_calls], prev_shanten=self.shanten, kita_count=self.kita_count), tile, 1)
     def add_call(self, call: CallInfo) -> "Hand":
         """Immutable update for calling a tile"""
         return Hand(self.tiles, [*self.calls, call], [*self.ordered_calls, call], prev_shanten=self.shanten, kita_count=self.kita_count)
     def remove(self, tile: int) -> "Hand":
         """Immutable update for discarding a tile"""
         i = self.tiles.index(tile)
-        return Hand((*self.tiles[:i], *self.tiles[i+1:]), [*self.calls], [*self.ordered_calls], prev_shanten=self.shanten, kita_count=self.kita_count)
+        return self._with_counts(Hand((*self.tiles[:i], *self.tiles[i+1:]), [*self.calls], [*self.ordered_calls], prev_shanten=self.shanten, kita_count=self.kita_count), tile, -1)
     def kakan(self, called_tile: int) -> Tuple[int, "Hand"]:
         """Immutable update for adding a tile to an existing pon call (kakan)"""
         # find the index of the existing pon
@@ -133,17 +148,29 @@ class Hand:
         elif self.shanten[0] > 0:
             wait_string = f" ({shanten_name(self.shanten)})"
         return f"{self.to_str(doras, uras)}{win_string}{wait_string}"
-    def ukeire(self, visible: Iterable[int]) -> int:
+    def ukeire(self, visible: Union[TileCounts, Iterable[int]]) -> int:
         """
-        Pass in all the visible tiles on board (not including hand).
+        Pass in all the visible tiles on board (not including hand), preferably as a TileCounts.
         Return the ukeire of the hand, or 0 if the hand is not tenpai or iishanten.
         """
         shanten, waits = self.shanten
         if shanten >= 2:
             return 0
+        if not isinstance(visible, TileCounts):
+            visible = TileCounts(visible)
         wait_tiles = set(normalize_red_fives(waits))
-        visible = list(normalize_red_fives(list(self.tiles_with_kans) + list(visible)))
-        return 4 * len(wait_tiles) - sum(visible.count(wait) for wait in wait_tiles)
+        held_tiles = tuple(normalize_red_fives(self.tiles_with_kans))
+        return 4 * len(wait_tiles) - sum(visible.count(wait) + held_tiles.count(wait) for wait in wait_tiles)
+    def analyze_discards(self, visible: Iterable[int]) -> Dict[int, DiscardResult]:
+        """
+        For a hand that just drew or called, pass in all the visible tiles on board (not including hand).
+        Return {discard: (shanten, accepted tiles, ukeire)} for every possible discard.
+        (See `analyze_discards` in shanten.py for details.)
+        """
+        assert len(self.tiles) in {2, 5, 8, 11, 14}, f"analyze_discards() was called on a {len(self.tiles)} tile hand {self!s}"
+        # like ukeire(), count the tiles in our calls as visible too
+        called_tiles = try_remove_all_tiles(self.tiles_with_kans, self.hidden_part)
+        return analyze_discards(self.hidden_counts, TileCounts((*called_tiles, *visible)))
     def get_majority_suit(self) -> Optional[Set[int]]:
         # returns one of {MANZU, PINZU, SOUZU}
         # or None if there is no majority suit (i.e. there's a tie)
@@ -165,7 +192,7 @@ class Hand:
             return {}
         if self.prev_shanten[0] >= 2:
             return {}
-        return {tile: hand for tile in self.hidden_part for hand in (self.remove(tile),) if hand.shanten[0] == 0}
+        return {tile: hand for tile in self.hidden_part for hand in (self.remove(tile),) if hand.shanten_number == 0}
     def possible_chiis(self, tile: int) -> Iterable[CallInfo]:
         # get all possible chii calls you can make with this hand
         chiis = ((PRED[PRED[tile]], PRED[tile]), (PRED[tile], SUCC[tile]), (SUCC[tile], SUCC[SUCC[tile]]))
@@ -185,7 +212,7 @@ def translate_tenhou_yaku(yaku: str) -> Tuple[str, int]:
         name = f"{name} {han}"
     return name, han
 
-@dataclass
+@dataclass(slots=True)
 class Score:
     """Generated or parsed score for a given hand."""
     yaku: List[Tuple[str, int]] # list of ("yaku name", han value)
@@ -360,7 +387,7 @@ class Score:
         fu = int(score_str.split("符")[0]) if "符" in score_str else 70
         return cls(yaku, han, fu, is_dealer, is_tsumo, num_players, rules)
 
-    # these fields are only for debug use
+    # these fields are only for debug use, and only set by get_yaku if the `debug` env var is set
     interpretation: Optional[Interpretation] = None # the interpretation used to calculate yaku and fu
     hand: Optional[Hand] = None                     # the original hand
 
@@ -385,6 +412,102 @@ class Draw:
     score_delta: List[int] # list of score differences for this round
     name: str              # name of the draw, e.g. "ryuukyoku"
 
+class YakuState(NamedTuple):
+    """The state relevant to stateful yaku for a single seat, at a single point in a kyoku"""
+    riichis: Tuple[bool, ...]   # one entry per self-riichi (closed hands only), True if it was a double riichi
+    double_riichi_eligible: bool
+    is_ippatsu: bool
+    is_chankan: bool
+    is_rinshan: bool
+
+class KyokuTimeline:
+    """
+    Index over the events of a kyoku, answering questions about the state
+    that stateful yaku depend on (riichi, ippatsu, chankan, rinshan, tenhou)
+    for any seat after any number of events in O(1).
+
+    The state after each event is computed once per seat, the first time it's asked for.
+    The events list is only ever appended to, so new events are picked up as they come.
+    """
+    def __init__(self, events: List[Event]) -> None:
+        self.events = events
+        # _yaku_states[seat, is_closed_hand][i] = YakuState after the first i events
+        self._yaku_states: Dict[Tuple[int, bool], List[YakuState]] = {}
+        # _tenhou_eligible[seat][i] = True if seat hasn't discarded and nobody called in the first i events
+        self._tenhou_eligible: Dict[int, List[bool]] = {}
+        # _first_discard_index = index of the first discard event, if any
+        self._first_discard_index: Optional[int] = None
+        # _first_draw = the first draw event's tile, if any
+        self._first_draw: Optional[int] = None
+        self._num_processed = 0
+    def _update(self) -> None:
+        # process new events that don't depend on seat
+        for i in range(self._num_processed, len(self.events)):
+            event_type = self.events[i][1]
+            if self._first_draw is None and event_type == "draw":
+                self._first_draw = self.events[i][2]
+            if self._first_discard_index is None and event_type == "discard":
+                self._first_discard_index = i
+        self._num_processed = len(self.events)
+    def get_yaku_state(self, seat: int, is_closed_hand: bool, position: Optional[int] = None) -> YakuState:
+        """Get the stateful yaku state for `seat` after the first `position` events (default: all events)"""
+        position = len(self.events) if position is None else position
+        states = self._yaku_states.setdefault((seat, is_closed_hand), [YakuState((), True, False, False, False)])
+        # this is kind of a state machine over the events to figure out five yaku
+        # first state machine checks for self-riichis, self-discards, and all calls
+        # - riichi: check if there is a self-riichi event anywhere
+        # - double riichi: check if no discard event before a self-riichi event
+        # - ippatsu: check if there is are no call events or self-discard events after self-riichi
+        # second state machine checks for kans and draws and discards
+        # - chankan: check if there is any kakan and no draw after it
+        # - rinshan: check if there is any kan, then a draw, and no discard after it
+        riichis, double_riichi_eligible, is_ippatsu, is_chankan, is_rinshan = states[-1]
+        for event_seat, event_type, *event_data in self.events[len(states)-1:position]:
+            if event_seat != seat and event_type == "draw": # someone draws
+                if is_chankan:
+                    is_ippatsu = False # kakan call succeeded
+                is_chankan = False
+            elif event_seat == seat and event_type == "discard": # self discard
+                double_riichi_eligible = False
+                is_ippatsu = False
+                is_rinshan = False
+            elif is_closed_hand and event_seat == seat and event_type == "riichi": # self riichi
+                is_ippatsu = True
+                is_rinshan = False
+                riichis = (*riichis, double_riichi_eligible)
+            elif event_seat != seat and event_type == "kakan": # someone kakans
+                # ippatsu isn't cancelled yet; wait for a draw
+                is_chankan = True
+            elif event_seat != seat and event_type in {"chii", "pon", "minkan", "ankan", "kita"}: # any non-kakan call
+                double_riichi_eligible = False
+                is_ippatsu = False
+            elif event_seat == seat and event_type in {"minkan", "ankan", "kakan", "kita"}: # self kan
+                double_riichi_eligible = False
+                is_rinshan = True
+            states.append(YakuState(riichis, double_riichi_eligible, is_ippatsu, is_chankan, is_rinshan))
+        return states[position]
+    def is_tenhou_eligible(self, seat: int, position: Optional[int] = None) -> bool:
+        """Return True if `seat` hasn't discarded and nobody has called in the first `position` events (default: all events)"""
+        position = len(self.events) if position is None else position
+        eligible = self._tenhou_eligible.setdefault(seat, [True])
+        for event_seat, event_type, *event_data in self.events[len(eligible)-1:position]:
+            if seat == event_seat and event_type == "discard":
+                eligible.append(False)
+            elif event_type in {"chii", "pon", "minkan", "ankan", "kakan", "kita"}:
+                eligible.append(False)
+            else:
+                eligible.append(eligible[-1])
+        return eligible[position]
+    def no_discards_yet(self, position: Optional[int] = None) -> bool:
+        """Return True if nobody discarded in the first `position` events (default: all events)"""
+        position = len(self.events) if position is None else position
+        self._update()
+        return self._first_discard_index is None or position <= self._first_discard_index
+    def get_first_draw(self) -> Optional[int]:
+        """Return the tile drawn by the first draw event of the kyoku"""
+        self._update()
+        return self._first_draw
+
 @dataclass
 class Kyoku:
     """
@@ -433,6 +556,10 @@ class Kyoku:
     # need to keep track of _some_ state so that the Ronhorn bot can /parse a game
     # `hands` keeps track of hand, calls, shanten
     hands: List[Hand]                             = field(default_factory=list)
+    # `hand_after_event[i]` is the hand of the acting seat right after `events[i]`,
+    #   for every event that changes a hand (haipai, draws, discards, calls)
+    # flags.py replays hands using these, rather than rebuilding them
+    hand_after_event: Dict[int, Hand]             = field(default_factory=dict)
     # `pond` keeps track of all discards so far by each player
     pond: List[List[int]]                         = field(default_factory=list)
     # `furiten` keeps track of whether a player is in furiten
@@ -441,30 +568,41 @@ class Kyoku:
     num_dora_indicators_visible: int              = 1
     # `tiles_in_wall` keeps track of how tiles are left in the wall
     tiles_in_wall: int                            = 0
+    # `visible_counts` keeps track of all visible tiles (ponds, dora indicators, calls)
+    visible_counts: TileCounts                    = field(default_factory=TileCounts)
 
+    @functools.cached_property
+    def timeline(self) -> KyokuTimeline:
+        return KyokuTimeline(self.events)
     def get_starting_score(self) -> int:
         return (sum(self.start_scores) + self.rules.riichi_value*self.riichi_sticks) // self.num_players
-    def get_visible_tiles(self) -> List[int]:
+    def add_visible_call(self, call: CallInfo) -> None:
+        """Count the tiles in a new call as visible, except the called tile (which is in someone's pond)"""
+        tiles = list(call.tiles)
+        if call.type not in {"ankan", "kita"}:
+            tiles.remove(call.tile)
+        for tile in tiles:
+            self.visible_counts.add(tile)
+    def flip_dora_indicator(self) -> None:
+        """Reveal the next dora indicator, counting it as visible"""
+        indicators = [to_dora_indicator(dora, self.num_players) for dora in self.doras if dora not in {51,52,53}]
+        if self.num_dora_indicators_visible < len(indicators):
+            self.visible_counts.add(indicators[self.num_dora_indicators_visible])
+        self.num_dora_indicators_visible += 1
+    def get_visible_counts(self) -> TileCounts:
         """Get all the currently visible tiles, used for ukeire calculations"""
-        pond_tiles = [tile for seat in range(self.num_players) for tile in self.pond[seat]]
-        dora_indicators = [to_dora_indicator(dora, self.num_players) for dora in self.doras if dora not in {51,52,53}][:self.num_dora_indicators_visible]
-        def get_invisible_part(call):
-            # get the part of the call that isn't already counted as part of the pond
-            ret = list(call.tiles)
-            if call.type not in {"ankan", "kita"}:
-                ret.remove(call.tile)
-            return ret
-
-        visible_calls = [tile for hand in self.hands for call in hand.calls for tile in get_invisible_part(call)]
-        # visible tiles = all of the above combined
-        visible_tiles = pond_tiles + dora_indicators + visible_calls
         # the result might contain the final deal-in tile
         # this tile should be excluded from the ukeire calculation, so we remove it here
         if self.result and self.result[0] != "tsumo":
-            visible_tiles.remove(self.final_discard)
-        return visible_tiles
+            visible_counts = self.visible_counts.copy()
+            visible_counts.remove(self.final_discard)
+            return visible_counts
+        return self.visible_counts
+    def get_visible_tiles(self) -> List[int]:
+        """Same as get_visible_counts, but as a list"""
+        return list(self.get_visible_counts())
     def get_ukeire(self, seat) -> int:
-        return self.hands[seat].ukeire(self.get_visible_tiles())
+        return self.hands[seat].ukeire(self.get_visible_counts())
     def get_starting_doras(self) -> List[int]:
         return self.doras[:(3 if self.rules.use_red_fives else 0) + self.num_dora_indicators_visible]
 
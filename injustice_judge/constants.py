@@ -23,6 +23,8 @@ from typing import *
 #           JIHAI: a set of all honor tiles
 #      YAOCHUUHAI: a set of all terminal and honor tiles
 #       TANYAOHAI: a set of all 2-8 tiles
+#           TILES: every distinct tile, in the order of a 34-slot count array (1-9m, 1-9p, 1-9s, 1-7z)
+#      TILE_INDEX: map from a tile (including red fives) to its slot in TILES
 #    KO_RON_SCORE: nondealer ron score for a given han and fu
 #   OYA_RON_SCORE: dealer ron score for a given han and fu
 #  KO_TSUMO_SCORE: tsumo points paid by nondealers for a given han and fu
@@ -422,6 +424,8 @@ SOUZU = {31,32,33,34,35,36,37,38,39,53}
 JIHAI = {41,42,43,44,45,46,47}
 YAOCHUUHAI = {11,19,21,29,31,39,41,42,43,44,45,46,47}
 TANYAOHAI = {12,13,14,15,16,17,18,22,23,24,25,26,27,28,32,33,34,35,36,37,38}
+TILES = (*range(11,20), *range(21,30), *range(31,40), *range(41,48))
+TILE_INDEX = {**{tile: i for i, tile in enumerate(TILES)}, 51: 4, 52: 13, 53: 22}
 
 # SCORE[han][fu] = score
 KO_RON_SCORE = defaultdict(lambda: defaultdict(lambda: 32000), {
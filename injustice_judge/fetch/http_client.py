@@ -0,0 +1,90 @@
+import asyncio
+from typing import *
+if TYPE_CHECKING:
+    import requests
+
+# This file implements the shared HTTP client used to fetch tenhou and riichi city logs.
+#
+# Requests are made with a single `requests.Session`, so connections are
+#   pooled and kept alive between fetches. Each request is run in a worker
+#   thread via `asyncio.to_thread`, so awaiting a fetch never blocks the event
+#   loop, and at most `max_concurrency` requests are in flight at once.
+# Failed connections and 429/5xx responses are retried with exponential
+#   backoff by urllib3's `Retry`. Every request has a (connect, read) timeout.
+#
+# `get_http_client()` returns the shared client. To change its settings (or to
+#   point it at a stub server in tests), call `set_http_client` with a new one.
+
+class HTTPClient:
+    """A pooled, retrying HTTP client whose requests can be awaited"""
+    def __init__(self,
+                 max_concurrency: int = 4,
+                 timeout: Tuple[float, float] = (5, 30),
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 retry_statuses: Collection[int] = (429, 500, 502, 503, 504)) -> None:
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = retry_statuses
+        self._session: Optional["requests.Session"] = None
+        # asyncio.Semaphore is tied to the event loop it's first used in,
+        #   and each `asyncio.run` makes a new loop, so we keep one per loop
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    @property
+    def session(self) -> "requests.Session":
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            retry = Retry(total=self.retries,
+                          backoff_factor=self.backoff_factor,
+                          status_forcelist=self.retry_statuses,
+                          allowed_methods=None) # our POSTs are read-only queries, so they're safe to retry
+            adapter = HTTPAdapter(pool_connections=self.max_concurrency, pool_maxsize=self.max_concurrency, max_retries=retry)
+            self._session = requests.Session()
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            # forget semaphores of loops that have since closed
+            self._semaphores = {l: s for l, s in self._semaphores.items() if not l.is_closed()}
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> "requests.Response":
+        """Make a request in a worker thread, waiting for a free slot first"""
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.session
+        async with self._get_semaphore():
+            return await asyncio.to_thread(session.request, method, url, **kwargs)
+    async def get(self, url: str, **kwargs: Any) -> "requests.Response":
+        return await self.request("GET", url, **kwargs)
+    async def post(self, url: str, **kwargs: Any) -> "requests.Response":
+        return await self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+_http_client: Optional[HTTPClient] = None
+
+def get_http_client() -> HTTPClient:
+    """Return the shared HTTP client, creating it with default settings if needed"""
+    global _http_client
+    if _http_client is None:
+        _http_client = HTTPClient()
+    return _http_client
+
+def set_http_client(client: HTTPClient) -> None:
+    """Replace the shared HTTP client (closing the old one)"""
+    global _http_client
+    if _http_client is not None and _http_client is not client:
+        _http_client.close()
+    _http_client = client
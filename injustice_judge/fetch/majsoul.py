@@ -1,9 +1,9 @@
+import asyncio
 import re
-import google.protobuf as pb
 from google.protobuf.message import Message
 from google.protobuf.json_format import MessageToDict
 from ..proto import liqi_combined_pb2 as proto
-from ..utils import is_mangan, save_cache, sorted_hand
+from ..utils import is_mangan, load_cache, save_cache, sorted_hand
 from ..constants import Event, LIMIT_HANDS, MAJSOUL_YAKU, TRANSLATE, YAKUMAN
 from ..classes import Dir, GameMetadata, GameRules
 from ..classes2 import Kyoku
@@ -16,57 +16,304 @@ from typing import *
 
 MajsoulLog = List[Tuple[str, proto.Wrapper]]
 
+# The API's methods and messages are looked up by name, but building a message
+#   class from its descriptor is slow, and a game record wraps hundreds of
+#   messages. So we look up every method and generated message class once,
+#   the first time any of them is needed.
+_methods: Dict[str, Any] = {}
+_message_classes: Dict[str, Type[Message]] = {}
+
+def _build_registry() -> None:
+    for service in proto.DESCRIPTOR.services_by_name.values():
+        for method in service.methods:
+            _methods.setdefault(method.name, method)
+    for name in proto.DESCRIPTOR.message_types_by_name:
+        _message_classes[name] = getattr(proto, name)
+
+def get_method(name: str) -> Any:
+    """Get the MethodDescriptor for an API method like `fetchGameRecord`"""
+    if len(_methods) == 0:
+        _build_registry()
+    method = _methods.get(name)
+    assert method is not None, f"couldn't find method {name}"
+    return method
+
+def get_message_class(name: str) -> Type[Message]:
+    """Get the generated class for a message like `RecordNewRound`"""
+    if len(_message_classes) == 0:
+        _build_registry()
+    if name not in _message_classes:
+        raise Exception(f"Failed to find message name {name}")
+    return _message_classes[name]
+
+# error codes meaning our login is no longer valid, in which case we log in again
+# (151: not logged in, 1003: logged in elsewhere, 1004: login expired)
+MAJSOUL_RELOGIN_ERRORS = {151, 1003, 1004}
+
+class MahjongSoulError(Exception):
+    """Raised when a Mahjong Soul API call returns a response with an error code"""
+    def __init__(self, method_name: str, code: int) -> None:
+        super().__init__(f"{method_name} request received error {code}")
+        self.method_name = method_name
+        self.code = code
+
 class MahjongSoulAPI:
-    """Helper class to interface with the Mahjong Soul API"""
-    def __init__(self, endpoint: str) -> None:
+    """
+    Helper class to interface with the Mahjong Soul API over a single websocket.
+    Any number of `call`s can be awaited at once: each request gets its own
+      2-byte index, and a background task hands every response to the call
+      with the matching index.
+    If `heartbeat_interval` is given, a `heatbeat` call is made every
+      `heartbeat_interval` seconds to keep the connection alive.
+    """
+    def __init__(self, endpoint: str, heartbeat_interval: Optional[float] = None, timeout: float = 30) -> None:
         self.endpoint = endpoint
-    async def __aenter__(self) -> "MahjongSoulAPI":
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.ws: Any = None
+        self.ix = 0
+        # pending[ix] = future for the response to the request with index `ix`
+        self.pending: Dict[int, "asyncio.Future[bytes]"] = {}
+        self.tasks: List["asyncio.Task[None]"] = []
+    async def connect(self) -> None:
         import websockets
         self.ws = await websockets.connect(self.endpoint)  # type: ignore[attr-defined]
         self.ix = 0
+        self.tasks = [asyncio.create_task(self._receive_loop())]
+        if self.heartbeat_interval is not None:
+            self.tasks.append(asyncio.create_task(self._heartbeat_loop(self.heartbeat_interval)))
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.ws is not None:
+            await self.ws.close()
+        self._fail_pending(ConnectionError(f"connection to {self.endpoint} was closed"))
+    @property
+    def is_open(self) -> bool:
+        return self.ws is not None and len(self.tasks) > 0 and not self.tasks[0].done()
+    async def __aenter__(self) -> "MahjongSoulAPI":
+        await self.connect()
         return self
     async def __aexit__(self, err_type: Optional[Type[BaseException]], 
                               err_value: Optional[BaseException], 
                               traceback: Optional[Any]) -> bool:
-        await self.ws.close()
+        await self.close()
         return False
 
+    def _fail_pending(self, error: BaseException) -> None:
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending = {}
+    async def _receive_loop(self) -> None:
+        """Hand each response to the call waiting on its index, ignoring notifications"""
+        try:
+            async for rx in self.ws:
+                if rx[0] != 3: # 1 = notification, 2 = request, 3 = response
+                    continue
+                future = self.pending.pop(int.from_bytes(rx[1:3], "little"), None)
+                if future is not None and not future.done():
+                    future.set_result(rx[3:])
+        except Exception:
+            pass
+        self._fail_pending(ConnectionError(f"connection to {self.endpoint} was closed"))
+    async def _heartbeat_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.call("heatbeat")
+            except Exception:
+                # the connection is dead, so the next call will have to reconnect
+                return
+
     async def call(self, name: str, **fields: Any) -> Message:
-        method = next((svc.FindMethodByName(name) for svc in proto.DESCRIPTOR.services_by_name.values() if name in [method.name for method in svc.methods]), None)
-        assert method is not None, f"couldn't find method {name}"
+        import websockets
+        method = get_method(name)
+        if not self.is_open:
+            raise ConnectionError(f"connection to {self.endpoint} is not open")
 
         # prepare the payload (req) and a place to store the response (res)
-        req: Message = pb.reflection.MakeClass(method.input_type)(**fields)
-        res: Message = pb.reflection.MakeClass(method.output_type)()
+        req: Message = get_message_class(method.input_type.name)(**fields)
+        res: Message = get_message_class(method.output_type.name)()
         # the Res* response must have an error field
         assert hasattr(res, "error"), f"Got non-Res object: {res}\n\nfrom request: {req}"
 
+        # pick an index that isn't in use (indices are 2 bytes, so they wrap around)
+        while self.ix in self.pending:
+            self.ix = (self.ix + 1) % 65536
+        ix = self.ix
+        self.ix = (self.ix + 1) % 65536
+        future: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+        self.pending[ix] = future
+
         # wrap req in a Wrapper object and send it according to majsoul's protocol
-        tx: bytes = b'\x02' + self.ix.to_bytes(2, "little") + proto.Wrapper(name=f".{method.full_name}", data=req.SerializeToString()).SerializeToString()
-        await self.ws.send(tx)
-        # get the raw request back and validate that it has the same index as our request
-        rx: bytes = await self.ws.recv()
-        assert rx[0] == 3, f"Expected response message, got message of type {rx[0]}"
-        assert self.ix == int.from_bytes(rx[1:3], "little"), f"Expected response index {self.ix}, got index {int.from_bytes(rx[1:3], 'little')}"
-        self.ix += 1
+        tx: bytes = b'\x02' + ix.to_bytes(2, "little") + proto.Wrapper(name=f".{method.full_name}", data=req.SerializeToString()).SerializeToString()
+        try:
+            await self.ws.send(tx)
+            rx = await asyncio.wait_for(future, self.timeout)
+        except websockets.exceptions.ConnectionClosed as e:
+            raise ConnectionError(f"connection to {self.endpoint} was closed") from e
+        finally:
+            self.pending.pop(ix, None)
 
-        # parse the raw request from the Wrapper object
+        # parse the raw response from the Wrapper object
         wrapper = proto.Wrapper()
-        wrapper.ParseFromString(rx[3:])
+        wrapper.ParseFromString(rx)
         res.ParseFromString(wrapper.data)
-        assert not res.error.code, f"{method.full_name} request received error {res.error.code}"
+        if res.error.code:
+            raise MahjongSoulError(method.full_name, res.error.code)
         return res
 
+class MahjongSoulSession:
+    """
+    A logged-in `MahjongSoulAPI` connection that's reused across calls.
+    `login` is called with the connection to log in whenever we (re)connect.
+    If a call fails because the connection dropped or our login is no longer
+      valid (see `MAJSOUL_RELOGIN_ERRORS`), we reconnect, log in again, and retry once.
+    Any other error (e.g. a game that doesn't exist) is raised as is.
+    Call `close` when done with the session.
+    """
+    def __init__(self,
+                 endpoint: str,
+                 login: Callable[[MahjongSoulAPI], Awaitable[None]],
+                 client_version_string: str,
+                 heartbeat_interval: Optional[float] = 60) -> None:
+        self.endpoint = endpoint
+        self.login = login
+        self.client_version_string = client_version_string
+        self.heartbeat_interval = heartbeat_interval
+        self.api: Optional[MahjongSoulAPI] = None
+        self.lock = asyncio.Lock()
+    async def _connect(self, stale_api: Optional[MahjongSoulAPI] = None) -> MahjongSoulAPI:
+        async with self.lock:
+            # if someone else already reconnected while we waited, use their connection
+            if self.api is not None and self.api is not stale_api and self.api.is_open:
+                return self.api
+            if self.api is not None:
+                await self.api.close()
+                self.api = None
+            api = MahjongSoulAPI(self.endpoint, heartbeat_interval=self.heartbeat_interval)
+            await api.connect()
+            try:
+                await self.login(api)
+            except BaseException:
+                await api.close()
+                raise
+            self.api = api
+            return api
+    async def call(self, name: str, **fields: Any) -> Message:
+        api = self.api if self.api is not None and self.api.is_open else await self._connect()
+        try:
+            return await api.call(name, **fields)
+        except (MahjongSoulError, ConnectionError, OSError) as e:
+            if isinstance(e, MahjongSoulError):
+                if e.code not in MAJSOUL_RELOGIN_ERRORS:
+                    raise
+                print(f"{e}, logging in again...")
+            api = await self._connect(stale_api=api)
+            return await api.call(name, **fields)
+    async def close(self) -> None:
+        async with self.lock:
+            if self.api is not None:
+                await self.api.close()
+                self.api = None
+
+# one session per event loop, since a websocket can't be shared between loops
+# (stored as a task, so concurrent fetches wait on the same session being made)
+_majsoul_sessions: Dict[asyncio.AbstractEventLoop, "asyncio.Task[MahjongSoulSession]"] = {}
+
+async def get_majsoul_session() -> MahjongSoulSession:
+    """
+    Return the shared Mahjong Soul session for the running event loop, creating it if needed.
+    Logs in with the credentials in config.env (see README) on first call.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _majsoul_sessions:
+        for old_loop in [l for l in _majsoul_sessions if l.is_closed()]:
+            del _majsoul_sessions[old_loop]
+        _majsoul_sessions[loop] = asyncio.create_task(_make_majsoul_session())
+    try:
+        return await _majsoul_sessions[loop]
+    except BaseException:
+        # let the next fetch try again
+        _majsoul_sessions.pop(loop, None)
+        raise
+
+async def close_majsoul_session() -> None:
+    """
+    Close the shared Mahjong Soul session for the running event loop, if any.
+    Call this before the event loop finishes (e.g. at the end of the coroutine
+      passed to `asyncio.run`), so the websocket is closed cleanly.
+    """
+    task = _majsoul_sessions.pop(asyncio.get_running_loop(), None)
+    if task is None:
+        return
+    try:
+        session = await task
+    except Exception:
+        return # it never connected
+    await session.close()
+
+async def _make_majsoul_session() -> MahjongSoulSession:
+    import os
+    import dotenv
+    import uuid
+    from .http_client import get_http_client
+    client = get_http_client()
+
+    dotenv.load_dotenv("config.env")
+    USERNAME = os.getenv("ms_username")
+    PASSWORD = os.getenv("ms_password")
+    
+    if USERNAME is not None and PASSWORD is not None:
+        import hmac
+        import hashlib
+        # login to the Chinese server with USERNAME and PASSWORD
+        MS_VERSION = (await client.get("https://game.maj-soul.com/1/version.json")).json()["version"][:-2]
+        client_version_string = f"web-{MS_VERSION}"
+        async def login_cn(api: MahjongSoulAPI) -> None:
+            client_device_info = {"is_browser": True}
+            print("Calling login...")
+            await api.call(
+                "login",
+                account=USERNAME,
+                password=hmac.new(b"lailai", PASSWORD.encode(), hashlib.sha256).hexdigest(),  # type: ignore[union-attr]
+                device=client_device_info,
+                random_key=str(uuid.uuid1()),
+                client_version_string=client_version_string)
+        # url is the __MJ_GAME_INFO_API__ key of https://www.maj-soul.com/dhs/js/config.js
+        return MahjongSoulSession("wss://common-v2.maj-soul.com:443/gateway", login_cn, client_version_string)
+    else:
+        # login to the EN server with UID and TOKEN
+        UID = os.getenv("ms_uid")
+        TOKEN = os.getenv("ms_token")
+        MS_VERSION = (await client.get("https://mahjongsoul.game.yo-star.com/version.json")).json()["version"][:-2]
+        client_version_string = f"web-{MS_VERSION}"
+        async def login_en(api: MahjongSoulAPI) -> None:
+            print("Calling heatbeat...")
+            await api.call("heatbeat")
+            print("Requesting initial access token...")
+            USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/110.0"
+            access_token = (await client.post("https://passport.mahjongsoul.com/user/login", headers={"User-Agent": USER_AGENT, "Referer": "https://mahjongsoul.game.yo-star.com/"}, data={"uid":UID,"token":TOKEN,"deviceId":f"web|{UID}"})).json()["accessToken"]
+            print("Requesting oauth access token...")
+            oauth_token = cast(proto.ResOauth2Auth, await api.call("oauth2Auth", type=7, code=access_token, uid=UID, client_version_string=client_version_string)).access_token
+            print("Calling heatbeat...")
+            await api.call("heatbeat")
+            print("Calling oauth2Check...")
+            assert cast(proto.ResOauth2Check, await api.call("oauth2Check", type=7, access_token=oauth_token)).has_account, "couldn't find account with oauth2Check"
+            print("Calling oauth2Login...")
+            client_device_info = {"platform": "pc", "hardware": "pc", "os": "mac", "is_browser": True, "software": "Firefox", "sale_platform": "web"}  # type: ignore[dict-item]
+            await api.call("oauth2Login", type=7, access_token=oauth_token, reconnect=False, device=client_device_info, random_key=str(uuid.uuid1()), client_version={"resource": f"{MS_VERSION}.w"}, currency_platforms=[], client_version_string=client_version_string, tag="en")
+        return MahjongSoulSession("wss://mjusgs.mahjongsoul.com:9663/", login_en, client_version_string)
+
 def parse_wrapped_bytes(data: bytes) -> Tuple[str, Message]:
     """Used to unwrap Mahjong Soul messages in fetch_majsoul() below"""
     wrapper = proto.Wrapper()
     wrapper.ParseFromString(data)
-    name = wrapper.name.strip(f'.{proto.DESCRIPTOR.package}')
-    try:
-        msg = pb.reflection.MakeClass(proto.DESCRIPTOR.message_types_by_name[name])()
-        msg.ParseFromString(wrapper.data)
-    except KeyError as e:
-        raise Exception(f"Failed to find message name {name}")
+    name = wrapper.name.removeprefix(f'.{proto.DESCRIPTOR.package}.')
+    msg = get_message_class(name)()
+    msg.ParseFromString(wrapper.data)
     return name, msg
 
 def parse_majsoul_link(link: str) -> Tuple[str, Optional[int], Optional[int]]:
@@ -100,61 +347,12 @@ async def fetch_majsoul(link: str) -> Tuple[MajsoulLog, Dict[str, Any], Optional
     identifier, ms_account_id, player_seat = parse_majsoul_link(link)
 
     try:
-        f = open(f"cached_games/game-{identifier}.log", 'rb')
         record = proto.ResGameRecord()
-        record.ParseFromString(f.read())
+        record.ParseFromString(load_cache(f"game-{identifier}.log"))
     except Exception:
-        import os
-        import dotenv
-        import requests
-        import uuid
-
-        dotenv.load_dotenv("config.env")
-        USERNAME = os.getenv("ms_username")
-        PASSWORD = os.getenv("ms_password")
-        
-        if USERNAME is not None and PASSWORD is not None:
-            import hmac
-            import hashlib
-            # login to the Chinese server with USERNAME and PASSWORD
-            MS_VERSION = requests.get(url="https://game.maj-soul.com/1/version.json").json()["version"][:-2]
-
-            # url is the __MJ_GAME_INFO_API__ key of https://www.maj-soul.com/dhs/js/config.js
-            async with MahjongSoulAPI("wss://common-v2.maj-soul.com:443/gateway") as api:
-                client_version_string = f"web-{MS_VERSION}"
-                client_device_info = {"is_browser": True}
-                print("Calling login...")
-                await api.call(
-                    "login",
-                    account=USERNAME,
-                    password=hmac.new(b"lailai", PASSWORD.encode(), hashlib.sha256).hexdigest(),
-                    device=client_device_info,
-                    random_key=str(uuid.uuid1()),
-                    client_version_string=client_version_string)
-                print("Calling fetchGameRecord...")
-                record = cast(proto.ResGameRecord, await api.call("fetchGameRecord", game_uuid=identifier, client_version_string=client_version_string))
-        else:
-            # login to the EN server with UID and TOKEN
-            UID = os.getenv("ms_uid")
-            TOKEN = os.getenv("ms_token")
-            MS_VERSION = requests.get(url="https://mahjongsoul.game.yo-star.com/version.json").json()["version"][:-2]
-            async with MahjongSoulAPI("wss://mjusgs.mahjongsoul.com:9663/") as api:
-                print("Calling heatbeat...")
-                await api.call("heatbeat")
-                print("Requesting initial access token...")
-                USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/110.0"
-                access_token = requests.post(url="https://passport.mahjongsoul.com/user/login", headers={"User-Agent": USER_AGENT, "Referer": "https://mahjongsoul.game.yo-star.com/"}, data={"uid":UID,"token":TOKEN,"deviceId":f"web|{UID}"}).json()["accessToken"]
-                print("Requesting oauth access token...")
-                oauth_token = cast(proto.ResOauth2Auth, await api.call("oauth2Auth", type=7, code=access_token, uid=UID, client_version_string=f"web-{MS_VERSION}")).access_token
-                print("Calling heatbeat...")
-                await api.call("heatbeat")
-                print("Calling oauth2Check...")
-                assert cast(proto.ResOauth2Check, await api.call("oauth2Check", type=7, access_token=oauth_token)).has_account, "couldn't find account with oauth2Check"
-                print("Calling oauth2Login...")
-                client_device_info = {"platform": "pc", "hardware": "pc", "os": "mac", "is_browser": True, "software": "Firefox", "sale_platform": "web"}  # type: ignore[dict-item]
-                await api.call("oauth2Login", type=7, access_token=oauth_token, reconnect=False, device=client_device_info, random_key=str(uuid.uuid1()), client_version={"resource": f"{MS_VERSION}.w"}, currency_platforms=[], client_version_string=f"web-{MS_VERSION}", tag="en")
-                print("Calling fetchGameRecord...")
-                record = cast(proto.ResGameRecord, await api.call("fetchGameRecord", game_uuid=identifier, client_version_string=f"web-{MS_VERSION}"))
+        session = await get_majsoul_session()
+        print("Calling fetchGameRecord...")
+        record = cast(proto.ResGameRecord, await session.call("fetchGameRecord", game_uuid=identifier, client_version_string=session.client_version_string))
         save_cache(filename=f"game-{identifier}.log", data=record.SerializeToString())
 
     parsed = cast(proto.GameDetailRecords, parse_wrapped_bytes(record.data)[1])
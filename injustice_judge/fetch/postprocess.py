@@ -1,8 +1,9 @@
-from ..classes import CallInfo, Dir, GameMetadata, GameRules
+from ..classes import CallInfo, Dir, GameMetadata, GameRules, TileCounts
 from ..classes2 import Draw, Kyoku, Hand, Ron, Score, Tsumo
 from ..constants import Event, Shanten, TRANSLATE
 from ..display import round_name
-from ..utils import to_dora
+from ..profiler import profile_stage
+from ..utils import to_dora, to_dora_indicator
 from typing import *
 
 ###
@@ -19,6 +20,14 @@ def postprocess_events(all_events: List[List[Event]],
     e.g. shanten changes, tenpai, ending nagashi discards
     Return a list of kyoku, which contains the new event list plus all data about the round
     """
+    with profile_stage("postprocess"):
+        return _postprocess_events(all_events, metadata, all_dora_indicators, all_ura_indicators, all_walls)
+
+def _postprocess_events(all_events: List[List[Event]],
+                        metadata: GameMetadata,
+                        all_dora_indicators: List[List[int]],
+                        all_ura_indicators: List[List[int]],
+                        all_walls: List[List[int]]) -> List[Kyoku]:
     kyokus: List[Kyoku] = []
     for events, dora_indicators, ura_indicators, wall in zip(all_events, all_dora_indicators, all_ura_indicators, all_walls):
         assert len(events) > 0, "somehow got an empty events list"
@@ -35,6 +44,7 @@ def postprocess_events(all_events: List[List[Event]],
                 kyoku.events.append((seat, "shanten_change", old_shanten, new_shanten, kyoku.hands[seat], ukeire, kyoku.furiten[seat]))
         for i, (seat, event_type, *event_data) in enumerate(events):
             kyoku.events.append(events[i]) # copy every event we process
+            event_index = len(kyoku.events) - 1
             # if len(kyoku.hands) == metadata.num_players:
             #     print(seat, event_type, ph(kyoku.hands[seat].closed_part), "|", ph(kyoku.hands[seat].open_part), event_data)
             if event_type == "start_game":
@@ -44,6 +54,8 @@ def postprocess_events(all_events: List[List[Event]],
                 kyoku.tiles_in_wall = 70 if kyoku.num_players == 4 else 55
                 kyoku.doras = ([51, 52, 53] if metadata.rules.use_red_fives else []) + [to_dora(d, metadata.num_players) for d in dora_indicators]
                 kyoku.uras = [to_dora(d, metadata.num_players) for d in ura_indicators]
+                starting_indicators = [to_dora_indicator(d, metadata.num_players) for d in kyoku.doras if d not in {51,52,53}]
+                kyoku.visible_counts = TileCounts(starting_indicators[:kyoku.num_dora_indicators_visible])
             elif event_type == "haipai":
                 # initialize every variable for this seat to its starting value
                 hand = Hand(event_data[0])
@@ -61,7 +73,7 @@ def postprocess_events(all_events: List[List[Event]],
                 shanten_before_last_draw[seat] = kyoku.hands[seat].shanten
                 kyoku.hands[seat] = kyoku.hands[seat].add(tile)
                 kyoku.final_draw = tile
-                kyoku.final_draw_event_index[seat] = len(kyoku.events) - 1
+                kyoku.final_draw_event_index[seat] = event_index
                 kyoku.tiles_in_wall -= 1
                 assert len(kyoku.hands[seat].tiles) == 14
             elif event_type in {"discard", "riichi"}: # discards
@@ -70,8 +82,9 @@ def postprocess_events(all_events: List[List[Event]],
                 old_shanten = kyoku.hands[seat].shanten
                 kyoku.hands[seat] = kyoku.hands[seat].remove(tile)
                 kyoku.final_discard = tile
-                kyoku.final_discard_event_index[seat] = len(kyoku.events) - 1
+                kyoku.final_discard_event_index[seat] = event_index
                 kyoku.pond[seat].append(tile)
+                kyoku.visible_counts.add(tile)
                 update_shanten(seat)
                 if event_type == "riichi":
                     kyoku.riichi_sticks += 1
@@ -83,6 +96,7 @@ def postprocess_events(all_events: List[List[Event]],
                     kyoku.hands[seat] = kyoku.hands[seat].add(called_tile)
                     assert len(kyoku.hands[seat].tiles) == 14
                 kyoku.hands[seat] = kyoku.hands[seat].add_call(CallInfo(event_type, called_tile, call_dir, call_tiles))
+                kyoku.add_visible_call(kyoku.hands[seat].calls[-1])
             elif event_type in {"ankan", "kakan", "kita"}: # special discards
                 # process a self call (which is like a special discard)
                 called_tile, call_tiles, call_dir = event_data
@@ -91,14 +105,17 @@ def postprocess_events(all_events: List[List[Event]],
                 # and add the pon call to the kakan tiles
                 if event_type == "kakan":
                     _, kyoku.hands[seat] = kyoku.hands[seat].kakan(called_tile)
+                    kyoku.visible_counts.add(called_tile)
                 elif event_type == "ankan":
                     kyoku.hands[seat] = kyoku.hands[seat].add_call(CallInfo("ankan", called_tile, Dir.SELF, (called_tile,)*4))
+                    kyoku.add_visible_call(kyoku.hands[seat].calls[-1])
                 elif event_type == "kita":
                     kyoku.hands[seat] = kyoku.hands[seat].kita()
+                    kyoku.add_visible_call(kyoku.hands[seat].calls[-1])
                 kyoku.hands[seat] = kyoku.hands[seat].remove(called_tile)
                 update_shanten(seat) # kans may change your wait
                 kyoku.final_discard = called_tile
-                kyoku.final_discard_event_index[seat] = len(kyoku.events) - 1
+                kyoku.final_discard_event_index[seat] = event_index
                 assert len(kyoku.hands[seat].tiles) == 13
             elif event_type == "end_game":
                 # process the result of a game; most of this is handled in parse_result
@@ -112,14 +129,17 @@ def postprocess_events(all_events: List[List[Event]],
                         if len(kyoku.hands[seat].tiles) == 14:
                             kyoku.hands[seat] = kyoku.hands[seat].remove(kyoku.final_draw)
                             break
+            # remember the resulting hand so flags.py doesn't have to rebuild it
+            if event_type in {"haipai", "draw", "discard", "riichi", "chii", "pon", "minkan", "ankan", "kakan", "kita"}:
+                kyoku.hand_after_event[event_index] = kyoku.hands[seat]
             # if the flag is set, we flip kan dora after processing a discard
             if flip_kan_dora_next_discard and event_type in {"discard", "riichi"}:
                 flip_kan_dora_next_discard = False
-                kyoku.num_dora_indicators_visible += 1
+                kyoku.flip_dora_indicator()
             # if this was a kan action, we set the dora flip flag for next discard
             if event_type in {"minkan", "ankan", "kakan"}:
                 if metadata.rules.immediate_kan_dora:
-                    kyoku.num_dora_indicators_visible += 1
+                    kyoku.flip_dora_indicator()
                 else:
                     flip_kan_dora_next_discard = True
         assert len(kyoku.hands) > 0, f"somehow we never initialized the kyoku at index {len(kyokus)}"
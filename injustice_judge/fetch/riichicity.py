@@ -2,7 +2,7 @@ from ..classes import Dir, GameMetadata, GameRules
 from ..classes2 import Kyoku
 from ..constants import Event, RIICHICITY_YAKU, LIMIT_HANDS, TRANSLATE, YAKUMAN
 from ..display import round_name
-from ..utils import calc_ko_oya_points, is_mangan, save_cache, sorted_hand
+from ..utils import calc_ko_oya_points, is_mangan, load_cache, save_cache, sorted_hand
 from .postprocess import postprocess_events
 from typing import *
 
@@ -12,32 +12,33 @@ from typing import *
 
 RiichiCityLog = List[Any]
 
-def fetch_riichicity(identifier: str) -> Tuple[RiichiCityLog, Dict[str, Any]]:
+RIICHICITY_URL = "http://13.112.183.79"
+
+async def fetch_riichicity(identifier: str, base_url: str = RIICHICITY_URL) -> Tuple[RiichiCityLog, Dict[str, Any]]:
     """
     Fetch a raw riichi city log given the log identifier.
     Example identifier: cm775fuai08d9bndf24g
     """
     import json
     try:
-        f = open(f"cached_games/game-{identifier}.json", 'rb')
-        game_data = json.load(f)
+        game_data = json.loads(load_cache(f"game-{identifier}.json"))
     except Exception:
         import os
         import dotenv
-        import requests
         import urllib3
+        from .http_client import get_http_client
         dotenv.load_dotenv("config.env")
         SID = os.getenv("rc_sid")
         if SID is not None:
-            game_data = requests.post(
-                url="http://13.112.183.79/record/getRoomData",
+            r = await get_http_client().post(
+                f"{base_url}/record/getRoomData",
                 headers={
                     "Cookies": "{\"sid\":\"" + SID + "\"}",
                     "User-Agent": urllib3.util.SKIP_HEADER,  # type: ignore[attr-defined]
                     "Accept-Encoding": urllib3.util.SKIP_HEADER,  # type: ignore[attr-defined]
-                    "Connection": "close",
                 },
-                data="{\"keyValue\":\"" + identifier + "\"}").json()
+                data="{\"keyValue\":\"" + identifier + "\"}")
+            game_data = r.json()
             if game_data["code"] != 0:
                 raise Exception(f"Error {game_data['code']}: {game_data['message']}")
         else:
@@ -2,7 +2,7 @@ import re
 from ..constants import Event, TENHOU_LIMITS, TENHOU_YAKU
 from ..classes import Dir, GameMetadata, GameRules
 from ..classes2 import Kyoku
-from ..utils import calc_ko_oya_points, ix_to_tile, normalize_red_five, save_cache, sorted_hand
+from ..utils import calc_ko_oya_points, ix_to_tile, load_cache, normalize_red_five, save_cache, sorted_hand
 from ..display import round_name
 from ..wall import seed_wall, next_wall
 from .postprocess import postprocess_events
@@ -42,7 +42,9 @@ def parse_tenhou_link(link: str) -> Tuple[str, Optional[int]]:
 
     return identifier, player_seat
 
-def fetch_tenhou(link: str, use_xml: bool = True) -> Tuple[TenhouLog, Dict[str, Any], Optional[int]]:
+TENHOU_URL = "https://tenhou.net"
+
+async def fetch_tenhou(link: str, use_xml: bool = True, base_url: str = TENHOU_URL) -> Tuple[TenhouLog, Dict[str, Any], Optional[int]]:
     """
     Fetch a raw tenhou log from a given link, returning a parsed log and the specified player's seat
     Example link: https://tenhou.net/0/?log=2023072712gm-0089-0000-eff781e1&tw=1&ts=4
@@ -51,20 +53,22 @@ def fetch_tenhou(link: str, use_xml: bool = True) -> Tuple[TenhouLog, Dict[str,
     identifier, player_seat = parse_tenhou_link(link)
 
     try:
-        f = open(f"cached_games/game-{identifier}.json", 'r')
-        game_data = json.load(f)
+        game_data = json.loads(load_cache(f"game-{identifier}.json"))
     except Exception:
         import requests
+        from .http_client import get_http_client
+        client = get_http_client()
         USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/110.0"
         if use_xml:
-            url = f"https://tenhou.net/0/log/?{identifier}"
+            url = f"{base_url}/0/log/?{identifier}"
         else:
-            url = f"https://tenhou.net/5/mjlog2json.cgi?{identifier}"
+            url = f"{base_url}/5/mjlog2json.cgi?{identifier}"
         # print(f" Fetching game log at url {url}")
-        r = requests.get(url=url, headers={"User-Agent": USER_AGENT})
         try:
+            r = await client.get(url, headers={"User-Agent": USER_AGENT})
             r.raise_for_status()
-            game_data = r.json()
+            if not use_xml:
+                game_data = r.json()
         except (requests.exceptions.HTTPError,
                 requests.exceptions.ConnectionError,
                 requests.exceptions.ProxyError,
@@ -72,10 +76,13 @@ def fetch_tenhou(link: str, use_xml: bool = True) -> Tuple[TenhouLog, Dict[str,
                 requests.exceptions.Timeout,
                 requests.exceptions.ConnectTimeout,
                 requests.exceptions.ReadTimeout,
+                requests.exceptions.RetryError,
                 json.decoder.JSONDecodeError):
+            if use_xml:
+                raise
             use_xml = True
-            url = f"https://tenhou.net/0/log/?{identifier}"
-            r = requests.get(url=url, headers={"User-Agent": USER_AGENT})
+            url = f"{base_url}/0/log/?{identifier}"
+            r = await client.get(url, headers={"User-Agent": USER_AGENT})
             r.raise_for_status()
         if use_xml:
             log, game_data = tenhou_xml_to_log(identifier, r.text)
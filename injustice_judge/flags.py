@@ -1,10 +1,11 @@
-from .classes import CallInfo, Dir
+from .classes import CallInfo, Dir, TileCounts
 from .classes2 import Draw, Hand, Kyoku, Ron, Score, Tsumo, Win
 from dataclasses import dataclass, field
 from .constants import Event, Shanten, JIHAI, LIMIT_HANDS, TRANSLATE, YAKUMAN, YAOCHUUHAI
 from .display import ph, pt, print_pond, round_name
+from .safety import SafetyMap
 from enum import Enum
-from .utils import apply_delta_scores, get_score, get_taatsu_wait, is_mangan, is_safe, normalize_red_five, normalize_red_fives, to_dora_indicator, to_placement
+from .utils import apply_delta_scores, get_score, get_taatsu_wait, is_mangan, normalize_red_five, normalize_red_fives, to_dora_indicator, to_placement
 from .wall import print_wall, get_hidden_dead_wall, get_remaining_draws
 from .yaku import get_final_yaku, get_yaku, get_yakuman_tenpais, get_yakuman_waits
 from typing import *
@@ -16,6 +17,8 @@ from pprint import pprint
 # Every flag is generated from an event in Kyoku.events, and the idea in
 #   `determine_flags` is to process the events in order, resulting in an
 #   ordered list of facts about the given `Kyoku`, one for each player.
+#   Hands aren't rebuilt here: `postprocess_events` already replayed them, so
+#   each hand-changing event just looks up `Kyoku.hand_after_event`.
 #   
 # Flags are represented by a list of `Flags` objects, each one corresponding
 #   to a fact and each one associated with some data represented by a `data`
@@ -23,7 +26,9 @@ from pprint import pprint
 #   where the data at index `i` corresponds to the flag at index `i`. There's
 #   no documentation on the `data` dict associated with each type of flag --
 #   you'll have to go down and examine the code generating that specific
-#   flag.
+#   flag. Each player's flags are kept in a `FlagSet`, which behaves like the
+#   list of flags but also indexes them by flag, so membership tests and
+#   finding the last instance of a flag don't need to scan the list.
 # 
 # The resulting flags are used in `evaluate_injustices` in `injustices.py`,
 #   which checks for combinations of flags that might constitute an injustice.
@@ -150,11 +155,89 @@ Flags = Enum("Flags", "_SENTINEL"
     " YOUR_YAKULESS_HAND_COULD_HAVE_WON"
     )
 
+def flags_to_mask(flags: Iterable[Flags]) -> int:
+    """Bitmask of the given flags, in the same format as `FlagSet.mask`"""
+    mask = 0
+    for flag in flags:
+        mask |= 1 << flag.value
+    return mask
+
+class FlagSet(Sequence[Flags]):
+    """
+    An ordered list of flags plus their data, indexed by flag.
+    `flag in flag_set` checks a bitmask, and `index`/`last_index` look up a
+      per-flag list of positions, so neither scans the whole list.
+    Only modify it via `add` and `remove`.
+    """
+    __slots__ = ("flags", "data", "mask", "positions")
+    def __init__(self, flags: Iterable[Flags] = (), data: Iterable[Any] = ()) -> None:
+        self.flags: List[Flags] = []
+        self.data: List[Any] = []
+        self.mask: int = 0
+        # positions[flag] = every index of `flag` in `self.flags`, in order
+        self.positions: Dict[Flags, List[int]] = {}
+        for flag, d in zip(flags, data):
+            self.add(flag, d)
+    def add(self, flag: Flags, data: Any = None) -> None:
+        self.positions.setdefault(flag, []).append(len(self.flags))
+        self.mask |= 1 << flag.value
+        self.flags.append(flag)
+        self.data.append(data)
+    def remove(self, flag: Flags, data: Any = None) -> bool:
+        """Remove the first instance of `flag` (with the given data, if given). Returns true if something was removed"""
+        ix = next((i for i in self.positions.get(flag, []) if data is None or self.data[i] == data), None)
+        if ix is None:
+            return False
+        del self.flags[ix]
+        del self.data[ix]
+        # rebuild the index, since every later position shifts down by one
+        self.mask = 0
+        self.positions = {}
+        for i, flag in enumerate(self.flags):
+            self.positions.setdefault(flag, []).append(i)
+            self.mask |= 1 << flag.value
+        return True
+    def __contains__(self, flag: object) -> bool:
+        return isinstance(flag, Flags) and bool(self.mask & (1 << flag.value))
+    def index(self, flag: Flags, start: int = 0, stop: Optional[int] = None) -> int:
+        if start != 0 or stop is not None:
+            return self.flags.index(flag, start, len(self.flags) if stop is None else stop)
+        if flag not in self:
+            raise ValueError(f"{flag} is not in FlagSet")
+        return self.positions[flag][0]
+    def last_index(self, flag: Flags) -> int:
+        if flag not in self:
+            raise ValueError(f"{flag} is not in FlagSet")
+        return self.positions[flag][-1]
+    def get_data(self, flag: Flags) -> Any:
+        """Data of the first instance of `flag`"""
+        return self.data[self.index(flag)]
+    def get_last_data(self, flag: Flags) -> Any:
+        """Data of the last instance of `flag`"""
+        return self.data[self.last_index(flag)]
+    def count(self, flag: Any) -> int:
+        return len(self.positions.get(flag, ()))
+    @overload
+    def __getitem__(self, i: int) -> Flags: ...
+    @overload
+    def __getitem__(self, i: slice) -> List[Flags]: ...
+    def __getitem__(self, i: Union[int, slice]) -> Union[Flags, List[Flags]]:
+        return self.flags[i]
+    def __iter__(self) -> Iterator[Flags]:
+        return iter(self.flags)
+    def __len__(self) -> int:
+        return len(self.flags)
+    def __add__(self, other: "FlagSet") -> "FlagSet":
+        return FlagSet((*self.flags, *other.flags), (*self.data, *other.data))
+    def __repr__(self) -> str:
+        return f"FlagSet({self.flags!r})"
+
 @dataclass
 class KyokuPlayerState:
     """The state of a player that gets updated as we calculate flags."""
     num_players: int
     hand: Hand
+    safety: SafetyMap
     pond: List[int]                                   = field(default_factory=list)
     genbutsu: Set[int]                                = field(default_factory=set)
     turn: int                                         = 0
@@ -202,37 +285,59 @@ class KyokuState:
     starting_doras: List[int]       = field(default_factory=list) # TODO 3 starting doras
     current_doras: List[int]        = field(default_factory=list)
     at: List[KyokuPlayerState]      = field(default_factory=list)
-    visible_tiles: List[int]        = field(default_factory=list) # TODO remove
-    flags: List[List[Flags]]        = field(default_factory=list)
-    data: List[List[Any]]           = field(default_factory=list)
-    global_flags: List[Flags]       = field(default_factory=list)
-    global_data: List[Any]          = field(default_factory=list)
-    def get_visible_tiles(self) -> List[int]:
-        return self.visible_tiles \
-             + [to_dora_indicator(dora, self.num_players) for dora in self.current_doras if dora not in {51,52,53}]
+    # `visible_counts` counts all pond tiles, self-kan tiles, and dora indicators
+    visible_counts: TileCounts      = field(default_factory=TileCounts)
+    flags: List[FlagSet]            = field(default_factory=list)
+    global_flags: FlagSet           = field(default_factory=FlagSet)
+    # yaku_cache[seat, hand, doras, is_last_tile, is_tsumo] = result of get_yaku for that seat's hand
+    # cleared on riichi, calls, and dora flips
+    yaku_cache: Dict[Tuple[Any, ...], Dict[int, Score]] = field(default_factory=dict)
+    def __post_init__(self) -> None:
+        for dora in self.current_doras:
+            self._add_visible_dora_indicator(dora)
+    def _add_visible_dora_indicator(self, dora: int) -> None:
+        if dora not in {51,52,53}:
+            self._add_visible(to_dora_indicator(dora, self.num_players))
+    def _add_visible(self, tile: int) -> None:
+        self.visible_counts.add(tile)
+        for at in self.at:
+            at.safety.add_visible(tile)
+    def _add_genbutsu(self, player: int, tile: int) -> None:
+        self.at[player].genbutsu.add(tile)
+        self.at[player].safety.add_genbutsu(tile)
+    def get_visible_counts(self) -> TileCounts:
+        return self.visible_counts
     def add_flag(self, seat: int, flag: Flags, data: Optional[Dict[str, Any]] = None) -> None:
-        self.flags[seat].append(flag)
-        self.data[seat].append(data)
+        self.flags[seat].add(flag, data)
     def remove_flag(self, seat: int, flag: Flags) -> None:
-        ix = self.flags[seat].index(flag)
-        del self.flags[seat][ix]
-        del self.data[seat][ix]
+        if not self.flags[seat].remove(flag):
+            raise ValueError(f"{flag} is not in seat {seat}'s flags")
     def add_global_flag(self, flag: Flags, data: Optional[Dict[str, Any]] = None) -> None:
-        self.global_flags.append(flag)
-        self.global_data.append(data)
+        self.global_flags.add(flag, data)
     def remove_global_flag(self, flag: Flags, data: Optional[Dict[str, Any]] = None) -> None:
-        ix = None
-        for i, f in enumerate(self.global_flags):
-            if f == flag and (data is None or self.global_data[i] == data):
-                ix = i
-                break
-        if ix is not None:
-            del self.global_flags[ix]
-            del self.global_data[ix]
+        self.global_flags.remove(flag, data)
+    def get_current_yaku(self, seat: int, is_tsumo: bool) -> Dict[int, Score]:
+        """Call get_yaku on `seat`'s current hand, reusing the result if nothing relevant changed since the last call"""
+        hand = self.at[seat].hand
+        is_last_tile = self.tiles_in_wall == 0
+        key = (seat, hand.tiles, tuple(hand.calls), hand.kita_count, tuple(self.current_doras), is_last_tile, is_tsumo)
+        if key not in self.yaku_cache:
+            self.yaku_cache[key] = get_yaku(hand = hand,
+                                            timeline = self.kyoku.timeline,
+                                            doras = self.current_doras,
+                                            uras = self.kyoku.uras,
+                                            round = self.kyoku.round,
+                                            seat = seat,
+                                            is_last_tile = is_last_tile,
+                                            num_players = self.num_players,
+                                            rules = self.kyoku.rules,
+                                            check_rons = not is_tsumo,
+                                            check_tsumos = is_tsumo)
+        return self.yaku_cache[key]
 
     def process_haipai(self, i: int, seat: int, event_type: str, hand: Tuple[int, ...]) -> None:
         assert len(self.at) == seat, f"got haipai out of order, expected seat {len(self.at)} but got seat {seat}"
-        self.at.append(KyokuPlayerState(num_players=self.num_players, hand=Hand(hand), nagashi=self.kyoku.rules.nagashi_mangan))
+        self.at.append(KyokuPlayerState(num_players=self.num_players, hand=self.kyoku.hand_after_event[i], safety=SafetyMap(self.visible_counts), nagashi=self.kyoku.rules.nagashi_mangan))
         # check if we have at least 7 terminal/honor tiles
         num_types = len(set(hand) & YAOCHUUHAI) # of terminal/honor tiles
         if num_types >= 7:
@@ -241,7 +346,7 @@ class KyokuState:
         if self.at[seat].hand.shanten[0] <= 1:
             self.add_flag(seat, Flags.IISHANTEN_START, {"hand": self.at[seat].hand})
         # check if we have a 5 shanten start or worse
-        if self.at[seat].hand.shanten[0] >= 5:
+        if self.at[seat].hand.shanten_number >= 5:
             self.add_flag(seat, Flags.FIVE_SHANTEN_START, {"hand": self.at[seat].hand})
         # check if we started with 3 dora
         starting_dora = sum(hand.count(dora) for dora in self.kyoku.get_starting_doras())
@@ -250,7 +355,7 @@ class KyokuState:
 
     def process_draw(self, i: int, seat: int, event_type: str, tile: int) -> None:
         prev_hand = self.at[seat].hand
-        self.at[seat].hand = self.at[seat].hand.add(tile)
+        self.at[seat].hand = self.kyoku.hand_after_event[i]
         self.at[seat].turn += 1
         self.tiles_in_wall -= 1
         self.at[seat].last_draw = tile
@@ -289,8 +394,7 @@ class KyokuState:
         for opponent, at in enumerate(self.at):
             if seat == opponent or not at.in_riichi:
                 continue
-            safe = lambda t: is_safe(t, self.at[opponent].genbutsu, self.get_visible_tiles())
-            if not safe(tile) and not any(safe(t) for t in self.at[seat].hand.hidden_part):
+            if not at.safety.is_safe(tile) and at.safety.count_safe(self.at[seat].hand.hidden_part) == 0:
                 self.at[seat].dangerous_draws_after_riichi.append(tile)
                 if len(self.at[seat].dangerous_draws_after_riichi) >= 4:
                     self.add_flag(seat, Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI,
@@ -324,10 +428,8 @@ class KyokuState:
         self.at[seat].turn += 1
         self.at[seat].consecutive_calls += 1
         prev_hand = self.at[seat].hand
-        if event_type != "minkan":
-            self.at[seat].hand = self.at[seat].hand.add(called_tile)
-        call = CallInfo(event_type, called_tile, call_dir, call_tiles)
-        self.at[seat].hand = self.at[seat].hand.add_call(call)
+        self.at[seat].hand = self.kyoku.hand_after_event[i]
+        call = self.at[seat].hand.ordered_calls[-1]
         # end their nagashi
         callee_seat = (seat + call_dir) % 4
         if self.at[callee_seat].nagashi:
@@ -358,7 +460,7 @@ class KyokuState:
                     for discard, tenpai in chii_hand.get_possible_tenpais().items():
                         score = max(get_yaku(
                             hand = tenpai,
-                            events = self.kyoku.events[:i],
+                            timeline = self.kyoku.timeline,
                             doras = self.kyoku.doras,
                             uras = self.kyoku.uras,
                             round = self.kyoku.round,
@@ -367,7 +469,8 @@ class KyokuState:
                             num_players = self.num_players,
                             rules = self.kyoku.rules,
                             check_rons = True,
-                            check_tsumos = True).values())
+                            check_tsumos = True,
+                            position = i).values())
                         is_limit = score.han >= 6 or is_mangan(score.han, score.fu)
                         if score.han >= 4: # minimum of 4 han to trigger this flag
                             if best_score is None or score > best_score:
@@ -388,11 +491,11 @@ class KyokuState:
         # clear all passed calls
         self.at[seat].passed_calls = []
         # check if we're still 4-shanten or worse after the first row of discards
-        if self.at[seat].num_discards == 6 and prev_hand.shanten[0] >= 4:
+        if self.at[seat].num_discards == 6 and prev_hand.shanten_number >= 4:
             self.add_flag(seat, Flags.FOUR_SHANTEN_AFTER_FIRST_ROW, {"shanten": prev_hand.shanten})
         # check if we're iishanten with zero tiles left
         if 1 <= self.at[seat].hand.shanten[0] < 2:
-            ukeire = self.at[seat].hand.ukeire(self.get_visible_tiles())
+            ukeire = self.at[seat].hand.ukeire(self.get_visible_counts())
             if ukeire == 0:
                 self.add_flag(seat, Flags.IISHANTEN_WITH_ZERO_TILES, {"shanten": self.at[seat].hand.shanten})
         # check if we drew into potential tenpai
@@ -412,23 +515,17 @@ class KyokuState:
     def process_self_kan(self, i: int, seat: int, event_type: str, called_tile: int, call_tiles: Tuple[int, ...], call_dir: Dir) -> None:
         self.at[seat].turn += 1
         self.at[seat].consecutive_calls += 1
+        self.at[seat].hand = self.kyoku.hand_after_event[i]
+        call = self.at[seat].hand.ordered_calls[-1]
         if event_type == "kakan":
-            i, self.at[seat].hand = self.at[seat].hand.kakan(called_tile)
-            call = self.at[seat].hand.calls[i]
             # add to genbutsu for this player + all the riichi players
             for player in {player for player, at in enumerate(self.at) if at.in_riichi} | {seat}:
-                self.at[player].genbutsu.add(called_tile)
-        elif event_type == "ankan":
-            call = CallInfo("ankan", called_tile, Dir.SELF, (called_tile,)*4)
-            self.at[seat].hand = self.at[seat].hand.add_call(call)
+                self._add_genbutsu(player, called_tile)
         elif event_type == "kita":
-            self.at[seat].hand = self.at[seat].hand.kita()
             self.num_kitas += 1
-            call = self.at[seat].hand.calls[-1]
-        else:
+        elif event_type != "ankan":
             assert False, f"process_self_kan called with non-self-kan type {event_type}"
-        self.at[seat].hand = self.at[seat].hand.remove(called_tile)
-        self.visible_tiles.append(called_tile)
+        self._add_visible(called_tile)
         # check if anyone's tenpai and had their waits erased by ankan
         if event_type == "ankan":
             tile = normalize_red_five(called_tile)
@@ -436,7 +533,7 @@ class KyokuState:
                 if seat == player:
                     continue
                 if Flags.YOU_REACHED_TENPAI in self.flags[player]:
-                    last_tenpai_data = self.data[player][len(self.flags[player]) - 1 - self.flags[player][::-1].index(Flags.YOU_REACHED_TENPAI)]
+                    last_tenpai_data = self.flags[player].get_last_data(Flags.YOU_REACHED_TENPAI)
                     wait = last_tenpai_data["hand"].shanten[1]
                     ukeire = last_tenpai_data["ukeire"]
                     if tile in wait:
@@ -448,8 +545,8 @@ class KyokuState:
             self.at[seat].riichi_index = len(self.at[seat].pond)
         prev_hand = self.at[seat].hand
         prev_discard = self.at[seat].last_discard
-        self.at[seat].hand = self.at[seat].hand.remove(tile)
-        self.visible_tiles.append(tile)
+        self.at[seat].hand = self.kyoku.hand_after_event[i]
+        self._add_visible(tile)
         self.at[seat].pond.append(tile)
         self.at[seat].num_discards += 1
         self.at[seat].last_discard = tile
@@ -469,6 +566,7 @@ class KyokuState:
         # add riichi flag
         if event_type == "riichi":
             self.at[seat].in_riichi = True
+            self.yaku_cache.clear()
             self.add_flag(seat, Flags.YOU_DECLARED_RIICHI)
             # if there's a triple riichi, give Flags.AGAINST_TRIPLE_RIICHI to the non-riichi person
             if self.num_players == 4 and sum(1 for at in self.at if at.in_riichi) == 3:
@@ -525,7 +623,7 @@ class KyokuState:
         # check if this discard respects/disrespects anyone's riichi
         for opponent, at in enumerate(self.at):
             if at.in_riichi and self.at[opponent].respects_riichi[seat] is None: # first discard after opponent's riichi
-                self.at[opponent].respects_riichi[seat] = is_safe(tile, self.at[opponent].genbutsu, self.get_visible_tiles())
+                self.at[opponent].respects_riichi[seat] = at.safety.is_safe(tile)
                 if all(self.at[opponent].respects_riichi[player] == False for player in range(self.num_players) if player != opponent):
                     self.add_flag(opponent, Flags.EVERYONE_DISRESPECTED_YOUR_RIICHI)
                 elif all(self.at[opponent].respects_riichi[player] == True for player in range(self.num_players) if player != opponent):
@@ -536,13 +634,13 @@ class KyokuState:
             if len(riichi_waits) > 0 and not any(tile in waits for waits in riichi_waits.values()):
                 # check if it was dangerous against any of the riichis
                 is_generally_safe = tile in YAOCHUUHAI
-                if not is_generally_safe and any(not is_safe(tile, self.at[player].genbutsu, self.get_visible_tiles()) for player in riichi_waits.keys()):
+                if not is_generally_safe and any(not self.at[player].safety.is_safe(tile) for player in riichi_waits.keys()):
                     self.at[seat].dangerous_discards_passed.append(tile)
                     if len(self.at[seat].dangerous_discards_passed) >= 4:
                         self.add_flag(seat, Flags.PASSED_FOUR_DANGEROUS_DISCARDS, {"discards": self.at[seat].dangerous_discards_passed})
         # add to genbutsu for this player + all the riichi players
         for player in {player for player, at in enumerate(self.at) if at.in_riichi} | {seat}:
-            self.at[player].genbutsu.add(tile)
+            self._add_genbutsu(player, tile)
         # populate passed_calls/all_passed_calls for every player who could have called this discard
         for player, at in enumerate(self.at):
             if player == seat:
@@ -559,17 +657,7 @@ class KyokuState:
             is_tsumo = player == seat
             if at.hand.shanten[0] == 0 and normalize_red_five(tile) in at.hand.shanten[1]:
                 # check if we were yakuless, which would prevent us from winning
-                yaku = get_yaku(hand = at.hand,
-                                events = self.kyoku.events,
-                                doras = self.current_doras,
-                                uras = self.kyoku.uras,
-                                round = self.kyoku.round,
-                                seat = player,
-                                is_last_tile = self.tiles_in_wall == 0,
-                                num_players = self.num_players,
-                                rules = self.kyoku.rules,
-                                check_rons = not is_tsumo,
-                                check_tsumos = is_tsumo)
+                yaku = self.get_current_yaku(player, is_tsumo)
                 current_dir = Dir((4+seat-player)%4)
                 # check if we were furiten, which would prevent us from ronning
                 furiten = not is_tsumo and (at.furiten or at.temporary_furiten is not None)
@@ -599,7 +687,7 @@ class KyokuState:
         tiles_unique = tuple(set(tiles))
         self.at[seat].chiiable_tiles = set().union(*map(get_taatsu_wait, zip(tiles_unique[:-1],tiles_unique[1:])),
                                                    *map(get_taatsu_wait, zip(tiles_unique[:-2],tiles_unique[2:])))
-        self.at[seat].ponnable_tiles = {k for k, v in Counter(tiles).items() if v in {2, 3}}
+        self.at[seat].ponnable_tiles = {tile for tile in tiles_unique if hand.hidden_counts.count(tile) in {2, 3}}
         # record past waits if we've changed from tenpai
         if prev_shanten[0] == 0:
             self.at[seat].past_waits.append(list(prev_shanten[1]))
@@ -621,25 +709,25 @@ class KyokuState:
                 if other == seat:
                     continue
                 if Flags.YOU_REACHED_TENPAI in self.flags[other]:
-                    other_data = self.data[other][len(self.flags[other]) - 1 - self.flags[other][::-1].index(Flags.YOU_REACHED_TENPAI)]
-                    visible_tiles = self.get_visible_tiles()
+                    other_data = self.flags[other].get_last_data(Flags.YOU_REACHED_TENPAI)
+                    visible_counts = self.get_visible_counts()
                     self.add_flag(seat, Flags.YOU_CHASED,
                                          {"your_seat": seat,
                                           "your_hand": hand,
-                                          "your_ukeire": hand.ukeire(visible_tiles),
+                                          "your_ukeire": hand.ukeire(visible_counts),
                                           "your_furiten": furiten,
                                           "seat": other,
                                           "hand": other_data["hand"],
-                                          "ukeire": other_data["hand"].ukeire(visible_tiles),
+                                          "ukeire": other_data["hand"].ukeire(visible_counts),
                                           "furiten": other_data["furiten"]})
                     self.add_flag(other, Flags.YOU_GOT_CHASED,
                                          {"seat": seat,
                                           "hand": hand,
-                                          "ukeire": hand.ukeire(visible_tiles),
+                                          "ukeire": hand.ukeire(visible_counts),
                                           "furiten": furiten,
                                           "your_seat": other,
                                           "your_hand": other_data["hand"],
-                                          "your_ukeire": other_data["hand"].ukeire(visible_tiles),
+                                          "your_ukeire": other_data["hand"].ukeire(visible_counts),
                                           "your_furiten": other_data["furiten"]})
         self.add_global_flag(Flags.SOMEONE_REACHED_TENPAI,
                              {"seat": seat,
@@ -649,7 +737,7 @@ class KyokuState:
                               "haipai": self.kyoku.haipai[seat]})
         self.add_flag(seat, Flags.YOU_REACHED_TENPAI,
                             {"hand": hand,
-                             "ukeire": hand.ukeire(self.get_visible_tiles()),
+                             "ukeire": hand.ukeire(self.get_visible_counts()),
                              "furiten": furiten,
                              "turn": len(self.at[seat].pond),
                              "haipai": self.kyoku.haipai[seat]})
@@ -676,7 +764,7 @@ class KyokuState:
         # check if we are mangan+ tenpai
         get_yaku_args = {
             "hand": hand,
-            "events": self.kyoku.events,
+            "timeline": self.kyoku.timeline,
             "doras": self.kyoku.doras,
             "uras": self.kyoku.uras if self.at[seat].in_riichi else [],
             "round": self.kyoku.round,
@@ -719,7 +807,7 @@ class KyokuState:
         # first, do standard yakuman, otherwise, try kazoe yakuman
         yakuman_waits: List[Tuple[str, Set[int]]] = [(y, get_yakuman_waits(self.at[seat].hand, y)) for y in get_yakuman_tenpais(self.at[seat].hand)]
         # only report the yakuman if the waits are not dead
-        visible = self.get_visible_tiles()
+        visible = self.get_visible_counts()
         yakuman_types: Set[str] = {t for t, waits in yakuman_waits if not all(visible.count(wait) == 4 for wait in waits)}
         if len(yakuman_types) > 0:
             self.add_flag(seat, Flags.YOU_REACHED_YAKUMAN_TENPAI, {"hand": self.at[seat].hand, "types": yakuman_types, "waits": yakuman_waits})
@@ -746,8 +834,7 @@ class KyokuState:
         if self.kyoku.is_final_round:
             self.add_global_flag(Flags.FINAL_ROUND)
         # check who has the worst haipai shanten
-        starting_shanten = [self.kyoku.haipai[player].shanten[0] // 1 for player in range(self.num_players)]
-        get_starting_shanten = lambda player: self.kyoku.haipai[player].shanten[0] // 1
+        get_starting_shanten = lambda player: self.kyoku.haipai[player].shanten_number
         for player in range(self.num_players):
             second_worst_shanten = max(get_starting_shanten(other_player) for other_player in range(self.num_players) if player != other_player)
             if get_starting_shanten(player) > second_worst_shanten:
@@ -815,7 +902,8 @@ class KyokuState:
             self._process_placement_change(placement_before.index(old), old+1, new+1, self.kyoku.start_scores, self.kyoku.result[1].score_delta)
 
         # check if anyone skipped a valid ron or tsumo call
-        for seat, (flags, data) in enumerate(zip(self.flags, self.data)):
+        for seat, flags in enumerate(self.flags):
+            data = flags.data
             for i, flag in enumerate(flags):
                 if flag == Flags.YOU_CAN_CALL_RON:
                     if data[i]["turns_left"] != self.tiles_in_wall:
@@ -944,10 +1032,10 @@ class KyokuState:
                 if len(self.at[seat].pond) <= 6:
                     self.add_flag(seat, Flags.LOST_POINTS_TO_FIRST_ROW_WIN, {"seat": result.winner, "turn": len(self.at[seat].pond)})
         # if tenpai, check if any player could have ronned the winning tile
-        for seat, (flags, data) in enumerate(zip(self.flags, self.data)):
+        for seat, flags in enumerate(self.flags):
             if Flags.YOU_CAN_CALL_RON in flags:
                 # check if the last instance of the flag refers to this turn
-                ron_data = data[len(flags) - 1 - flags[::-1].index(Flags.YOU_CAN_CALL_RON)]
+                ron_data = flags.get_last_data(Flags.YOU_CAN_CALL_RON)
                 if ron_data["turns_left"] == self.tiles_in_wall:
                     self.add_flag(seat, Flags.YOU_WAITED_ON_WINNING_TILE, {"tile": winning_tile, "wait": self.at[seat].hand.shanten[1]})
                     self.add_global_flag(Flags.SOMEONE_WAITED_ON_WINNING_TILE, {"seat": seat, "tile": winning_tile, "wait": self.at[seat].hand.shanten[1]})
@@ -1086,6 +1174,7 @@ class KyokuState:
                 self.add_flag(player, Flags.REACHED_DOUBLE_STARTING_POINTS, {"points": end_points})
 
     def _process_call(self, seat: int, call: CallInfo) -> None:
+        self.yaku_cache.clear()
         # flip kan dora, if needed
         if call.type in {"minkan", "ankan", "kakan"}:
             if self.kyoku.rules.immediate_kan_dora:
@@ -1106,6 +1195,8 @@ class KyokuState:
         if len(self.current_doras) < len(self.kyoku.doras):
             new_dora = self.kyoku.doras[len(self.current_doras)]
             self.current_doras.append(new_dora)
+            self._add_visible_dora_indicator(new_dora)
+            self.yaku_cache.clear()
             # check if that just gave us 4 dora
             if self.at[seat].hand.tiles_with_kans.count(new_dora) == 4:
                 self.add_flag(seat, Flags.YOU_FLIPPED_DORA_BOMB, {"doras": self.current_doras.copy(), "call": kan_call, "hand": self.at[seat].hand})
@@ -1117,7 +1208,7 @@ class KyokuState:
                     self.add_global_flag(Flags.SOMEONE_HAS_THREE_DORA_VISIBLE, {"seat": player, "amount": num_dora})
         self.num_kans += 1
 
-def determine_flags(kyoku: Kyoku) -> Tuple[List[List[Flags]], List[List[Dict[str, Any]]]]:
+def determine_flags(kyoku: Kyoku) -> Tuple[List[FlagSet], List[List[Dict[str, Any]]]]:
     """
     Analyze a parsed kyoku by spitting out an ordered list of all interesting facts about it (flags)
     Returns a pair of lists `(flags, data)`, where the nth entry in `data` is the data for the nth flag in `flags`
@@ -1130,8 +1221,7 @@ def determine_flags(kyoku: Kyoku) -> Tuple[List[List[Flags]], List[List[Dict[str
                        tiles_in_wall = 70 if kyoku.num_players == 4 else 55,
                        starting_doras = kyoku.get_starting_doras(),
                        current_doras = kyoku.get_starting_doras(),
-                       flags = [[] for i in range(kyoku.num_players)],
-                       data = [[] for i in range(kyoku.num_players)])
+                       flags = [FlagSet() for i in range(kyoku.num_players)])
 
     # Call the relevant state.process_* function on each event to generate
     # flags from each event in turn.
@@ -1167,7 +1257,7 @@ def determine_flags(kyoku: Kyoku) -> Tuple[List[List[Flags]], List[List[Dict[str
                     prev_shanten = prev_shanten,
                     new_shanten = new_shanten,
                     hand = state.at[seat].hand,
-                    ukeire = state.at[seat].hand.ukeire(state.get_visible_tiles()),
+                    ukeire = state.at[seat].hand.ukeire(state.get_visible_counts()),
                     furiten = state.at[seat].furiten)
         elif event_type in {"discard", "riichi"}:
             state.process_discard(i, *event[:3]) # riichi has extra args we don't care about
@@ -1184,9 +1274,6 @@ def determine_flags(kyoku: Kyoku) -> Tuple[List[List[Flags]], List[List[Dict[str
         elif event_type == "result":
             state.process_result(i, *event)
 
-    assert len(state.global_flags) == len(state.global_data), f"somehow got a different amount of global flags ({len(state.global_flags)}) than data ({len(state.global_data)})"
     for seat in range(kyoku.num_players):
-        assert len(state.flags[seat]) == len(state.data[seat]), f"somehow got a different amount of flags ({len(state.flags[seat])}) than data ({len(state.data[seat])})"
         state.flags[seat] = state.global_flags + state.flags[seat]
-        state.data[seat] = state.global_data + state.data[seat]
-    return state.flags, state.data
+    return state.flags, [flags.data for flags in state.flags]
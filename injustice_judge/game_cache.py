@@ -0,0 +1,166 @@
+import contextlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import *
+
+# This file implements the on-disk cache of fetched game logs.
+#
+# Game logs are stored one per file in the cache directory (`cached_games/` by
+#   default), exactly as before. Alongside them is a small SQLite index,
+#   `.index.sqlite3`, recording each file's size and last access time, plus the
+#   total size of the cache. That makes size accounting a single lookup rather
+#   than a walk over the whole directory.
+# When a save puts the cache over its size limit, the least recently used logs
+#   are deleted until it fits again.
+# Files are written to a temporary file and renamed into place, so a reader
+#   (or a crash) never sees a partially written log. Temporary files left
+#   behind by a crash are deleted the next time the cache is opened.
+#
+# Files in the directory that aren't in the index (e.g. from before the index
+#   existed, or copied in by hand) are added to it the first time they're
+#   loaded. When the index is first created, every existing file is added.
+#
+# To use a different directory, either call `open_game_cache(path)` before
+#   analyzing games, or set the `game_cache` environment variable to the path.
+
+INDEX_FILENAME = ".index.sqlite3"
+TEMP_PREFIX = ".tmp-"
+STALE_TEMP_AGE = 3600 # seconds before a leftover temp file is assumed to be from a crash
+DEFAULT_DIRECTORY = "cached_games"
+DEFAULT_MAX_SIZE = 1024 ** 3 # 1GB
+
+class GameCache:
+    """A size-bounded directory of cached game logs, indexed by filename"""
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        # cached files get the usual permissions for new files, not mkstemp's 0600
+        umask = os.umask(0)
+        os.umask(umask)
+        self.file_mode = 0o666 & ~umask
+        # delete temp files from saves that never finished
+        # (only old ones, since another process may be saving right now)
+        for entry in os.scandir(directory):
+            if entry.name.startswith(TEMP_PREFIX) and entry.stat().st_mtime < time.time() - STALE_TEMP_AGE:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(entry.path)
+        index_path = os.path.join(directory, INDEX_FILENAME)
+        is_new = not os.path.exists(index_path)
+        # we manage transactions ourselves (isolation_level=None), see `_transaction`
+        self.db = sqlite3.connect(index_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            self.db.execute("CREATE TABLE IF NOT EXISTS entries (name TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_by_last_access ON entries (last_access)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.db.execute("INSERT OR IGNORE INTO meta VALUES ('total_size', 0)")
+            if is_new:
+                # index the files from before the index existed
+                for entry in os.scandir(directory):
+                    if entry.is_file() and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        self._add_entry(entry.name, stat.st_size, stat.st_mtime)
+            self._evict()
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def _path(self, name: str) -> str:
+        assert name == os.path.basename(name) and not name.startswith("."), f"invalid cache filename {name}"
+        return os.path.join(self.directory, name)
+    def _add_entry(self, name: str, size: int, last_access: float) -> None:
+        row = self.db.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+        old_size = 0 if row is None else row[0]
+        self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (name, size, last_access))
+        self.db.execute("UPDATE meta SET value = value + ? WHERE key = 'total_size'", (size - old_size,))
+    def _remove_entry(self, name: str) -> None:
+        row = self.db.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM entries WHERE name = ?", (name,))
+            self.db.execute("UPDATE meta SET value = value - ? WHERE key = 'total_size'", (row[0],))
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Delete the least recently used files (other than `keep`) until we're within the size limit"""
+        while self.total_size() > self.max_size:
+            rows = self.db.execute("SELECT name FROM entries WHERE name IS NOT ? ORDER BY last_access LIMIT 64", (keep,)).fetchall()
+            if len(rows) == 0:
+                break
+            for name, in rows:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._path(name))
+                self._remove_entry(name)
+                if self.total_size() <= self.max_size:
+                    break
+
+    def total_size(self) -> int:
+        """Total size of all cached files in bytes"""
+        return cast(int, self.db.execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0])
+    def __contains__(self, name: str) -> bool:
+        return os.path.isfile(self._path(name))
+    def load(self, name: str) -> bytes:
+        """Read a cached file, marking it as recently used. Raises FileNotFoundError if it isn't cached"""
+        path = self._path(name)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            # if someone deleted it, forget it
+            with self.lock:
+                is_indexed = self.db.execute("SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone() is not None
+            if is_indexed:
+                with self._transaction():
+                    self._remove_entry(name)
+            raise
+        with self._transaction():
+            self._add_entry(name, len(data), time.time())
+            self._evict(keep=name)
+        return data
+    def save(self, name: str, data: bytes) -> None:
+        """Write a file to the cache, evicting old files if needed. Files bigger than the whole cache are skipped"""
+        path = self._path(name)
+        if len(data) > self.max_size:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.chmod(temp_path, self.file_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+        with self._transaction():
+            self._add_entry(name, len(data), time.time())
+            self._evict(keep=name)
+    def close(self) -> None:
+        self.db.close()
+
+# the cache used by the fetch functions
+game_cache: Optional[GameCache] = None
+
+def open_game_cache(directory: str, max_size: int = DEFAULT_MAX_SIZE) -> GameCache:
+    """Open (or create) the game cache in `directory` and use it for all future fetches"""
+    global game_cache
+    if game_cache is not None:
+        game_cache.close()
+    game_cache = GameCache(directory, max_size)
+    return game_cache
+
+def get_game_cache() -> GameCache:
+    """Get the current game cache, opening the one specified by the `game_cache` environment variable (or `cached_games/`) if needed"""
+    if game_cache is None:
+        return open_game_cache(os.getenv("game_cache") or DEFAULT_DIRECTORY)
+    return game_cache
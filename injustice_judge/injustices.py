@@ -1,10 +1,12 @@
 from .classes2 import Hand, Kyoku, Ron, Score, Tsumo
 from .constants import Shanten, PLACEMENTS, SHANTEN_NAMES
+from collections import Counter
 from dataclasses import dataclass
 from enum import Enum
 from typing import *
 from .display import ph, pt, relative_seat_name, round_name, shanten_name
-from .flags import Flags, determine_flags
+from .flags import Flags, FlagSet, determine_flags, flags_to_mask
+from .profiler import profile_stage
 from .utils import apply_delta_scores, to_placement, normalize_red_fives
 from pprint import pprint
 
@@ -66,27 +68,28 @@ def evaluate_game(kyoku: Kyoku, players: Set[int], player_names: List[str], look
     #             return []
 
     # calculate flags for our player this round
-    flags, data = determine_flags(kyoku)
+    with profile_stage("flags"):
+        flags, data = determine_flags(kyoku)
 
     # go through all the injustices and see if they apply
     # collect the resulting CheckResult objects in all_results
     all_results: Dict[int, List[CheckResult]] = {}
-    for player in players:
-        all_results[player] = []
-        for check in checks:
-            if check["type"] in look_for:
-                if     all(flag in flags[player]     for flag in check["required_flags"]) \
-                   and all(flag not in flags[player] for flag in check["forbidden_flags"]):
-                    result = check["callback"](flags[player], data[player], kyoku, player)
-                    all_results[player].extend(result)
-                else:
-                    pass
-                    # print("player", player, "|",
-                    #       round_name(kyoku.round, kyoku.honba), "|",
-                    #       i["callback"].__name__, "was not called because it lacks the flag(s)",
-                    #       set(i["required_flags"]) - set(flags[player]),
-                    #       "and/or has the flag(s)",
-                    #       set(i["forbidden_flags"]) & set(flags[player]))
+    checks_by_trigger = get_checks_by_trigger()
+    with profile_stage("checks"):
+        for player in players:
+            all_results[player] = []
+            # only look at checks whose trigger flag we have,
+            #   then compare the rest of the required/forbidden flags in one go
+            mask = flags[player].mask
+            applicable = [check for trigger, bucket in checks_by_trigger.items() if trigger is None or trigger in flags[player]
+                                for check in bucket
+                                if check["type"] in look_for
+                                and mask & check["required_mask"] == check["required_mask"]
+                                and not mask & check["forbidden_mask"]]
+            # call checks in the order they're defined
+            for check in sorted(applicable, key=lambda check: check["index"]):
+                result = check["callback"](flags[player], data[player], kyoku, player)
+                all_results[player].extend(result)
 
     # `all_results[seat]` contains a list of injustices for this kyoku,
     #   but we need to group them up before we print.
@@ -185,17 +188,43 @@ def evaluate_game(kyoku: Kyoku, players: Set[int], player_names: List[str], look
 # the main `evaluate_injustices` function above calls an injustice function
 #   only if all `require` flags exist and no `forbid` flags exist, for each kyoku
 # see below for usage
+# `require` and `forbid` are turned into bitmasks (see `FlagSet.mask`) when the
+#   check is defined, so testing a check is two integer operations
 
 checks: List[Dict[str, Any]] = []
-CheckFunc = Callable[[List[Flags], List[Dict[str, Any]], Kyoku, int], List[Injustice]]
+# _checks_by_trigger[flag] = all checks whose trigger is `flag`, see `get_checks_by_trigger`
+_checks_by_trigger: Optional[Dict[Optional[Flags], List[Dict[str, Any]]]] = None
+CheckFunc = Callable[[FlagSet, List[Dict[str, Any]], Kyoku, int], List[Injustice]]
 def make_check_decorator(check_type: str) -> Callable[..., Callable[..., CheckFunc]]:
     def check_decorator(require: List[Flags] = [], forbid: List[Flags] = []) -> Callable[[CheckFunc], CheckFunc]:
         global checks
         def decorator(callback: CheckFunc) -> CheckFunc:
-            checks.append({"type": check_type, "callback": callback, "required_flags": require, "forbidden_flags": forbid})
+            global _checks_by_trigger
+            checks.append({"type": check_type,
+                           "callback": callback,
+                           "required_flags": require,
+                           "forbidden_flags": forbid,
+                           "required_mask": flags_to_mask(require),
+                           "forbidden_mask": flags_to_mask(forbid),
+                           "index": len(checks)})
+            _checks_by_trigger = None
             return callback
         return decorator
     return check_decorator
+def get_checks_by_trigger() -> Dict[Optional[Flags], List[Dict[str, Any]]]:
+    """
+    Group all checks by a trigger flag, which is the required flag that's
+      required by the fewest other checks (i.e. probably the rarest one).
+    Checks that require nothing have trigger `None`.
+    """
+    global _checks_by_trigger
+    if _checks_by_trigger is None:
+        num_checks_requiring = Counter(flag for check in checks for flag in check["required_flags"])
+        _checks_by_trigger = {}
+        for check in checks:
+            trigger = min(check["required_flags"], key=lambda flag: num_checks_requiring[flag], default=None)
+            _checks_by_trigger.setdefault(trigger, []).append(check)
+    return _checks_by_trigger
 injustice = make_check_decorator("injustice")
 skill = make_check_decorator("skill")
 
@@ -204,7 +233,7 @@ skill = make_check_decorator("skill")
 ###
 
 @skill(require=[Flags.YOU_WON, Flags.WINNER_GOT_DOUBLE_WIND])
-def started_with_double_wind(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def started_with_double_wind(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand = data[flags.index(Flags.YOU_WON)]["hand"]
     haipai = data[flags.index(Flags.YOU_WON)]["haipai"]
     wind = [41,42,43,44][player]
@@ -228,7 +257,7 @@ def started_with_double_wind(flags: List[Flags], data: List[Dict[str, Any]], kyo
         return []
 
 @skill(require=[Flags.IISHANTEN_START])
-def iishanten_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def iishanten_start(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand = data[flags.index(Flags.IISHANTEN_START)]["hand"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
@@ -236,7 +265,7 @@ def iishanten_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku
                         content=f"{shanten_name(hand.shanten)} {hand.to_str(doras=kyoku.doras)}"))]
 
 @skill(require=[Flags.YOU_WON, Flags.FIVE_SHANTEN_START])
-def won_with_five_shanten_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_with_five_shanten_start(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand = data[flags.index(Flags.FIVE_SHANTEN_START)]["hand"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
@@ -246,7 +275,7 @@ def won_with_five_shanten_start(flags: List[Flags], data: List[Dict[str, Any]],
 # Print if you started with 3 dora and won with 3 dora
 @skill(require=[Flags.STARTED_WITH_3_DORA, Flags.YOU_WON],
         forbid=[Flags.YOU_GOT_NON_COUNTED_YAKUMAN])
-def won_with_3_starting_dora(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_with_3_starting_dora(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     num_dora = data[flags.index(Flags.YOU_WON)]["score_object"].count_dora()
     haipai = data[flags.index(Flags.YOU_WON)]["haipai"]
     hand = data[flags.index(Flags.YOU_WON)]["hand"]
@@ -262,7 +291,7 @@ def won_with_3_starting_dora(flags: List[Flags], data: List[Dict[str, Any]], kyo
 ###
 
 @skill(require=[Flags.EVERYONE_RESPECTED_YOUR_RIICHI, Flags.GAME_ENDED_WITH_RYUUKYOKU, Flags.YOU_GAINED_POINTS])
-def everyone_respected_your_riichi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def everyone_respected_your_riichi(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     points = data[flags.index(Flags.YOU_GAINED_POINTS)]["amount"]
     if points == kyoku.rules.noten_payment[0] * kyoku.num_players:
         return [Skill(kyoku.round, kyoku.honba, "Skill",
@@ -274,15 +303,15 @@ def everyone_respected_your_riichi(flags: List[Flags], data: List[Dict[str, Any]
 
 @skill(require=[Flags.PASSED_FOUR_DANGEROUS_DISCARDS],
         forbid=[Flags.YOU_DEALT_IN])
-def you_passed_four_dangerous_discards(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    discards = data[len(flags) - 1 - flags[::-1].index(Flags.PASSED_FOUR_DANGEROUS_DISCARDS)]["discards"]
+def you_passed_four_dangerous_discards(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    discards = data[flags.last_index(Flags.PASSED_FOUR_DANGEROUS_DISCARDS)]["discards"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
                         verb="dealt",
                         content=f"{len(discards)} dangerous discards ({ph(discards, doras=kyoku.doras)}) after riichi without dealing in"))]
 
 @skill(require=[Flags.YOU_REACHED_TENPAI])
-def every_draw_helped(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def every_draw_helped(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     turn = data[flags.index(Flags.YOU_REACHED_TENPAI)]["turn"]
     haipai = data[flags.index(Flags.YOU_REACHED_TENPAI)]["haipai"]
     if haipai.shanten[0] == turn:
@@ -295,7 +324,7 @@ def every_draw_helped(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyo
 
 # Print if you ever called kan and got 4 dora
 @skill(require=[Flags.YOU_FLIPPED_DORA_BOMB])
-def called_kan_and_got_4_dora(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def called_kan_and_got_4_dora(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     doras = data[flags.index(Flags.YOU_FLIPPED_DORA_BOMB)]["doras"]
     call = data[flags.index(Flags.YOU_FLIPPED_DORA_BOMB)]["call"]
     hand = data[flags.index(Flags.YOU_FLIPPED_DORA_BOMB)]["hand"]
@@ -307,7 +336,7 @@ def called_kan_and_got_4_dora(flags: List[Flags], data: List[Dict[str, Any]], ky
 
 # Print if you ever declined a chii/pon call, and proceeded to draw it the next turn, at least twice
 @skill(require=[Flags.YOU_DREW_CALLABLE_TILE])
-def you_drew_callable_tile(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def you_drew_callable_tile(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     if flags.count(Flags.YOU_DREW_CALLABLE_TILE) > 1:
         call_data = [(d["call_type"], d["call_tile"]) for flag, d in zip(flags, data) if flag == Flags.YOU_DREW_CALLABLE_TILE]
         call_strs = [f"{pt(call_tile, doras=kyoku.doras)} immediately after declining to {call_type} it" for call_type, call_tile in call_data]
@@ -320,7 +349,7 @@ def you_drew_callable_tile(flags: List[Flags], data: List[Dict[str, Any]], kyoku
 
 # Print if you melded consecutively 2+ times and then immediately won
 @skill(require=[Flags.YOU_WON, Flags.WINNER_WON_WITH_PON_PON_RON])
-def won_by_pon_pon_ron(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_by_pon_pon_ron(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand = data[flags.index(Flags.WINNER_WON_WITH_PON_PON_RON)]["hand"]
     winning_tile = data[flags.index(Flags.WINNER_WON_WITH_PON_PON_RON)]["winning_tile"]
     num_calls = data[flags.index(Flags.WINNER_WON_WITH_PON_PON_RON)]["num_calls"]
@@ -339,7 +368,7 @@ def won_by_pon_pon_ron(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Ky
 
 @skill(require=[Flags.YOU_WON, Flags.WINNER, Flags.GAME_ENDED_WITH_RON, Flags.SOMEONE_WAITED_ON_WINNING_TILE],
         forbid=[])
-def head_bumped_someone(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def head_bumped_someone(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     waiters = {d["seat"] for flag, d in zip(flags, data) if flag == Flags.SOMEONE_WAITED_ON_WINNING_TILE}
     winners = {d["seat"] for flag, d in zip(flags, data) if flag == Flags.WINNER}
     got_head_bumped = waiters - winners
@@ -353,7 +382,7 @@ def head_bumped_someone(flags: List[Flags], data: List[Dict[str, Any]], kyoku: K
 
 @skill(require=[Flags.YOU_WON_AFTER_SOMEONES_RIICHI],
         forbid=[Flags.YOU_WON_OFF_TENPAI_TILE])
-def robbed_riichi_stick(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def robbed_riichi_stick(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     seat = data[flags.index(Flags.YOU_WON_AFTER_SOMEONES_RIICHI)]["seat"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
@@ -361,14 +390,14 @@ def robbed_riichi_stick(flags: List[Flags], data: List[Dict[str, Any]], kyoku: K
                         content=f"{relative_seat_name(player, seat)}'s riichi stick by winning right after they declared riichi"))]
 
 @skill(require=[Flags.YOU_ACHIEVED_NAGASHI])
-def won_nagashi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_nagashi(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
                         verb="got",
                         content="nagashi mangan"))]
 
 @skill(require=[Flags.YOU_WON])
-def won_something_silly(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_something_silly(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     ukeire = data[flags.index(Flags.YOU_WON)]["ukeire"]
     turn = data[flags.index(Flags.YOU_WON)]["turn"]
     score = data[flags.index(Flags.YOU_WON)]["score_object"]
@@ -411,7 +440,7 @@ def won_something_silly(flags: List[Flags], data: List[Dict[str, Any]], kyoku: K
         return []
 
 @skill(require=[Flags.YOU_WON, Flags.WON_AFTER_CHANGING_WAIT])
-def won_after_changing_wait(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_after_changing_wait(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand = data[flags.index(Flags.WON_AFTER_CHANGING_WAIT)]["hand"]
     winning_tile = data[flags.index(Flags.WON_AFTER_CHANGING_WAIT)]["winning_tile"]
     if winning_tile not in hand.prev_shanten[1]:
@@ -423,7 +452,7 @@ def won_after_changing_wait(flags: List[Flags], data: List[Dict[str, Any]], kyok
         return []
 
 @skill(require=[Flags.YOU_WON, Flags.YOU_ARE_DEALER, Flags.YOU_WERE_FIRST])
-def won_first_place_3_honba(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_first_place_3_honba(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     points = data[flags.index(Flags.YOU_WON)]["score_object"].to_points()
     if kyoku.honba >= 3:
         return [Skill(kyoku.round, kyoku.honba, "Skill",
@@ -434,7 +463,7 @@ def won_first_place_3_honba(flags: List[Flags], data: List[Dict[str, Any]], kyok
         return []
 
 @skill(require=[Flags.YOU_WON, Flags.WINNER_HAD_NAKED_TANKI])
-def won_with_naked_tanki(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_with_naked_tanki(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
                         verb="won",
@@ -442,7 +471,7 @@ def won_with_naked_tanki(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 
 @skill(require=[Flags.LAST_CALL_TENPAI, Flags.GAME_ENDED_WITH_RYUUKYOKU, Flags.YOU_GAINED_POINTS])
 @skill(require=[Flags.LAST_DRAW_TENPAI, Flags.GAME_ENDED_WITH_RYUUKYOKU, Flags.YOU_GAINED_POINTS])
-def last_draw_tenpai(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def last_draw_tenpai(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     call_or_draw = "call" if Flags.LAST_CALL_TENPAI in flags else "draw"
     return [Skill(kyoku.round, kyoku.honba, "Skill",
         CheckClause(subject=f"your very last {call_or_draw}",
@@ -450,7 +479,7 @@ def last_draw_tenpai(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyok
                     content="you tenpai, and you received noten payments for it"))]
 
 @skill(require=[Flags.YOU_CHASED, Flags.YOU_RONNED_SOMEONE, Flags.WINNER_GOT_IPPATSU])
-def won_chase_with_ippatsu(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_chase_with_ippatsu(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     chased_player = data[flags.index(Flags.YOU_CHASED)]["seat"]
     deal_in_player = data[flags.index(Flags.YOU_RONNED_SOMEONE)]["from"]
     if chased_player == deal_in_player:
@@ -465,7 +494,7 @@ def won_chase_with_ippatsu(flags: List[Flags], data: List[Dict[str, Any]], kyoku
                         content=f"ippatsu after chasing {relative_seat_name(player, chased_player)}'s tenpai"))]
 
 @skill(require=[Flags.YOU_GAINED_POINTS, Flags.WINNER_GOT_SANBAIMAN])
-def got_sanbaiman_or_yakuman(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def got_sanbaiman_or_yakuman(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     score = data[flags.index(Flags.WINNER_GOT_SANBAIMAN)]["score_object"]
     seat = data[flags.index(Flags.WINNER_GOT_SANBAIMAN)]["seat"]
     yaku = score.yaku
@@ -481,7 +510,7 @@ def got_sanbaiman_or_yakuman(flags: List[Flags], data: List[Dict[str, Any]], kyo
 # Print if you gained placement only because of ura
 @skill(require=[Flags.YOU_WON, Flags.YOU_GAINED_PLACEMENT],
         forbid=[])
-def gained_placement_due_to_ura(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def gained_placement_due_to_ura(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     score: Score = data[flags.index(Flags.YOU_WON)]["score_object"]
     won_from: int = data[flags.index(Flags.YOU_WON)]["won_from"]
     prev_scores: List[int] = data[flags.index(Flags.YOU_GAINED_PLACEMENT)]["prev_scores"]
@@ -508,7 +537,7 @@ def gained_placement_due_to_ura(flags: List[Flags], data: List[Dict[str, Any]],
 
 @skill(require=[Flags.SOMEONE_HAS_THREE_DORA_VISIBLE, Flags.YOU_WON],
         forbid=[Flags.WINNER_GOT_HAITEI])
-def won_to_deny_three_dora(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def won_to_deny_three_dora(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     winners = {d["seat"] for flag, d in zip(flags, data) if flag == Flags.WINNER}
     dora_data = {d["seat"]: d for flag, d in zip(flags, data) if flag == Flags.SOMEONE_HAS_THREE_DORA_VISIBLE}
     seats = set(dora_data.keys()) - winners
@@ -524,7 +553,7 @@ def won_to_deny_three_dora(flags: List[Flags], data: List[Dict[str, Any]], kyoku
         return []
 
 @skill(require=[Flags.DREW_LAST_HONOR_AFTER_SKIPPING_THIRD])
-def drew_last_honor_after_skipping_third(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def drew_last_honor_after_skipping_third(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.DREW_LAST_HONOR_AFTER_SKIPPING_THIRD)]["tile"]
     call_direction = data[flags.index(Flags.DREW_LAST_HONOR_AFTER_SKIPPING_THIRD)]["call_direction"]
     turns_ago = data[flags.index(Flags.DREW_LAST_HONOR_AFTER_SKIPPING_THIRD)]["turns_ago"]
@@ -536,7 +565,7 @@ def drew_last_honor_after_skipping_third(flags: List[Flags], data: List[Dict[str
 
 @skill(require=[Flags.GAME_ENDED_WITH_RYUUKYOKU, Flags.YOU_SKIPPED_RON])
 @skill(require=[Flags.GAME_ENDED_WITH_RYUUKYOKU, Flags.YOU_SKIPPED_TSUMO])
-def you_skipped_win_but_got_noten_payments(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def you_skipped_win_but_got_noten_payments(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     win_map = {Flags.YOU_SKIPPED_RON: "ron", Flags.YOU_SKIPPED_TSUMO: "tsumo"}
     all_wins = [win_map[flag] for flag in flags if flag in win_map]
     num_skips = len(all_wins)
@@ -552,7 +581,7 @@ def you_skipped_win_but_got_noten_payments(flags: List[Flags], data: List[Dict[s
 
 # Print if you got out of last place in the final round
 @skill(require=[Flags.FINAL_ROUND, Flags.YOU_WERE_FOURTH, Flags.YOU_GAINED_PLACEMENT])
-def got_out_of_last_place(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def got_out_of_last_place(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     new = data[flags.index(Flags.YOU_GAINED_PLACEMENT)]["new"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
@@ -561,7 +590,7 @@ def got_out_of_last_place(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 
 @skill(require=[Flags.FINAL_ROUND, Flags.REACHED_DOUBLE_STARTING_POINTS],
         forbid=[Flags.REACHED_TRIPLE_STARTING_POINTS])
-def ended_with_double_starting_points(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def ended_with_double_starting_points(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     points = data[flags.index(Flags.REACHED_DOUBLE_STARTING_POINTS)]["points"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
@@ -569,7 +598,7 @@ def ended_with_double_starting_points(flags: List[Flags], data: List[Dict[str, A
                         content=f"the game with double starting points ({points})"))]
 
 @skill(require=[Flags.FINAL_ROUND, Flags.REACHED_TRIPLE_STARTING_POINTS])
-def ended_with_triple_starting_points(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def ended_with_triple_starting_points(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     points = data[flags.index(Flags.REACHED_DOUBLE_STARTING_POINTS)]["points"]
     return [Skill(kyoku.round, kyoku.honba, "Skill",
             CheckClause(subject="you",
@@ -585,20 +614,20 @@ def ended_with_triple_starting_points(flags: List[Flags], data: List[Dict[str, A
             forbid=[Flags.YOU_GAINED_POINTS])
 @injustice(require=[Flags.FIVE_SHANTEN_START],
             forbid=[Flags.YOU_GAINED_POINTS, Flags.DREW_WORST_HAIPAI_SHANTEN])
-def five_shanten_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def five_shanten_start(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand: Hand
     if Flags.FIVE_SHANTEN_START in flags:
         hand = data[flags.index(Flags.FIVE_SHANTEN_START)]["hand"]
     elif Flags.DREW_WORST_HAIPAI_SHANTEN in flags:
         hand = data[flags.index(Flags.DREW_WORST_HAIPAI_SHANTEN)]["hand"]
         second_worst_shanten: int = data[flags.index(Flags.DREW_WORST_HAIPAI_SHANTEN)]["second_worst_shanten"]
-        difference = (hand.shanten[0]//1) - second_worst_shanten
+        difference = hand.shanten_number - second_worst_shanten
         if difference >= 2:
             return [Injustice(kyoku.round, kyoku.honba, "Injustice",
                     CheckClause(subject=f"you",
                                     verb=f"started with",
                                     content=f"{shanten_name(hand.shanten)}, while everyone else started with {SHANTEN_NAMES[second_worst_shanten]} or better"))]
-    if hand.shanten[0] >= 5:
+    if hand.shanten_number >= 5:
         all_last_str = " in all last" if Flags.ALL_LAST in flags else ""
         return [Injustice(kyoku.round, kyoku.honba, "Injustice",
                 CheckClause(subject="you",
@@ -610,7 +639,7 @@ def five_shanten_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Ky
 # Print if you started with 7-8 types of terminals and couldn't gain points as a result
 @injustice(require=[Flags.SEVEN_TERMINAL_START],
            forbid=[Flags.YOU_GAINED_POINTS])
-def seven_terminal_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def seven_terminal_start(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     num_types = data[flags.index(Flags.SEVEN_TERMINAL_START)]["num_types"]
     if num_types in {8,9}:
         return [Injustice(kyoku.round, kyoku.honba, "Injustice",
@@ -622,7 +651,7 @@ def seven_terminal_start(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 # Print if you were still at bad shanten after the first row of discards and couldn't gain points as a result
 @injustice(require=[Flags.FOUR_SHANTEN_AFTER_FIRST_ROW],
             forbid=[Flags.YOU_GAINED_POINTS])
-def four_shanten_after_first_row(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def four_shanten_after_first_row(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     shanten = data[flags.index(Flags.FOUR_SHANTEN_AFTER_FIRST_ROW)]["shanten"]
     all_last_str = " in all last" if Flags.ALL_LAST in flags else ""
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
@@ -640,7 +669,7 @@ def four_shanten_after_first_row(flags: List[Flags], data: List[Dict[str, Any]],
             forbid=[Flags.YOU_GAINED_POINTS, Flags.YOU_FOLDED_FROM_TENPAI])
 @injustice(require=[Flags.YOU_REACHED_TENPAI, Flags.FIRST_ROW_TENPAI],
             forbid=[Flags.YOU_FOLDED_FROM_TENPAI, Flags.WINNER])
-def your_early_8_outs_wait_never_won(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def your_early_8_outs_wait_never_won(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     for i, flag in enumerate(flags):
         if flag == Flags.YOU_REACHED_TENPAI:
             ukeire = data[i]["ukeire"]
@@ -656,7 +685,7 @@ def your_early_8_outs_wait_never_won(flags: List[Flags], data: List[Dict[str, An
 @injustice(require=[Flags.YOU_REACHED_TENPAI, Flags.WINNER,
                     Flags.YOU_GOT_CHASED, Flags.CHASER_GAINED_POINTS],
             forbid=[Flags.YOU_FOLDED_FROM_TENPAI, Flags.YOU_GAINED_POINTS])
-def chaser_won_with_worse_wait(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def chaser_won_with_worse_wait(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     chasers: Dict[int, Dict[str, Any]] = {}
     for i in [i for i, f in enumerate(flags) if f == Flags.YOU_GOT_CHASED]:
         chase_data = data[i]
@@ -691,14 +720,14 @@ def chaser_won_with_worse_wait(flags: List[Flags], data: List[Dict[str, Any]], k
 
 # Print if you failed to improve your shanten for at least nine consecutive draws
 @injustice(require=[Flags.NINE_DRAWS_NO_IMPROVEMENT])
-def shanten_hell(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    shanten_data = data[len(flags) - 1 - flags[::-1].index(Flags.NINE_DRAWS_NO_IMPROVEMENT)]
+def shanten_hell(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    shanten_data = data[flags.last_index(Flags.NINE_DRAWS_NO_IMPROVEMENT)]
     draws = shanten_data["draws"]
     shanten = shanten_data["shanten"]
     ret = []
     reached_tenpai_str = " before you finally reached tenpai" if Flags.YOU_REACHED_TENPAI in flags else ", and never reached tenpai"
     if Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI in flags:
-        num_discards = data[len(flags) - 1 - flags[::-1].index(Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI)]["num_discards"]
+        num_discards = data[flags.last_index(Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI)]["num_discards"]
         if num_discards >= 9:
             return [] # we'd be repeating the message in `you_tsumogiri_6_times_without_tenpai`
     if Flags.YOU_REACHED_TENPAI in flags:
@@ -718,7 +747,7 @@ def shanten_hell(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, p
 # Print if you drew a dora tile you had discarded a turn prior
 @injustice(require=[Flags.IMMEDIATELY_DREW_DISCARDED_DORA],
             forbid=[])
-def drew_dora_you_just_discarded(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def drew_dora_you_just_discarded(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.IMMEDIATELY_DREW_DISCARDED_DORA)]["tile"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
@@ -728,7 +757,7 @@ def drew_dora_you_just_discarded(flags: List[Flags], data: List[Dict[str, Any]],
 # Print if your turn was skipped 3 times due to pon/kan
 @injustice(require=[Flags.TURN_SKIPPED_BY_PON],
             forbid=[])
-def turn_was_skipped_3_times(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def turn_was_skipped_3_times(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     times = flags.count(Flags.TURN_SKIPPED_BY_PON)
     if times >= 3:
         return [Injustice(kyoku.round, kyoku.honba, "Injustice",
@@ -741,7 +770,7 @@ def turn_was_skipped_3_times(flags: List[Flags], data: List[Dict[str, Any]], kyo
 # Print if your turn was skipped 3 times due to pon/kan
 @injustice(require=[Flags.CHII_GOT_OVERRIDDEN],
             forbid=[Flags.YOU_WON])
-def chii_got_overridden(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def chii_got_overridden(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     ret = []
     for i, flag in enumerate(flags):
         if flag == Flags.CHII_GOT_OVERRIDDEN:
@@ -765,7 +794,7 @@ def chii_got_overridden(flags: List[Flags], data: List[Dict[str, Any]], kyoku: K
 # Print if you just barely failed nagashi
 @injustice(require=[Flags.YOUR_LAST_DISCARD_ENDED_NAGASHI],
             forbid=[Flags.YOUR_LAST_NAGASHI_TILE_CALLED])
-def lost_nagashi_to_draw(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def lost_nagashi_to_draw(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.YOUR_LAST_DISCARD_ENDED_NAGASHI)]["tile"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
@@ -774,7 +803,7 @@ def lost_nagashi_to_draw(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 
 # Print if someone calls your last tile for nagashi (not ron)
 @injustice(require=[Flags.YOUR_LAST_NAGASHI_TILE_CALLED])
-def lost_nagashi_to_call(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def lost_nagashi_to_call(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     nagashi_data = data[flags.index(Flags.YOUR_LAST_NAGASHI_TILE_CALLED)]
     tile = nagashi_data["tile"]
     caller = nagashi_data["caller"]
@@ -785,7 +814,7 @@ def lost_nagashi_to_call(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 
 # Print if ankan removed (part of) your tenpai wait
 @injustice(require=[Flags.ANKAN_ERASED_TENPAI_WAIT])
-def ankan_erased_tenpai_wait(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def ankan_erased_tenpai_wait(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.ANKAN_ERASED_TENPAI_WAIT)]["tile"]
     wait = data[flags.index(Flags.ANKAN_ERASED_TENPAI_WAIT)]["wait"]
     ukeire = data[flags.index(Flags.ANKAN_ERASED_TENPAI_WAIT)]["ukeire"]
@@ -799,8 +828,8 @@ def ankan_erased_tenpai_wait(flags: List[Flags], data: List[Dict[str, Any]], kyo
 # Print if you tsumogiri honors 6 times in a row and are not going for nagashi
 @injustice(require=[Flags.SIX_DISCARDS_TSUMOGIRI_HONOR],
             forbid=[Flags.YOU_GAINED_POINTS])
-def you_tsumogiri_honors_6_times(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    num_discards = data[len(flags) - 1 - flags[::-1].index(Flags.SIX_DISCARDS_TSUMOGIRI_HONOR)]["num_discards"]
+def you_tsumogiri_honors_6_times(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    num_discards = data[flags.last_index(Flags.SIX_DISCARDS_TSUMOGIRI_HONOR)]["num_discards"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
                         verb="drew",
@@ -809,9 +838,9 @@ def you_tsumogiri_honors_6_times(flags: List[Flags], data: List[Dict[str, Any]],
 # Print if you tsumogiri 6 times in a row while not in tenpai
 @injustice(require=[Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI],
             forbid=[Flags.YOU_GAINED_POINTS])
-def you_tsumogiri_6_times_without_tenpai(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    num_discards = data[len(flags) - 1 - flags[::-1].index(Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI)]["num_discards"]
-    shanten = data[len(flags) - 1 - flags[::-1].index(Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI)]["shanten"]
+def you_tsumogiri_6_times_without_tenpai(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    num_discards = data[flags.last_index(Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI)]["num_discards"]
+    shanten = data[flags.last_index(Flags.SIX_TSUMOGIRI_WITHOUT_TENPAI)]["shanten"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
                         verb="discarded",
@@ -819,7 +848,7 @@ def you_tsumogiri_6_times_without_tenpai(flags: List[Flags], data: List[Dict[str
 
 # Print if you drew at least 6 off-suit tiles in a row for honitsu
 @injustice(require=[Flags.BAD_HONITSU_DRAWS])
-def consecutive_bad_honitsu_draws(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def consecutive_bad_honitsu_draws(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tiles = data[flags.index(Flags.BAD_HONITSU_DRAWS)]["tiles"]
     hand = data[flags.index(Flags.BAD_HONITSU_DRAWS)]["hand"]
     never_tenpai_string = ", and subsequently could not reach tenpai" if Flags.YOU_REACHED_TENPAI not in flags else ""
@@ -832,7 +861,7 @@ def consecutive_bad_honitsu_draws(flags: List[Flags], data: List[Dict[str, Any]]
 
 # Print if you had to deal with triple riichi
 @injustice(require=[Flags.AGAINST_TRIPLE_RIICHI, Flags.YOU_DEALT_IN])
-def against_triple_riichi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def against_triple_riichi(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
                         verb="were against",
@@ -840,7 +869,7 @@ def against_triple_riichi(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 
 # Print if you were ever iishanten with zero tiles left
 @injustice(require=[Flags.IISHANTEN_WITH_ZERO_TILES])
-def iishanten_with_zero_tiles(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def iishanten_with_zero_tiles(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     shanten = data[flags.index(Flags.IISHANTEN_WITH_ZERO_TILES)]["shanten"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject=f"your {shanten_name(shanten)}",
@@ -850,7 +879,7 @@ def iishanten_with_zero_tiles(flags: List[Flags], data: List[Dict[str, Any]], ky
 # Print if everyone immediately threw a dangerous tile after your riichi
 @injustice(require=[Flags.EVERYONE_DISRESPECTED_YOUR_RIICHI],
             forbid=[Flags.YOU_WON])
-def everyone_disrespected_your_riichi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def everyone_disrespected_your_riichi(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="your riichi",
                         verb="was disrespected by",
@@ -858,10 +887,10 @@ def everyone_disrespected_your_riichi(flags: List[Flags], data: List[Dict[str, A
 
 # Print if you drew a dangerous tile and had no safe tiles at least four times
 @injustice(require=[Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI])
-def four_dangerous_draws_after_riichi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    tiles = data[len(data) - 1 - flags[::-1].index(Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI)]["tiles"]
-    opponent = data[len(data) - 1 - flags[::-1].index(Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI)]["opponent"]
-    pond_str = data[len(data) - 1 - flags[::-1].index(Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI)]["pond_str"]
+def four_dangerous_draws_after_riichi(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    tiles = data[flags.last_index(Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI)]["tiles"]
+    opponent = data[flags.last_index(Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI)]["opponent"]
+    pond_str = data[flags.last_index(Flags.FOUR_DANGEROUS_DRAWS_AFTER_RIICHI)]["pond_str"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
                         verb="kept drawing",
@@ -871,7 +900,7 @@ def four_dangerous_draws_after_riichi(flags: List[Flags], data: List[Dict[str, A
 
 # Print if all tiles in your hand are deal-in tiles
 @injustice(require=[Flags.YOUR_TILES_ALL_DEAL_IN, Flags.YOU_DEALT_IN])
-def your_tiles_all_deal_in(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def your_tiles_all_deal_in(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     hand = data[flags.index(Flags.YOUR_TILES_ALL_DEAL_IN)]["hand"]
     waits = data[flags.index(Flags.YOUR_TILES_ALL_DEAL_IN)]["waits"]
     wait_string = " and ".join(f"{relative_seat_name(player, seat)} was waiting on {ph(wait, doras=kyoku.doras)}" for seat, wait in waits.items())
@@ -883,10 +912,10 @@ def your_tiles_all_deal_in(flags: List[Flags], data: List[Dict[str, Any]], kyoku
 
 # Print if you were about to reach tenpai but all of your tenpai discards deal in
 @injustice(require=[Flags.ALL_TENPAI_DISCARDS_DEAL_IN, Flags.YOU_DEALT_IN])
-def all_tenpai_discards_deal_in(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    hand = data[len(data) - 1 - flags[::-1].index(Flags.ALL_TENPAI_DISCARDS_DEAL_IN)]["hand"]
-    discards = data[len(data) - 1 - flags[::-1].index(Flags.ALL_TENPAI_DISCARDS_DEAL_IN)]["discards"]
-    furiten = data[len(data) - 1 - flags[::-1].index(Flags.ALL_TENPAI_DISCARDS_DEAL_IN)]["furiten"]
+def all_tenpai_discards_deal_in(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    hand = data[flags.last_index(Flags.ALL_TENPAI_DISCARDS_DEAL_IN)]["hand"]
+    discards = data[flags.last_index(Flags.ALL_TENPAI_DISCARDS_DEAL_IN)]["discards"]
+    furiten = data[flags.last_index(Flags.ALL_TENPAI_DISCARDS_DEAL_IN)]["furiten"]
     if len(discards) > 1:
         discard_string = f"any of {ph(discards, doras=kyoku.doras)}, but they would all deal in"
     else:
@@ -902,7 +931,7 @@ def all_tenpai_discards_deal_in(flags: List[Flags], data: List[Dict[str, Any]],
 
 # Print if temporary furiten blocked you from winning
 @injustice(require=[Flags.YOUR_WIN_BLOCKED_BY_TEMP_FURITEN])
-def your_win_blocked_by_temp_furiten(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def your_win_blocked_by_temp_furiten(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     ret = []
     dir_map = {0: "self", 1: "shimocha", 2: "toimen", 3: "kamicha"}
     for i, flag in enumerate(flags):
@@ -927,7 +956,7 @@ TENPAI_STATUS_STRINGS = [
     ", while you were tenpai",
     " and about to get noten payments"
 ]
-def tenpai_status_string(flags: List[Flags]) -> str:
+def tenpai_status_string(flags: FlagSet) -> str:
     status = ""
     if Flags.YOU_DECLARED_RIICHI in flags and not Flags.YOUR_TENPAI_TILE_DEALT_IN in flags:
         status = TENPAI_STATUS_STRINGS[0]
@@ -940,7 +969,7 @@ def tenpai_status_string(flags: List[Flags]) -> str:
 # Print if your riichi discard passed, but someone stole your riichi stick before your next draw
 @injustice(require=[Flags.LAST_DISCARD_WAS_RIICHI, Flags.WINNER],
             forbid=[Flags.YOUR_RIICHI_TILE_DEALT_IN, Flags.YOU_WON])
-def riichi_stick_robbed(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def riichi_stick_robbed(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     winner = data[flags.index(Flags.WINNER)]["seat"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="your riichi discard",
@@ -950,7 +979,7 @@ def riichi_stick_robbed(flags: List[Flags], data: List[Dict[str, Any]], kyoku: K
 
 # Print if you lost points to a first row ron/tsumo
 @injustice(require=[Flags.LOST_POINTS_TO_FIRST_ROW_WIN])
-def lost_points_to_first_row_win(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def lost_points_to_first_row_win(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     win_data = data[flags.index(Flags.LOST_POINTS_TO_FIRST_ROW_WIN)]
     winner = win_data["seat"]
     turn = win_data["turn"]
@@ -968,7 +997,7 @@ def lost_points_to_first_row_win(flags: List[Flags], data: List[Dict[str, Any]],
 @injustice(require=[Flags.WINNER, Flags.YOU_DEALT_IN, Flags.WINNER_GOT_HAITEI], forbid=[Flags.YOU_HAD_LIMIT_TENPAI, Flags.WINNER_WAS_DAMA, Flags.WINNER_GOT_IPPATSU])
 @injustice(require=[Flags.WINNER, Flags.YOU_DEALT_IN, Flags.MULTIPLE_RON], forbid=[Flags.YOU_HAD_LIMIT_TENPAI, Flags.WINNER_WAS_DAMA, Flags.WINNER_GOT_IPPATSU, Flags.WINNER_GOT_HAITEI])
 @injustice(require=[Flags.YOU_DEALT_IN_JUST_BEFORE_NOTEN_PAYMENT], forbid=[Flags.YOU_HAD_LIMIT_TENPAI, Flags.WINNER_WAS_DAMA, Flags.WINNER_GOT_IPPATSU, Flags.WINNER_GOT_HAITEI, Flags.MULTIPLE_RON])
-def dealt_into_something_dumb(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def dealt_into_something_dumb(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     winner = data[flags.index(Flags.WINNER)]["seat"]
     score = data[flags.index(Flags.WINNER)]["score_object"]
     is_ippatsu = Flags.WINNER_GOT_IPPATSU in flags
@@ -1002,7 +1031,7 @@ def dealt_into_something_dumb(flags: List[Flags], data: List[Dict[str, Any]], ky
 # Print if someone else won with bad wait ippatsu tsumo
 @injustice(require=[Flags.WINNER_HAD_BAD_WAIT, Flags.WINNER_IPPATSU_TSUMO],
             forbid=[Flags.YOU_GAINED_POINTS])
-def someone_got_bad_wait_ippatsu_tsumo(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def someone_got_bad_wait_ippatsu_tsumo(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     win_data = data[flags.index(Flags.WINNER_HAD_BAD_WAIT)]
     winner = win_data["seat"]
     wait = win_data["hand"].shanten[1]
@@ -1014,7 +1043,7 @@ def someone_got_bad_wait_ippatsu_tsumo(flags: List[Flags], data: List[Dict[str,
 
 # Print if you are dealer and lost to baiman+ tsumo
 @injustice(require=[Flags.YOU_ARE_DEALER, Flags.GAME_ENDED_WITH_TSUMO, Flags.YOU_LOST_POINTS, Flags.WINNER_GOT_BAIMAN])
-def baiman_oyakaburi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def baiman_oyakaburi(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     win_data = data[flags.index(Flags.WINNER)]
     winner = win_data["seat"]
     furiten_string = ", while in furiten" if Flags.WINNER_WAS_FURITEN else ""
@@ -1027,7 +1056,7 @@ def baiman_oyakaburi(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyok
 
 # Print if your riichi/tenpai tile dealt in
 @injustice(require=[Flags.YOUR_TENPAI_TILE_DEALT_IN])
-def your_tenpai_tile_dealt_in(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def your_tenpai_tile_dealt_in(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.YOUR_TENPAI_TILE_DEALT_IN)]["tile"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
             CheckClause(subject="you",
@@ -1038,7 +1067,7 @@ def your_tenpai_tile_dealt_in(flags: List[Flags], data: List[Dict[str, Any]], ky
 
 # Print if the tile you dealt in with was the same as your last discard
 @injustice(require=[Flags.DEAL_IN_TILE_WAS_LAST_DISCARD])
-def deal_in_tile_was_last_discard(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def deal_in_tile_was_last_discard(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.DEAL_IN_TILE_WAS_LAST_DISCARD)]["tile"]
     prev_tile = data[flags.index(Flags.DEAL_IN_TILE_WAS_LAST_DISCARD)]["prev_tile"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
@@ -1049,7 +1078,7 @@ def deal_in_tile_was_last_discard(flags: List[Flags], data: List[Dict[str, Any]]
 # Print if you drew a tile that would have completed a past wait
 @injustice(require=[Flags.YOU_DREW_PREVIOUSLY_WAITED_TILE],
             forbid=[Flags.YOU_GAINED_POINTS])
-def drew_tile_completing_past_wait(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def drew_tile_completing_past_wait(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile_data = data[flags.index(Flags.YOU_DREW_PREVIOUSLY_WAITED_TILE)]
     tile = tile_data["tile"]
     wait = tile_data["wait"]
@@ -1062,7 +1091,7 @@ def drew_tile_completing_past_wait(flags: List[Flags], data: List[Dict[str, Any]
 
 # Print if you dealt into ura 3 OR if someone else tsumoed and got ura 3
 @injustice(require=[Flags.WINNER_GOT_URA_3, Flags.YOU_LOST_POINTS])
-def lost_points_to_ura_3(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def lost_points_to_ura_3(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     value = data[flags.index(Flags.WINNER_GOT_URA_3)]["value"]
     seat = data[flags.index(Flags.WINNER_GOT_URA_3)]["seat"]
     if Flags.GAME_ENDED_WITH_RON in flags:
@@ -1078,7 +1107,7 @@ def lost_points_to_ura_3(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 
 # Print if winner had 3+ han from dora tiles in the hidden part of hand
 @injustice(require=[Flags.WINNER_GOT_HIDDEN_DORA_3, Flags.YOU_LOST_POINTS])
-def lost_points_to_hidden_dora_3(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def lost_points_to_hidden_dora_3(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     seat = data[flags.index(Flags.WINNER_GOT_HIDDEN_DORA_3)]["seat"]
     value = data[flags.index(Flags.WINNER_GOT_HIDDEN_DORA_3)]["value"]
     if Flags.GAME_ENDED_WITH_RON in flags:
@@ -1094,7 +1123,7 @@ def lost_points_to_hidden_dora_3(flags: List[Flags], data: List[Dict[str, Any]],
 
 # Print if an early abortive draw happened with an iishanten haipai
 @injustice(require=[Flags.IISHANTEN_HAIPAI_ABORTED])
-def iishanten_haipai_aborted(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def iishanten_haipai_aborted(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     draw_name = data[flags.index(Flags.IISHANTEN_HAIPAI_ABORTED)]["draw_name"]
     shanten = data[flags.index(Flags.IISHANTEN_HAIPAI_ABORTED)]["shanten"]
     hand = data[flags.index(Flags.IISHANTEN_HAIPAI_ABORTED)]["hand"]
@@ -1107,10 +1136,10 @@ def iishanten_haipai_aborted(flags: List[Flags], data: List[Dict[str, Any]], kyo
 # Print if you reached yakuman tenpai but did not win
 @injustice(require=[Flags.YOU_REACHED_YAKUMAN_TENPAI],
             forbid=[Flags.YOU_FOLDED_FROM_TENPAI, Flags.YOU_RONNED_SOMEONE, Flags.YOU_TSUMOED])
-def you_reached_yakuman_tenpai(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    yakuman_types = data[len(data) - 1 - flags[::-1].index(Flags.YOU_REACHED_YAKUMAN_TENPAI)]["types"]
-    yakuman_waits = data[len(data) - 1 - flags[::-1].index(Flags.YOU_REACHED_YAKUMAN_TENPAI)]["waits"]
-    hand = data[len(data) - 1 - flags[::-1].index(Flags.YOU_REACHED_YAKUMAN_TENPAI)]["hand"]
+def you_reached_yakuman_tenpai(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    yakuman_types = data[flags.last_index(Flags.YOU_REACHED_YAKUMAN_TENPAI)]["types"]
+    yakuman_waits = data[flags.last_index(Flags.YOU_REACHED_YAKUMAN_TENPAI)]["waits"]
+    hand = data[flags.last_index(Flags.YOU_REACHED_YAKUMAN_TENPAI)]["hand"]
     what_happened = "you didn't win"
     last_subject = "you"
     if Flags.GAME_ENDED_WITH_RON in flags:
@@ -1135,8 +1164,8 @@ def you_reached_yakuman_tenpai(flags: List[Flags], data: List[Dict[str, Any]], k
         last_subject = "someone"
     # identify the location of the remaining waits
     all_waits = {wait for _, waits in yakuman_waits for wait in waits}
-    visible_tiles = kyoku.get_visible_tiles()
-    visible_waits = {wait: visible_tiles.count(wait) for wait in all_waits}
+    visible_counts = kyoku.get_visible_counts()
+    visible_waits = {wait: visible_counts.count(wait) for wait in all_waits}
     held_waits = {wait: [hand.hidden_part.count(wait) for seat in range(kyoku.num_players)] for wait in all_waits}
     total_held_waits = [sum(v[seat] for k, v in held_waits.items()) for seat in range(kyoku.num_players)]
     ukeire = 4 * len(all_waits) - sum(visible_waits.values()) - total_held_waits[player]
@@ -1156,7 +1185,7 @@ def you_reached_yakuman_tenpai(flags: List[Flags], data: List[Dict[str, Any]], k
 # Print if you got head bumped (or you skipped your ron)
 @injustice(require=[Flags.YOU_WAITED_ON_WINNING_TILE, Flags.GAME_ENDED_WITH_RON, Flags.WINNER],
             forbid=[Flags.YOU_FOLDED_FROM_TENPAI, Flags.YOU_GAINED_POINTS])
-def you_got_head_bumped(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def you_got_head_bumped(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     tile = data[flags.index(Flags.YOU_WAITED_ON_WINNING_TILE)]["tile"]
     wait = data[flags.index(Flags.YOU_WAITED_ON_WINNING_TILE)]["wait"]
     winner = data[flags.index(Flags.WINNER)]["seat"]
@@ -1169,10 +1198,10 @@ def you_got_head_bumped(flags: List[Flags], data: List[Dict[str, Any]], kyoku: K
 @injustice(require=[Flags.YOU_HAD_LIMIT_TENPAI, Flags.WINNER],
             forbid=[Flags.YOU_FOLDED_FROM_TENPAI, Flags.YOU_GAINED_POINTS,
                     Flags.WINNER_GOT_MANGAN])
-def your_mangan_tenpai_destroyed(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
-    hand_str = data[len(data) - 1 - flags[::-1].index(Flags.YOU_HAD_LIMIT_TENPAI)]["hand_str"]
-    yaku_str = data[len(data) - 1 - flags[::-1].index(Flags.YOU_HAD_LIMIT_TENPAI)]["yaku_str"]
-    limit_name = data[len(data) - 1 - flags[::-1].index(Flags.YOU_HAD_LIMIT_TENPAI)]["limit_name"]
+def your_mangan_tenpai_destroyed(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+    hand_str = data[flags.last_index(Flags.YOU_HAD_LIMIT_TENPAI)]["hand_str"]
+    yaku_str = data[flags.last_index(Flags.YOU_HAD_LIMIT_TENPAI)]["yaku_str"]
+    limit_name = data[flags.last_index(Flags.YOU_HAD_LIMIT_TENPAI)]["limit_name"]
     han = data[flags.index(Flags.YOU_HAD_LIMIT_TENPAI)]["han"]
     fu = data[flags.index(Flags.YOU_HAD_LIMIT_TENPAI)]["fu"]
     score = data[flags.index(Flags.WINNER)]["score_object"].to_points()
@@ -1194,7 +1223,7 @@ def your_mangan_tenpai_destroyed(flags: List[Flags], data: List[Dict[str, Any]],
 # Print if you were fourth and started with 3 dora but someone else won
 @injustice(require=[Flags.STARTED_WITH_3_DORA, Flags.YOU_WERE_FOURTH, Flags.WINNER],
             forbid=[Flags.YOU_GAINED_POINTS])
-def couldnt_avoid_last_with_3_dora(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def couldnt_avoid_last_with_3_dora(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     num_dora = data[flags.index(Flags.STARTED_WITH_3_DORA)]["num"]
     winner = data[flags.index(Flags.WINNER)]["seat"]
     return [Injustice(kyoku.round, kyoku.honba, "Injustice",
@@ -1206,7 +1235,7 @@ def couldnt_avoid_last_with_3_dora(flags: List[Flags], data: List[Dict[str, Any]
 # Print if someone took your points and you dropped placement only because of ura
 @injustice(require=[Flags.YOU_DEALT_IN, Flags.YOU_DROPPED_PLACEMENT, Flags.WINNER],
             forbid=[])
-def dropped_placement_due_to_ura(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def dropped_placement_due_to_ura(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     score: Score = data[flags.index(Flags.WINNER)]["score_object"]
     winner: int = data[flags.index(Flags.WINNER)]["seat"]
     prev_scores: List[int] = data[flags.index(Flags.YOU_DROPPED_PLACEMENT)]["prev_scores"]
@@ -1235,7 +1264,7 @@ def dropped_placement_due_to_ura(flags: List[Flags], data: List[Dict[str, Any]],
 # Print if your good 4+ sided wait lost to someone else's worse wait
 @injustice(require=[Flags.YOU_REACHED_TENPAI, Flags.WINNER],
             forbid=[Flags.YOU_GAINED_POINTS])
-def four_sided_wait_didnt_win(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def four_sided_wait_didnt_win(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     for i, flag in reversed(list(enumerate(flags))):
         if flag == Flags.YOU_REACHED_TENPAI:
             wait = data[i]["hand"].shanten[1]
@@ -1256,7 +1285,7 @@ def four_sided_wait_didnt_win(flags: List[Flags], data: List[Dict[str, Any]], ky
 # Print if you dealt into chankan while tenpai
 @injustice(require=[Flags.YOU_REACHED_TENPAI, Flags.WINNER],
             forbid=[Flags.YOU_GAINED_POINTS])
-def dealt_into_chankan_while_tenpai(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def dealt_into_chankan_while_tenpai(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     yaku = data[flags.index(Flags.WINNER)]["score_object"].yaku
     if ("chankan", 1) in yaku:
         return [Injustice(kyoku.round, kyoku.honba, "Injustice",
@@ -1269,7 +1298,7 @@ def dealt_into_chankan_while_tenpai(flags: List[Flags], data: List[Dict[str, Any
 # Print if at least half of the tiles in your wait were in the dead wall
 @injustice(require=[Flags.WAIT_WAS_IN_DEAD_WALL],
             forbid=[Flags.YOU_WON])
-def wait_was_in_dead_wall(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def wait_was_in_dead_wall(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     wait = data[flags.index(Flags.WAIT_WAS_IN_DEAD_WALL)]["wait"]
     ukeire = data[flags.index(Flags.WAIT_WAS_IN_DEAD_WALL)]["ukeire"]
     num_tiles = data[flags.index(Flags.WAIT_WAS_IN_DEAD_WALL)]["num_tiles"]
@@ -1282,7 +1311,7 @@ def wait_was_in_dead_wall(flags: List[Flags], data: List[Dict[str, Any]], kyoku:
 # Print if, had the game not ended, you would have tsumoed within 5 turns
 @injustice(require=[Flags.COULD_HAVE_TSUMOED],
             forbid=[Flags.YOU_WON])
-def could_have_tsumoed(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def could_have_tsumoed(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     wait = data[flags.index(Flags.COULD_HAVE_TSUMOED)]["wait"]
     draws = data[flags.index(Flags.COULD_HAVE_TSUMOED)]["draws"]
     yakuman_tenpais = data[flags.index(Flags.COULD_HAVE_TSUMOED)]["yakuman_tenpais"]
@@ -1302,7 +1331,7 @@ def could_have_tsumoed(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Ky
 # Print if, had the game not ended, you would have ronned a riichi player within 5 turns
 @injustice(require=[Flags.COULD_HAVE_RONNED],
             forbid=[Flags.YOU_WON, Flags.COULD_HAVE_TSUMOED])
-def could_have_ronned(flags: List[Flags], data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
+def could_have_ronned(flags: FlagSet, data: List[Dict[str, Any]], kyoku: Kyoku, player: int) -> Sequence[CheckResult]:
     wait = data[flags.index(Flags.COULD_HAVE_RONNED)]["wait"]
     draws = data[flags.index(Flags.COULD_HAVE_RONNED)]["draws"]
     yakuman_tenpais = data[flags.index(Flags.COULD_HAVE_RONNED)]["yakuman_tenpais"]
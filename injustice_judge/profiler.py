@@ -0,0 +1,100 @@
+import contextlib
+import time
+from typing import *
+
+# This file implements an optional profiler for InjusticeJudge.
+#
+# Profiling is off by default. Call `enable_profiling()` (or pass --profile to
+#   main.py) to start collecting timings, and `get_profiler().report()` to get them.
+#
+# Two kinds of things are timed:
+# - stages of analyzing a game (fetch, parse, postprocess, flags, checks),
+#   which are wrapped in `with profile_stage(name):`
+# - phases of the shanten calculation (calculate_hands, remove_some_taatsus,
+#   get_hand_shanten, get_iishanten_type, get_tenpai_waits, total), which are
+#   timed inline in `_calculate_shanten`, since that's called far more often
+# Hot code checks `get_profiler() is not None` before reading the clock,
+#   so when profiling is disabled the only cost is that check.
+#
+# The report also includes the hit rate of every registered cache (see
+#   `bounded_cache` in utils.py) and the size of every per-suit table in tables.py.
+
+class Profiler:
+    """Collects the number of calls, total time, and a histogram of times for each named phase"""
+    def __init__(self) -> None:
+        self.counts: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+        # histograms[name][i] = number of calls taking between 2^(i-1) and 2^i nanoseconds
+        self.histograms: Dict[str, Dict[int, int]] = {}
+    def record(self, name: str, start_ns: int) -> int:
+        """Record the time since `start_ns` (from time.perf_counter_ns) under `name`, and return the current time"""
+        now = time.perf_counter_ns()
+        elapsed = now - start_ns
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.totals[name] = self.totals.get(name, 0) + elapsed
+        histogram = self.histograms.setdefault(name, {})
+        bucket = elapsed.bit_length()
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+        return now
+    def report(self) -> Dict[str, Any]:
+        """Return all timings and cache statistics as a JSON-serializable dict"""
+        from . import tables
+        from .utils import get_cache_info
+        phases = {name: {"calls": self.counts[name],
+                         "total_ms": round(self.totals[name] / 1e6, 3),
+                         "mean_us": round(self.totals[name] / self.counts[name] / 1e3, 3),
+                         "histogram": {f"<{2**bucket}ns": count for bucket, count in sorted(self.histograms[name].items())}}
+                  for name in self.counts}
+        caches = {name: {"hits": info.hits,
+                         "misses": info.misses,
+                         "hit_ratio": round(info.hits / (info.hits + info.misses), 4) if info.hits + info.misses > 0 else None,
+                         "size": info.currsize,
+                         "maxsize": info.maxsize}
+                  for name, info in get_cache_info().items()}
+        table_sizes = {name: fn.cache_info().currsize for name, fn in vars(tables).items() if hasattr(fn, "cache_info")}
+        return {"phases": phases, "caches": caches, "tables": table_sizes}
+    def to_str(self) -> str:
+        """Format the report as a human-readable table"""
+        report = self.report()
+        lines = [f"{'phase':<24}{'calls':>10}{'total ms':>12}{'mean us':>12}"]
+        for name, phase in report["phases"].items():
+            lines.append(f"{name:<24}{phase['calls']:>10}{phase['total_ms']:>12.1f}{phase['mean_us']:>12.1f}")
+        lines.append("")
+        lines.append(f"{'cache':<56}{'hit ratio':>10}{'size':>10}{'maxsize':>10}")
+        for name, cache in report["caches"].items():
+            hit_ratio = "-" if cache["hit_ratio"] is None else f"{cache['hit_ratio']:.1%}"
+            lines.append(f"{name:<56}{hit_ratio:>10}{cache['size']:>10}{cache['maxsize']:>10}")
+        lines.append("")
+        lines.append(f"{'table':<56}{'size':>10}")
+        for name, size in report["tables"].items():
+            lines.append(f"{name:<56}{size:>10}")
+        return "\n".join(lines)
+
+_profiler: Optional[Profiler] = None
+
+def enable_profiling() -> Profiler:
+    """Start collecting timings, returning the new profiler"""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def disable_profiling() -> None:
+    global _profiler
+    _profiler = None
+
+def get_profiler() -> Optional[Profiler]:
+    """Return the current profiler, or None if profiling is disabled"""
+    return _profiler
+
+@contextlib.contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """Time the body of the `with` statement under `name`, if profiling is enabled"""
+    if _profiler is None:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        if _profiler is not None:
+            _profiler.record(name, start)
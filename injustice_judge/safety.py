@@ -0,0 +1,77 @@
+from enum import IntEnum
+from .constants import JIHAI, PRED, SUCC, TILES, TILE_INDEX
+from .utils import SUJI, normalize_red_five
+from typing import *
+if TYPE_CHECKING:
+    from .classes import TileCounts
+
+# This file implements a table of how safe every tile is against a given player.
+#
+# `is_safe` in utils.py answers the question for one tile at a time, which
+#   means rechecking genbutsu, suji, and one-chance for every tile in every
+#   hand on every draw. `SafetyMap` instead keeps the answer for all 34 tiles,
+#   and only recomputes the few tiles whose answer can change when a tile
+#   becomes genbutsu or visible:
+# - a new genbutsu tile changes itself and the tiles it's suji for (+-3)
+# - a new visible tile changes the one-chance status of tiles within +-2
+#
+# Red fives are treated as fives throughout.
+
+class Safety(IntEnum):
+    """How safe a tile is against a player, from safest to most dangerous"""
+    GENBUTSU = 0
+    SUJI = 1
+    ONE_CHANCE = 2 # every taatsu waiting on it is one-chance (or it's an honor with 3 visible)
+    DANGEROUS = 3
+
+def get_safety(tile: int, genbutsu: Container[int], visible_counts: "TileCounts") -> Safety:
+    """Classify a (non-red) tile given the player's genbutsu and all visible tiles"""
+    if tile in genbutsu:
+        return Safety.GENBUTSU
+    if tile in JIHAI:
+        return Safety.ONE_CHANCE if visible_counts.count(tile) >= 3 else Safety.DANGEROUS
+    # suji: every tile that could form a ryanmen wait on this tile is genbutsu
+    if all(suji in genbutsu for suji in SUJI[tile]):
+        return Safety.SUJI
+    # one-chance: every taatsu waiting on this tile has 3+ copies of some tile visible
+    possible_taatsus = ((PRED[PRED[tile]], PRED[tile]), (PRED[tile], SUCC[tile]), (SUCC[tile], SUCC[SUCC[tile]]))
+    if all(any(visible_counts.count(t) >= 3 for t in taatsu) for taatsu in possible_taatsus if 0 not in taatsu):
+        return Safety.ONE_CHANCE
+    return Safety.DANGEROUS
+
+class SafetyMap:
+    """
+    The safety of every tile against one player, kept up to date as tiles become
+    genbutsu (`add_genbutsu`) or visible (`add_visible`).
+    `visible_counts` is shared with the caller, who should call `add_visible`
+      after adding to it.
+    """
+    __slots__ = ("genbutsu", "visible_counts", "safety")
+    def __init__(self, visible_counts: "TileCounts", genbutsu: Iterable[int] = ()) -> None:
+        self.genbutsu: Set[int] = {normalize_red_five(tile) for tile in genbutsu}
+        self.visible_counts = visible_counts
+        self.safety: List[Safety] = [get_safety(tile, self.genbutsu, visible_counts) for tile in TILES]
+    def _update(self, tiles: Iterable[int]) -> None:
+        for tile in tiles:
+            if tile != 0:
+                self.safety[TILE_INDEX[tile]] = get_safety(tile, self.genbutsu, self.visible_counts)
+    def add_genbutsu(self, tile: int) -> None:
+        tile = normalize_red_five(tile)
+        if tile not in self.genbutsu:
+            self.genbutsu.add(tile)
+            self._update((tile, *SUJI.get(tile, ())))
+    def add_visible(self, tile: int) -> None:
+        tile = normalize_red_five(tile)
+        if tile in JIHAI:
+            self._update((tile,))
+        else:
+            self._update((PRED[PRED[tile]], PRED[tile], tile, SUCC[tile], SUCC[SUCC[tile]]))
+    def __getitem__(self, tile: int) -> Safety:
+        """Danger level of a tile"""
+        return self.safety[TILE_INDEX[tile]]
+    def is_safe(self, tile: int) -> bool:
+        """Same as `is_safe` in utils.py: true if the tile is any of genbutsu/suji/one-chance"""
+        return self.safety[TILE_INDEX[tile]] != Safety.DANGEROUS
+    def count_safe(self, tiles: Iterable[int]) -> int:
+        """Number of safe tiles in `tiles` (e.g. a hand)"""
+        return sum(1 for tile in tiles if self.safety[TILE_INDEX[tile]] != Safety.DANGEROUS)
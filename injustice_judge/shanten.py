@@ -1,9 +1,12 @@
-import functools
 import itertools
-from .classes import Interpretation
-from .constants import Shanten, PRED, SUCC, TANYAOHAI, YAOCHUUHAI
+import time
+from .classes import Interpretation, TileCounts
+from .constants import Shanten, PRED, SUCC, TANYAOHAI, TILES, YAOCHUUHAI
 from .display import ph, pt
-from .utils import get_taatsu_wait, get_waits, normalize_red_five, normalize_red_fives, sorted_hand, try_remove_all_tiles
+from .profiler import get_profiler
+from .shanten_store import get_shanten_store
+from .tables import DIGIT, SuitKey, agari_shape, all_groups, all_taatsus, complex_shapes, from_key, get_count, pair_shapes, some_groups, some_taatsus, suit_summary, taatsu_floating, to_key
+from .utils import PERMUTE_SUITS, UNPERMUTE_SUITS, bounded_cache, get_canonical_suit_order, get_taatsu_wait, get_waits, normalize_red_five, normalize_red_fives, sorted_hand
 
 from typing import *
 from pprint import pprint
@@ -15,20 +18,11 @@ from pprint import pprint
 # The algorithm basically tries to remove every combination of groups and
 #   taatsus to determine the shanten, and then looks at the resulting subhands
 #   to determine the iishanten type and the waits.
+# Removing groups and taatsus is done one suit at a time, by looking up the
+#   suit's shape in the precomputed decomposition tables in `tables.py`.
 # 
-# See `_calculate_shanten` for more info.
-
-# Timers used for profiling shanten.
-# This algorithm is slow, so the program spends most of its time here.
-import time
-timers = {
-    "calculate_hands": 0.0,
-    "remove_some_taatsus": 0.0,
-    "get_hand_shanten": 0.0,
-    "get_iishanten_type": 0.0,
-    "get_tenpai_waits": 0.0,
-    "total": 0.0,
-}
+# See `_calculate_shanten` for more info. Its phases can be timed with the
+#   profiler in `profiler.py`.
 
 ###
 ### ukeire and shanten calculations
@@ -51,65 +45,66 @@ def to_suits(hand: Tuple[int, ...]) -> Suits:
 def from_suits(suits: Suits) -> Iterator[Tuple[int, ...]]:
     return ((*(10+v for v in a), *(20+v for v in b), *(30+v for v in c), *(40+v for v in d))
         for a in suits[0] for b in suits[1] for c in suits[2] for d in suits[3])
-
-def eliminate_from_suits(suits: Suits, keep_some: bool,
-                         sequences_to_check: Callable[[int], Tuple[Tuple[int, ...], ...]],
-                         multiples_to_check: int = 0) -> Suits:
+def to_suit_keys(hand: Tuple[int, ...]) -> Tuple[SuitKey, ...]:
+    """Pack each suit of a (red-five-normalized) hand into a key for the tables in tables.py"""
+    keys = [0, 0, 0, 0]
+    for tile in hand:
+        keys[tile//10 - 1] += DIGIT[tile%10]
+    return tuple(keys)
+def from_suit_keys(keys: Tuple[SuitKey, ...]) -> Tuple[int, ...]:
+    return tuple(10*(i+1)+rank for i, key in enumerate(keys) for rank in from_key(key))
+def to_normalized_hand(hand: Iterable[int]) -> Tuple[int, ...]:
+    """Normalize red fives, skipping the work if passed a TileCounts"""
+    return from_suit_keys(tuple(hand.suit_keys)) if isinstance(hand, TileCounts) else tuple(normalize_red_fives(hand))
+# shanten doesn't depend on which number suit is which, so put them in a canonical order
+to_canonical_keys = lambda keys: (*sorted(keys[:3]), keys[3])
+
+def eliminate_from_suits(suits: Suits, table: Callable[[SuitKey, bool], FrozenSet[SuitKey]]) -> Suits:
     """
     Very general function, removes all combinations of a given pattern from a hand
-    The pattern is specified in either sequences_to_check or multiples_to_check
-    (sequences_to_check: given a base tile, like 5, return tiles that form the pattern, like 567)
-    (multiples_to_check: given 2, check for all pairs. given 3, check for all triplets.
-    If keep_some is False, the returned hands will contain all possibilities of removing
+    The pattern and the way it is removed is specified by the per-suit table (see tables.py):
+    - all_groups/all_taatsus: the returned hands will contain all possibilities of removing
       as many instances of the pattern as possible from the hand
-    If keep_some is True, the returned hands will contain all possibilities of removing
-      one or more instances of the pattern from the hand
+    - some_groups/some_taatsus: the returned hands will contain all possibilities of removing
+      zero or more instances of the pattern from the hand
     """
-    def remove(hand: Tuple[int, ...], do_sequences: bool = True) -> Set[Tuple[int, ...]]:
-        max_length = len(hand)
-        def rec(hand: Tuple[int, ...]) -> Set[Tuple[int, ...]]:
-            nonlocal max_length
-            max_length = min(max_length, len(hand))
-            candidates = set()
-            for i, tile in enumerate(hand):
-                # check pair/triplet
-                if multiples_to_check > 0 and i + (multiples_to_check-1) < len(hand) and all(tile == hand[i+n] for n in range(1, multiples_to_check)):
-                    candidates.add((*hand[:i],*hand[i+multiples_to_check:]))
-                if do_sequences:
-                    for sequence in sequences_to_check(tile):
-                        sequence_removed = try_remove_all_tiles(hand, sequence)
-                        if len(sequence_removed) < len(hand):
-                            candidates.add(sequence_removed)
-            if len(candidates) > 0:
-                return set.union(*map(rec, candidates)) | ({hand} if keep_some else set())
-            else:
-                return {hand}
-        return rec(hand) if keep_some else set(filter(lambda h: len(h) == max_length, rec(hand)))
-
-    return (
-        set.union(*(remove(s) for s in suits[0])),
-        set.union(*(remove(s) for s in suits[1])),
-        set.union(*(remove(s) for s in suits[2])),
-        suits[3] if multiples_to_check == 0 else set.union(*(remove(s, do_sequences=False) for s in suits[3]))
-    )
-
-to_sequences = lambda tile: ((tile+2, tile+1, tile),)
-to_taatsus = lambda tile: ((tile+2, tile), (tile+1, tile),)
-eliminate_some_groups  = lambda suits: eliminate_from_suits(suits, True,  to_sequences, 3)
-eliminate_some_taatsus = lambda suits: eliminate_from_suits(suits, True,  to_taatsus)
-eliminate_all_groups   = lambda suits: eliminate_from_suits(suits, False, to_sequences, 3)
-eliminate_all_taatsus  = lambda suits: eliminate_from_suits(suits, False, to_taatsus)
-
-def get_tenpai_waits(hand: Tuple[int, ...]) -> Set[int]:
-    """Given a tenpai hand, get all its waits"""
-    return {wait for i in Interpretation(hand).generate_all_interpretations() for wait in i.get_waits()}
+    return tuple(set(from_key(k) for hand in suit for k in table(to_key(hand), i == 3)) for i, suit in enumerate(suits))
 
-def get_hand_shanten(suits: Suits, groups_needed: int) -> float:
-    """Return the shanten of a given hand that has all of its groups, ryanmens, and kanchans removed"""
-    # get the minimum number of floating tiles in each suit
-    count_floating = lambda hand: tuple(Counter(hand).values()).count(1)
-    floating: List[int] = [min(map(count_floating, hands), default=0) for hands in suits]
+eliminate_some_groups  = lambda suits: eliminate_from_suits(suits, some_groups)
+eliminate_some_taatsus = lambda suits: eliminate_from_suits(suits, some_taatsus)
+eliminate_all_groups   = lambda suits: eliminate_from_suits(suits, all_groups)
+eliminate_all_taatsus  = lambda suits: eliminate_from_suits(suits, all_taatsus)
 
+def get_tenpai_waits(hand: Tuple[int, ...]) -> Set[int]:
+    """
+    Given a (red-five-normalized) tenpai hand, get all its waits
+    Checks each tile to see if adding it makes a complete hand (see `agari_shape` in tables.py),
+      so this doesn't need to generate every interpretation of the hand
+    """
+    keys = to_suit_keys(hand)
+    if any(get_count(key, rank) == 4 for key in keys for rank in range(1, 10)):
+        # we might be waiting on a tile we have all 4 of, which can't be added to a suit key,
+        #   so just get the waits from every interpretation of the hand
+        return {wait for i in Interpretation(hand).generate_all_interpretations() for wait in i.get_waits()}
+    shapes = [agari_shape(key, i == 3) for i, key in enumerate(keys)]
+    waits = set()
+    for tile in TILES:
+        i = tile//10 - 1
+        # exactly one suit (including the one we're adding to) can have a pair
+        is_groups, has_pair = agari_shape(keys[i] + DIGIT[tile%10], i == 3)
+        other_shapes = shapes[:i] + shapes[i+1:]
+        if has_pair and all(g for g, _ in other_shapes) \
+        or is_groups and any(p and all(g for g, _ in other_shapes[:j] + other_shapes[j+1:]) for j, (_, p) in enumerate(other_shapes)):
+            waits.add(tile)
+    return waits
+
+def get_hand_shanten(floating: Sequence[Tuple[int, int]], groups_needed: int) -> float:
+    """
+    Return the shanten of a given hand that has all of its groups, ryanmens, and kanchans removed
+    `floating` contains, for each suit, the minimum number of floating tiles in that suit
+      and the minimum number of floating tiles in that suit if it must contain a pair
+    (See `taatsu_floating` in tables.py)
+    """
     def get_shanten(total_floating: int, pair_exists: bool) -> int:
         # needs_pair = 1 if the hand is missing a pair but is full of taatsus -- need to convert a taatsu to a pair
         # must_discard_taatsu = 1 if the hand is 6+ blocks -- one of the taatsu is actually 2 floating tiles
@@ -119,14 +114,14 @@ def get_hand_shanten(suits: Suits, groups_needed: int) -> float:
         shanten = needs_pair + must_discard_taatsu + (groups_needed + total_floating - 1) // 2
         return shanten
 
-    shanten = get_shanten(sum(floating), False)
+    total_floating = sum(f for f, _ in floating)
+    shanten = get_shanten(total_floating, False)
 
     # check if we have a pair
-    # take the hand(s) with a pair that would add the least additional floating tiles to that suit
-    has_pair = lambda hand: any(hand.count(tile) == 2 for tile in hand)
-    extra_floating = min(min(map(count_floating, filter(has_pair, hands)), default=99) - f for f, hands in zip(floating, suits))
+    # take the suit with a pair that would add the least additional floating tiles to that suit
+    extra_floating = min(pair_f - f for f, pair_f in floating)
     if extra_floating < 50:
-        shanten = min(shanten, get_shanten(sum(floating) + extra_floating, True))
+        shanten = min(shanten, get_shanten(total_floating + extra_floating, True))
     return shanten
 
 # when the wait is any tile except the ones we have a pair of already
@@ -155,41 +150,6 @@ def calculate_kokushi_shanten(starting_hand: Tuple[int, ...], ctr: Counter[int])
     waits = () if shanten > 1 else sorted_hand(YAOCHUUHAI if not has_pair else YAOCHUUHAI.difference(starting_hand))
     return shanten, waits
 
-# Caches for removing pairs or complex shapes from a given suit
-
-# pair_shapes[shape] = {(pair, shape without pair), ...}
-pair_shapes: Dict[Tuple[int, ...], Set[Tuple[Tuple[int, ...], Tuple[int, ...]]]] = {}
-# complex_shapes[shape] = {(complex shape, shape without complex shape), ...}
-complex_shapes: Dict[Tuple[int, ...], Set[Tuple[Tuple[int, ...], Tuple[int, ...]]]] = {}
-
-def add_pair_shape(hand: Tuple[int, ...], recursed: bool = False) -> None:
-    """Used to add an entry to pair_shapes"""
-    global pair_shapes
-    pair_shapes.setdefault(hand, set())
-    for tile in hand:
-        if hand.count(tile) >= 2:
-            ix = hand.index(tile)
-            pair = hand[ix:ix+2]
-            remaining_hand = (*hand[:ix], *hand[ix+2:])
-            pair_shapes[hand].add((pair, remaining_hand))
-            if not recursed:
-                add_complex_shape(remaining_hand, recursed=True)
-                add_pair_shape(remaining_hand, recursed=True)
-
-def add_complex_shape(hand: Tuple[int, ...], recursed: bool = False) -> None:
-    """Used to add an entry to complex_shapes"""
-    global complex_shapes
-    complex_shapes.setdefault(hand, set())
-    for tile in hand[:-2]:
-        to_complex_shapes = lambda t1: (t2:=t1+1, t3:=t1+2, t5:=t1+4, ((t1,t1,t2),(t1,t2,t2),(t1,t1,t3),(t1,t3,t3),(t1,t3,t5)))[-1]
-        for shape in to_complex_shapes(tile):
-            remaining_hand = try_remove_all_tiles(hand, shape)
-            if len(remaining_hand) < len(hand):
-                complex_shapes[hand].add((shape, remaining_hand))
-                if not recursed:
-                    add_complex_shape(remaining_hand, recursed=True)
-                    add_pair_shape(remaining_hand, recursed=True)
-
 def get_iishanten_type(starting_hand: Tuple[int, ...], groupless_hands: Suits, groups_needed: int) -> Tuple[float, Set[int]]:
     # given an iishanten hand, calculate the iishanten type and its waits
     # we'll always return 1.XXX shanten, where XXX represents the type of iishanten
@@ -280,8 +240,6 @@ def get_iishanten_type(starting_hand: Tuple[int, ...], groupless_hands: Suits, g
     min_length = max_length = 7
     suits: Suits = eliminate_some_groups(to_suits(starting_hand))
 
-    global pair_shapes
-    global complex_shapes
     pair_hands: Suits = (set(()),set(()),set(()),set(()))
     complex_hands: Suits = (set(()),set(()),set(()),set(()))
 
@@ -289,14 +247,11 @@ def get_iishanten_type(starting_hand: Tuple[int, ...], groupless_hands: Suits, g
     for i, suit in enumerate(suits):
         for hand in suit:
             # check if there's a pair
-            add_pair_shape(hand)
-            if len(pair_shapes[hand]) > 0:
+            if len(pair_shapes(hand)) > 0:
                 pair_hands[i].add(hand)
-            if i < 3:
-                # check if there's any complex shapes
-                add_complex_shape(hand)
-                if len(complex_shapes[hand]) > 0:
-                    complex_hands[i].add(hand)
+            # check if there's any complex shapes
+            if i < 3 and len(complex_shapes(hand)) > 0:
+                complex_hands[i].add(hand)
 
     complete_waits = set()
     is_perfect_iishanten = False
@@ -357,15 +312,15 @@ def get_iishanten_type(starting_hand: Tuple[int, ...], groupless_hands: Suits, g
     for i, suit in enumerate(pair_hands):
         add_i = lambda h: tuple(10*(i+1)+tile for tile in h)
         for pair_hand in suit:
-            for pair_shape, remaining in pair_shapes[pair_hand]:
-                contains_complex_shape = i != 3 and len(complex_shapes.get(remaining, set())) > 0
+            for pair_shape, remaining in pair_shapes(pair_hand):
+                contains_complex_shape = i != 3 and len(complex_shapes(remaining)) > 0
                 # for all possible length 7 hands containing the pair,
                 for other_tiles in get_other_tiles(pair_hand, i, (), -1):
                     # add this hand as a floating hand
                     add_floating_hand(add_i(pair_shape), tuple(sorted((*add_i(remaining), *other_tiles))))
                     # add this hand as a complex hand, if there's a complex shape
                     if contains_complex_shape:
-                        for complex_shape, remaining2 in complex_shapes[remaining]:
+                        for complex_shape, remaining2 in complex_shapes(remaining):
                             add_complex_hand(add_i(complex_shape), add_i(pair_shape), tuple(sorted((*other_tiles, *add_i(remaining2)))))
                 if contains_complex_shape:
                     continue
@@ -375,7 +330,7 @@ def get_iishanten_type(starting_hand: Tuple[int, ...], groupless_hands: Suits, g
                         continue
                     add_j = lambda h: tuple(10*(j+1)+tile for tile in h)
                     for complex_hand in suit:
-                        for complex_shape, remaining2 in complex_shapes[complex_hand]:
+                        for complex_shape, remaining2 in complex_shapes(complex_hand):
                             # for all possible length 7 hands containing both the pair and complex hand,
                             for other_tiles in get_other_tiles(pair_hand, i, complex_hand, j):
                                 # add this hand as a complex hand
@@ -387,7 +342,7 @@ def get_iishanten_type(starting_hand: Tuple[int, ...], groupless_hands: Suits, g
     waits |= complete_waits | floating_waits
     return round(shanten, 3), waits
 
-@functools.lru_cache(maxsize=65536)
+@bounded_cache(maxsize=65536)
 def _calculate_shanten(starting_hand: Tuple[int, ...]) -> Shanten:
     """
     Return the shanten of the hand, plus its waits (if tenpai or iishanten).
@@ -402,20 +357,30 @@ def _calculate_shanten(starting_hand: Tuple[int, ...]) -> Shanten:
     # 4. If iishanten or tenpai, calculate the waits
     # 5. Do 2-4 for chiitoitsu and kokushi
 
-    suits = to_suits(starting_hand)
-    start_time = now = time.time()
-    groupless_hands = eliminate_all_groups(suits)
-    timers["calculate_hands"] += time.time() - now
-    groups_needed = (len(next(from_suits(groupless_hands))) - 1) // 3
+    # check the on-disk store first, if there is one
+    store = get_shanten_store()
+    if store is not None and (stored := store.get(starting_hand)) is not None:
+        return stored
+
+    # time each phase if profiling is enabled (see profiler.py)
+    profiler = get_profiler()
+    if profiler is not None:
+        start_time = now = time.perf_counter_ns()
+
+    keys = to_suit_keys(starting_hand)
+    groupless_keys = [all_groups(key, i == 3) for i, key in enumerate(keys)]
+    groups_needed = (sum(len(from_key(next(iter(k)))) for k in groupless_keys) - 1) // 3
+    if profiler is not None:
+        now = profiler.record("calculate_hands", now)
 
     # calculate shanten for every combination of groups removed
-    now = time.time()
-    removed_taatsus = eliminate_some_taatsus(groupless_hands)
-    timers["remove_some_taatsus"] += time.time() - now
+    floating = [taatsu_floating(key, i == 3) for i, key in enumerate(keys)]
+    if profiler is not None:
+        now = profiler.record("remove_some_taatsus", now)
 
-    now = time.time()
-    shanten: float = get_hand_shanten(removed_taatsus, groups_needed)
-    timers["get_hand_shanten"] += time.time() - now
+    shanten: float = get_hand_shanten(floating, groups_needed)
+    if profiler is not None:
+        now = profiler.record("get_hand_shanten", now)
     assert shanten >= 0, f"somehow calculated negative shanten for {ph(sorted_hand(starting_hand))}"
 
     # if iishanten, get the type of iishanten based on tiles remaining after removing some number of taatsus
@@ -423,16 +388,17 @@ def _calculate_shanten(starting_hand: Tuple[int, ...]) -> Shanten:
     waits: Set[int] = set()
     if shanten == 1:
         assert groups_needed in {1,2}, f"{ph(sorted_hand(starting_hand))} is somehow iishanten with {4-groups_needed} groups"
-        now = time.time()
+        groupless_hands: Suits = tuple(set(map(from_key, k)) for k in groupless_keys)
         shanten, waits = get_iishanten_type(starting_hand, groupless_hands, groups_needed)
-        timers["get_iishanten_type"] += time.time() - now
+        if profiler is not None:
+            profiler.record("get_iishanten_type", now)
         assert shanten != 1, f"somehow failed to detect type of iishanten for iishanten hand {ph(sorted_hand(starting_hand))}"
 
     # if tenpai, get the waits
     elif shanten == 0:
-        now = time.time()
         waits = get_tenpai_waits(starting_hand)
-        timers["get_tenpai_waits"] += time.time() - now
+        if profiler is not None:
+            profiler.record("get_tenpai_waits", now)
         assert len(waits) > 0, f"tenpai hand {ph(sorted_hand(starting_hand))} has no waits?"
 
     # compare with chiitoitsu and kokushi shanten
@@ -474,9 +440,111 @@ def _calculate_shanten(starting_hand: Tuple[int, ...]) -> Shanten:
             waits = (TANYAOHAI | YAOCHUUHAI) - {k for k, v in ctr.items() if v >= 3}
 
     assert all(red not in waits for red in {51,52,53}), f"somehow returned a waits list with red five: {ph(sorted_hand(waits))}"
-    timers["total"] += time.time() - start_time
-    return round(shanten, 4), sorted_hand(waits)
+    if profiler is not None:
+        profiler.record("total", start_time)
+    result = round(shanten, 4), sorted_hand(waits)
+    if store is not None:
+        store.put(starting_hand, result)
+    return result
 
 def calculate_shanten(starting_hand: Iterable[int]) -> Shanten:
-    """This just converts the input to a sorted tuple so it can be serialized as a cache key"""
-    return _calculate_shanten(tuple(sorted(normalize_red_fives(starting_hand))))
+    """
+    This just converts the input to a sorted tuple so it can be serialized as a cache key
+    The number suits are also put into canonical order so that hands with the same
+      shapes in different suits share a cache entry (see `get_canonical_suit_order`)
+    Also accepts a TileCounts, which is already normalized.
+    """
+    hand = to_normalized_hand(starting_hand)
+    order = get_canonical_suit_order(hand)
+    shanten, waits = _calculate_shanten(tuple(sorted(PERMUTE_SUITS[order][tile] for tile in hand)))
+    return shanten, tuple(sorted(UNPERMUTE_SUITS[order][tile] for tile in waits))
+
+@bounded_cache(maxsize=262144)
+def _calculate_shanten_number(keys: Tuple[SuitKey, ...]) -> int:
+    """
+    Return just the integer part of the shanten of the hand with the given suit keys,
+      i.e. int(_calculate_shanten(hand)[0]).
+    This skips figuring out the iishanten type and the waits, which is most of the work.
+    """
+    summaries = [suit_summary(key, i == 3) for i, key in enumerate(keys)]
+    groupless_length, _, _, num_tiles, num_pairs, useless_tiles, num_kokushi_tiles, has_pair, has_quad = map(sum, zip(*summaries))
+    shanten = int(get_hand_shanten([(s[1], s[2]) for s in summaries], (groupless_length - 1) // 3))
+
+    # compare with chiitoitsu and kokushi shanten (see calculate_chiitoitsu_shanten and calculate_kokushi_shanten)
+    if num_tiles == 13:
+        shanten = min(shanten, max(useless_tiles, 7 - num_pairs - 1), (12 if has_pair else 13) - num_kokushi_tiles)
+
+    # a tenpai hand can only be waiting on tiles we have all 4 of,
+    #   in which case it's actually tanki iishanten (see _calculate_shanten)
+    # this only happens if we have all 4 of some tile, so just calculate the waits in that case
+    if shanten == 0 and has_quad:
+        return int(_calculate_shanten(from_suit_keys(keys))[0])
+    return shanten
+
+def calculate_shanten_number(starting_hand: Iterable[int]) -> int:
+    """Same as int(calculate_shanten(starting_hand)[0]), but much cheaper. Also accepts a TileCounts"""
+    if isinstance(starting_hand, TileCounts):
+        assert len(starting_hand) in {1, 4, 7, 10, 13}, f"calculate_shanten_number() was passed a {len(starting_hand)} tile hand: {starting_hand!s}"
+        return _calculate_shanten_number(to_canonical_keys(tuple(starting_hand.suit_keys)))
+    hand = tuple(normalize_red_fives(starting_hand))
+    assert len(hand) in {1, 4, 7, 10, 13}, f"calculate_shanten_number() was passed a {len(hand)} tile hand: {ph(hand)}"
+    return _calculate_shanten_number(to_canonical_keys(to_suit_keys(hand)))
+
+# result of evaluating a discard: (shanten after discarding, tiles accepted after discarding, ukeire)
+DiscardResult = Tuple[Shanten, Tuple[int, ...], int]
+
+def analyze_discards(starting_hand: Iterable[int], visible: Iterable[int] = ()) -> Dict[int, DiscardResult]:
+    """
+    Given a hand that just drew a tile (2, 5, 8, 11, or 14 tiles),
+      evaluate every possible discard and return {discard: (shanten, accepted tiles, ukeire)}.
+    - shanten is what calculate_shanten would return for the hand after the discard
+    - if that hand is tenpai or iishanten, the accepted tiles are its waits,
+      otherwise they are the tiles that would reduce its shanten
+    - ukeire is the number of remaining copies of the accepted tiles, given the
+      tiles in `visible` (which should not include the hand itself)
+    All discards share the same suit decompositions, so only the suit of the
+      discarded tile (and the drawn tile, for accepted tiles) is ever looked up again.
+    Both `starting_hand` and `visible` can also be passed as a TileCounts.
+    """
+    hand = to_normalized_hand(starting_hand)
+    starting_hand = tuple(starting_hand)
+    assert len(hand) in {2, 5, 8, 11, 14}, f"analyze_discards() was passed a {len(hand)} tile hand: {ph(hand)}"
+    keys = to_suit_keys(hand)
+    unavailable = visible if isinstance(visible, TileCounts) else TileCounts(visible)
+    def change(keys: Tuple[SuitKey, ...], tile: int, n: int) -> Tuple[SuitKey, ...]:
+        # add n copies of tile to the hand represented by keys
+        new_keys = list(keys)
+        new_keys[tile//10 - 1] += n * DIGIT[tile%10]
+        return tuple(new_keys)
+    count = lambda keys, tile: get_count(keys[tile//10 - 1], tile%10)
+
+    def get_accepted_tiles(keys: Tuple[SuitKey, ...], shanten: int) -> Tuple[int, ...]:
+        # return all tiles where drawing it and then discarding something else reduces the shanten
+        held = set(from_suit_keys(keys))
+        # only tiles connected to some tile in hand can help, plus kokushi tiles for a closed hand
+        # (except that a closed hand with a triplet or quad can improve its chiitoitsu with any new tile)
+        if len(hand) == 14 and any(count(keys, tile) >= 3 for tile in held):
+            candidates = set(TILES)
+        else:
+            candidates = {t for tile in held for t in (PRED[PRED[tile]], PRED[tile], tile, SUCC[tile], SUCC[SUCC[tile]])} - {0}
+            if len(hand) == 14:
+                candidates |= YAOCHUUHAI
+        reduces_shanten = lambda drawn_keys, tile: any(_calculate_shanten_number(to_canonical_keys(change(drawn_keys, discard, -1))) < shanten for discard in held - {tile})
+        return sorted_hand(tile for tile in candidates if count(keys, tile) < 4 and reduces_shanten(change(keys, tile, 1), tile))
+
+    results: Dict[int, DiscardResult] = {}
+    for discard in set(hand):
+        discarded_keys = change(keys, discard, -1)
+        shanten_number = _calculate_shanten_number(to_canonical_keys(discarded_keys))
+        shanten: Shanten
+        if shanten_number < 2:
+            shanten = calculate_shanten(from_suit_keys(discarded_keys))
+            accepted = shanten[1]
+        else:
+            shanten = (shanten_number, ())
+            accepted = get_accepted_tiles(discarded_keys, shanten_number)
+        ukeire = 4 * len(accepted) - sum(unavailable.count(tile) + count(discarded_keys, tile) for tile in accepted)
+        results[discard] = (shanten, accepted, ukeire)
+
+    # red fives are evaluated the same as their normal counterparts
+    return {tile: results[normalize_red_five(tile)] for tile in sorted_hand(set(starting_hand))}
\ No newline at end of file
@@ -0,0 +1,147 @@
+import mmap
+import os
+import struct
+import zlib
+from .constants import Shanten, TILES, TILE_INDEX
+from typing import *
+
+# This file implements an optional on-disk store for shanten results.
+#
+# `_calculate_shanten` has an in-memory lru_cache, but that cache is private to
+#   each process and is gone when the process exits. The store here is a
+#   fixed-size open-addressing hash table in a single file, which is mmapped
+#   by every process that uses it. Lookups read directly from the mapping,
+#   so any number of worker processes can share one warm table.
+#
+# To enable it, either call `open_shanten_store(path)` before analyzing games,
+#   or set the `shanten_store` environment variable to the file path.
+#
+# File layout:
+#   header (64 bytes): magic, version, capacity (number of slots), number of used slots
+#   slots (24 bytes each):
+#     [0]      number of tiles in the hand, 0 if the slot is empty
+#     [1:14]   the hand's tiles, as indices 0-33 (see TILE_INDEX)
+#     [14:16]  the shanten times 1000, as an unsigned short (1.123 -> 1123)
+#     [16:24]  the waits, as a 34-bit bitmask over tile indices
+#
+# Writers take an exclusive lock on the file, fill in the slot's tiles and
+#   value, and write the tile count byte last. Since an empty slot has a zero
+#   tile count, a reader never sees a slot that's only been partially written.
+# Once the table is 3/4 full, new results are no longer added.
+
+MAGIC = b"IJSHANTN"
+VERSION = 1
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+SLOT = struct.Struct("<B13sHQ")
+DEFAULT_CAPACITY = 1 << 21 # 2M slots, 48MB
+MAX_LOAD_FACTOR = 0.75
+
+def to_wait_mask(waits: Iterable[int]) -> int:
+    """Convert a collection of (non-red) tiles to a 34-bit mask"""
+    mask = 0
+    for tile in waits:
+        mask |= 1 << TILE_INDEX[tile]
+    return mask
+
+def from_wait_mask(mask: int) -> Tuple[int, ...]:
+    """Convert a 34-bit mask back to a sorted tuple of tiles"""
+    return tuple(tile for i, tile in enumerate(TILES) if mask >> i & 1)
+
+def encode_shanten(shanten: float) -> int:
+    return round(shanten * 1000)
+
+def decode_shanten(value: int) -> float:
+    # integer shanten is stored as an int, everything else is 1.XXX
+    return value // 1000 if value % 1000 == 0 else round(value / 1000, 4)
+
+class ShantenStore:
+    """An mmap-backed hash table from normalized sorted hands to their `Shanten`"""
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        assert capacity & (capacity - 1) == 0, f"shanten store capacity must be a power of two, got {capacity}"
+        import fcntl
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        # initialize the file if we're the first to open it
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, HEADER_SIZE + capacity * SLOT.size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, capacity, 0), 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        self.mm = mmap.mmap(self.fd, 0)
+        magic, version, self.capacity, _ = HEADER.unpack_from(self.mm, 0)
+        assert magic == MAGIC and version == VERSION, f"{path} is not a version {VERSION} shanten store"
+        assert len(self.mm) == HEADER_SIZE + self.capacity * SLOT.size, f"shanten store {path} is truncated"
+
+    def close(self) -> None:
+        self.mm.close()
+        os.close(self.fd)
+
+    def __len__(self) -> int:
+        return cast(int, HEADER.unpack_from(self.mm, 0)[3])
+
+    def _find(self, hand: Tuple[int, ...]) -> Tuple[int, bool]:
+        """Return (offset of the slot for this hand, whether that slot is occupied by the hand)"""
+        key = bytes(TILE_INDEX[tile] for tile in hand)
+        padded_key = key.ljust(13, b"\0")
+        i = zlib.crc32(key) & (self.capacity - 1)
+        for _ in range(self.capacity):
+            offset = HEADER_SIZE + i * SLOT.size
+            length = self.mm[offset]
+            if length == 0:
+                return offset, False
+            if length == len(hand) and self.mm[offset+1:offset+14] == padded_key:
+                return offset, True
+            i = (i + 1) & (self.capacity - 1)
+        return -1, False
+
+    def get(self, hand: Tuple[int, ...]) -> Optional[Shanten]:
+        """Look up the shanten of a normalized sorted hand, returning None if it's not stored"""
+        offset, found = self._find(hand)
+        if not found:
+            return None
+        _, _, value, mask = SLOT.unpack_from(self.mm, offset)
+        return decode_shanten(value), from_wait_mask(mask)
+
+    def put(self, hand: Tuple[int, ...], shanten: Shanten) -> None:
+        """Store the shanten of a normalized sorted hand, if it's not already stored and there's room"""
+        import fcntl
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            # look again now that we have the lock, in case another process added it
+            offset, found = self._find(hand)
+            used = len(self)
+            if found or offset == -1 or used + 1 > self.capacity * MAX_LOAD_FACTOR:
+                return
+            # write everything except the tile count, then write the tile count to publish the slot
+            self.mm[offset+1:offset+SLOT.size] = SLOT.pack(0, bytes(TILE_INDEX[tile] for tile in hand), encode_shanten(shanten[0]), to_wait_mask(shanten[1]))[1:]
+            self.mm[offset] = len(hand)
+            HEADER.pack_into(self.mm, 0, MAGIC, VERSION, self.capacity, used + 1)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+# the store used by `_calculate_shanten`, if any
+shanten_store: Optional[ShantenStore] = None
+checked_env = False
+
+def open_shanten_store(path: str, capacity: int = DEFAULT_CAPACITY) -> ShantenStore:
+    """Open (or create) the shanten store at `path` and use it for all future shanten calculations"""
+    global shanten_store
+    global checked_env
+    if shanten_store is not None:
+        shanten_store.close()
+    shanten_store = ShantenStore(path, capacity)
+    checked_env = True
+    return shanten_store
+
+def get_shanten_store() -> Optional[ShantenStore]:
+    """Get the current shanten store, opening the one specified by the `shanten_store` environment variable if needed"""
+    global checked_env
+    if not checked_env:
+        checked_env = True
+        path = os.getenv("shanten_store")
+        if path:
+            open_shanten_store(path)
+    return shanten_store
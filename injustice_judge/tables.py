@@ -0,0 +1,179 @@
+import functools
+from typing import *
+
+# This file contains the per-suit decomposition tables used by the shanten algorithm.
+#
+# Every suit of a hand is represented by a packed count vector: a base-5 number
+#   whose nth digit is the number of copies of tile n in that suit.
+#   For example, 1123m packs to 2 + 1*5 + 1*25 = 32.
+# Number suits use all 9 digits, and honors only ever use the first 7.
+#
+# Since a suit has a bounded number of shapes, every table here is finite.
+# Entries are computed the first time a suit shape is seen and never change
+#   afterwards, so each shape is decomposed at most once per process, no matter
+#   how many different hands it appears in.
+#
+# A summary:
+#     to_key/from_key: convert between a tuple of ranks (1123) and its packed key (32)
+#          all_groups: every way to remove as many groups as possible from a suit
+#         some_groups: every way to remove zero or more groups from a suit
+#        some_taatsus: every way to remove zero or more taatsus from a suit
+#         all_taatsus: every way to remove as many taatsus as possible from a suit
+#     taatsu_floating: (floating tiles, floating tiles given a pair) after removing all groups and some taatsus
+#         suit_summary: everything needed to calculate the shanten number of a hand, for one suit
+#         taatsu_waits: the waits of a suit made of only taatsus and pairs
+#          agari_shape: whether a suit can be completely split into groups, with or without a pair
+#          pair_shapes: every way to remove a pair from a suit
+#       complex_shapes: every way to remove a complex shape (like 112, 113, 135) from a suit
+
+# represents the shape of a single suit as a packed count vector
+SuitKey = int
+# represents a way to split a suit into two parts, as (part removed, remaining ranks)
+SuitSplit = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+# DIGIT[rank] is the value of one copy of that rank in a packed key
+DIGIT = (0, *(5**i for i in range(9)))
+
+to_key = lambda ranks: sum(DIGIT[rank] for rank in ranks)
+get_count = lambda key, rank: key // DIGIT[rank] % 5
+
+@functools.cache
+def from_key(key: SuitKey) -> Tuple[int, ...]:
+    """Unpack a key into a sorted tuple of ranks"""
+    return tuple(rank for rank in range(1, 10) for _ in range(get_count(key, rank)))
+
+@functools.cache
+def get_counts(key: SuitKey) -> Tuple[int, ...]:
+    """Unpack a key into a tuple of 9 counts"""
+    return tuple(get_count(key, rank) for rank in range(1, 10))
+
+# each pattern is (packed key of the pattern, ((rank, copies needed), ...))
+to_pattern = lambda *ranks: (to_key(ranks), tuple((rank, ranks.count(rank)) for rank in sorted(set(ranks))))
+TRIPLETS = tuple(to_pattern(rank, rank, rank) for rank in range(1, 10))
+SEQUENCES = tuple(to_pattern(rank, rank+1, rank+2) for rank in range(1, 8))
+TAATSUS = (*(to_pattern(rank, rank+2) for rank in range(1, 8)), *(to_pattern(rank, rank+1) for rank in range(1, 9)))
+# the patterns to remove for each (mode, is_honors)
+PATTERNS = {
+    ("groups", False): (*TRIPLETS, *SEQUENCES),
+    ("groups", True): TRIPLETS[:7],
+    ("taatsus", False): TAATSUS,
+    ("taatsus", True): (),  # honors have no taatsus
+}
+
+def remove_one(key: SuitKey, patterns: Tuple[Tuple[SuitKey, Tuple[Tuple[int, int], ...]], ...]) -> Set[SuitKey]:
+    """Return every key obtainable by removing exactly one of the given patterns from `key`"""
+    return {key - pattern for pattern, needed in patterns if all(get_count(key, rank) >= copies for rank, copies in needed)}
+
+@functools.cache
+def _leaves(key: SuitKey, mode: str, is_honors: bool) -> FrozenSet[SuitKey]:
+    # all shapes reachable by removing patterns until there are none left to remove
+    candidates = remove_one(key, PATTERNS[mode, is_honors])
+    return frozenset().union(*(_leaves(k, mode, is_honors) for k in candidates)) if len(candidates) > 0 else frozenset({key})
+
+@functools.cache
+def _reachable(key: SuitKey, mode: str, is_honors: bool) -> FrozenSet[SuitKey]:
+    # all shapes reachable by removing zero or more patterns
+    return frozenset({key}).union(*(_reachable(k, mode, is_honors) for k in remove_one(key, PATTERNS[mode, is_honors])))
+
+@functools.cache
+def _fewest_tiles(key: SuitKey, mode: str, is_honors: bool) -> FrozenSet[SuitKey]:
+    # the leaves with the least number of tiles, i.e. the ones with the most patterns removed
+    leaves = _leaves(key, mode, is_honors)
+    min_length = min(len(from_key(k)) for k in leaves)
+    return frozenset(k for k in leaves if len(from_key(k)) == min_length)
+
+all_groups   = lambda key, is_honors: _fewest_tiles(key, "groups", is_honors)
+some_groups  = lambda key, is_honors: _reachable(key, "groups", is_honors)
+all_taatsus  = lambda key, is_honors: _fewest_tiles(key, "taatsus", is_honors)
+some_taatsus = lambda key, is_honors: _reachable(key, "taatsus", is_honors)
+
+# floating tiles are tiles that we only have one copy of
+count_floating = lambda key: get_counts(key).count(1)
+has_pair = lambda key: 2 in get_counts(key)
+
+@functools.cache
+def taatsu_floating(key: SuitKey, is_honors: bool) -> Tuple[int, int]:
+    """
+    Remove all groups and then some taatsus from the given suit, and return
+      (the minimum number of floating tiles left,
+       the minimum number of floating tiles left among the results with a pair, or 99 if none)
+    """
+    hands = {k for g in all_groups(key, is_honors) for k in some_taatsus(g, is_honors)}
+    return min(map(count_floating, hands)), min(map(count_floating, filter(has_pair, hands)), default=99)
+
+# which ranks count as kokushi tiles in number suits and in honors
+KOKUSHI_RANKS = {False: (1, 9), True: (1, 2, 3, 4, 5, 6, 7)}
+
+@functools.cache
+def suit_summary(key: SuitKey, is_honors: bool) -> Tuple[int, ...]:
+    """
+    Summarize a suit for shanten number calculations. Returns:
+    (number of tiles after removing all groups, floating tiles, floating tiles given a pair,
+     number of tiles, number of tiles with 2+ copies, number of copies past 2,
+     number of distinct kokushi tiles, 1 if any tile has 2+ copies, 1 if any tile has 4 copies)
+    Other than the floating tile counts, every entry can be summed across suits.
+    """
+    counts = get_counts(key)
+    groupless_length = len(from_key(next(iter(all_groups(key, is_honors)))))
+    floating, pair_floating = taatsu_floating(key, is_honors)
+    return (groupless_length, floating, pair_floating,
+            sum(counts), sum(1 for c in counts if c >= 2), sum(c - 2 for c in counts if c > 2),
+            sum(1 for rank in KOKUSHI_RANKS[is_honors] if counts[rank-1] > 0), int(any(c > 1 for c in counts)), int(4 in counts))
+
+# the ranks waited on by the taatsu (rank, rank+1) and (rank, rank+2)
+RYANMEN_WAITS = {rank: frozenset({rank-1, rank+2} & set(range(1, 10))) for rank in range(1, 9)}
+KANCHAN_WAITS = {rank: frozenset({rank+1}) for rank in range(1, 8)}
+
+@functools.cache
+def taatsu_waits(key: SuitKey, is_honors: bool) -> Optional[FrozenSet[int]]:
+    """
+    Remove pairs and taatsus from the suit until at most one tile is left, and
+      return every rank waited on by the removed taatsus (pairs don't count),
+      over every way of doing so. Returns None if there's no way to do so.
+    """
+    if sum(get_counts(key)) <= 1:
+        return frozenset()
+    results = [taatsu_waits(key - 2*DIGIT[rank], is_honors) for rank in range(1, 10) if get_count(key, rank) >= 2]
+    if not is_honors:
+        for pattern, needed in TAATSUS:
+            if all(get_count(key, rank) >= copies for rank, copies in needed):
+                (rank, _), (other_rank, _) = needed
+                waits = taatsu_waits(key - pattern, is_honors)
+                results.append(None if waits is None else waits | (RYANMEN_WAITS if other_rank == rank + 1 else KANCHAN_WAITS)[rank])
+    possible_waits = [waits for waits in results if waits is not None]
+    return frozenset().union(*possible_waits) if len(possible_waits) > 0 else None
+
+@functools.cache
+def agari_shape(key: SuitKey, is_honors: bool) -> Tuple[bool, bool]:
+    """
+    Return (whether the suit splits entirely into groups,
+            whether the suit splits entirely into groups plus one pair)
+    A hand is a complete (non-chiitoitsu, non-kokushi) hand if exactly one of
+      its suits splits into groups plus a pair, and the rest split into groups.
+    """
+    is_groups = lambda k: 0 in all_groups(k, is_honors)
+    has_pair = any(is_groups(key - 2*DIGIT[rank]) for rank in range(1, 10) if get_count(key, rank) >= 2)
+    return is_groups(key), has_pair
+
+def remove_ranks(ranks: Tuple[int, ...], shape: Tuple[int, ...]) -> Optional[Tuple[int, ...]]:
+    """Remove every rank in `shape` from `ranks` (both sorted), or return None if some are missing"""
+    remaining = list(ranks)
+    for rank in shape:
+        if rank not in remaining:
+            return None
+        remaining.remove(rank)
+    return tuple(remaining)
+
+@functools.cache
+def pair_shapes(ranks: Tuple[int, ...]) -> FrozenSet[SuitSplit]:
+    """Every (pair, remaining ranks) obtainable by removing a pair from the given suit"""
+    return frozenset(((rank, rank), remaining) for rank in set(ranks) if (remaining := remove_ranks(ranks, (rank, rank))) is not None)
+
+# the complex shapes that start with a given rank: 112, 122, 113, 133, 135
+to_complex_shapes = lambda r: ((r,r,r+1), (r,r+1,r+1), (r,r,r+2), (r,r+2,r+2), (r,r+2,r+4))
+
+@functools.cache
+def complex_shapes(ranks: Tuple[int, ...]) -> FrozenSet[SuitSplit]:
+    """Every (complex shape, remaining ranks) obtainable by removing a complex shape from the given (number) suit"""
+    return frozenset((shape, remaining) for rank in set(ranks[:-2]) for shape in to_complex_shapes(rank)
+                                        if (remaining := remove_ranks(ranks, shape)) is not None)
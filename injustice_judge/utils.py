@@ -1,7 +1,10 @@
 import functools
 import itertools
 from .constants import MANZU, PINZU, SOUZU, JIHAI, PRED, SUCC, DORA, DORA_INDICATOR, TOGGLE_RED_FIVE, TRANSLATE, OYA_TSUMO_SCORE, KO_TSUMO_SCORE, OYA_RON_SCORE, KO_RON_SCORE
+from .tables import DIGIT, taatsu_waits
 from typing import *
+if TYPE_CHECKING:
+    from .classes import TileCounts
 
 # This file contains a bunch of utility functions that don't really belong anywhere else.
 
@@ -10,7 +13,22 @@ normalize_red_fives = lambda hand: map(normalize_red_five, hand)
 sorted_hand = lambda hand: tuple(sorted(hand, key=normalize_red_five))
 is_mangan = lambda han, fu: han == 5 or (han >= 4 and fu >= 40) or (han >= 3 and fu >= 70)
 
-@functools.cache
+# Every cache of hand-dependent results is a bounded lru_cache, registered here so
+#   that its size and hit rate can be read at runtime with `get_cache_info`.
+# (The per-suit tables in tables.py are unbounded, but finite, so they aren't included.)
+CACHES: Dict[str, Any] = {}
+def bounded_cache(maxsize: int) -> Callable[[Callable[..., Any]], Any]:
+    """Same as functools.lru_cache(maxsize), but registers the cache in CACHES"""
+    def decorator(fn: Callable[..., Any]) -> Any:
+        cached_fn = functools.lru_cache(maxsize=maxsize)(fn)
+        CACHES[f"{fn.__module__}.{fn.__name__}"] = cached_fn
+        return cached_fn
+    return decorator
+def get_cache_info() -> Dict[str, Any]:
+    """Return {cache name: (hits, misses, maxsize, currsize)} for every registered cache"""
+    return {name: fn.cache_info() for name, fn in CACHES.items()}
+
+@bounded_cache(maxsize=65536)
 def try_remove_all_tiles(hand: Tuple[int, ...], tiles: Tuple[int, ...]) -> Tuple[int, ...]:
     """
     Tries to remove all of `tiles` from `hand`. If it can't, returns `hand` unchanged
@@ -56,29 +74,47 @@ def get_taatsu_wait(taatsu: Tuple[int, ...]) -> Set[int]:
     t1, t2 = normalize_red_fives(taatsu)
     return {PRED[t1], SUCC[t2]} - {0} if SUCC[t1] == t2 else {SUCC[t1]} if SUCC[SUCC[t1]] == t2 else set()
 
-@functools.lru_cache(maxsize=2048)
+# Manzu, pinzu, and souzu are interchangeable when it comes to shanten and waits,
+#   so 123m and 123p should share a cache entry. To do that, we sort the three
+#   number suits of a hand into a canonical order before using it as a cache key,
+#   and then map the result back to the original suits.
+# A suit ordering is a tuple `order` where order[i] is the original suit (0-2)
+#   that becomes suit i in the canonical hand.
+SUIT_ORDERS = tuple(itertools.permutations(range(3)))
+# PERMUTE_SUITS[order][tile] = tile moved to its canonical suit
+# UNPERMUTE_SUITS[order][tile] = canonical tile moved back to its original suit
+_all_tiles = (*range(11,20), *range(21,30), *range(31,40), *range(41,48), 51, 52, 53)
+_suit_of = lambda tile: tile - 51 if tile in {51,52,53} else tile // 10 - 1
+_move_suit = lambda tile, suit: 51 + suit if tile in {51,52,53} else 10 * (suit + 1) + tile % 10
+PERMUTE_SUITS = {order: {tile: tile if tile in JIHAI else _move_suit(tile, order.index(_suit_of(tile))) for tile in _all_tiles} for order in SUIT_ORDERS}
+UNPERMUTE_SUITS = {order: {v: k for k, v in PERMUTE_SUITS[order].items()} for order in SUIT_ORDERS}
+
+def get_canonical_suit_order(hand: Iterable[int]) -> Tuple[int, ...]:
+    """Get the order of number suits that makes `hand` canonical (see above)"""
+    # describe each suit by its ranks, where red five is rank 0
+    shapes: Tuple[List[int], ...] = ([], [], [])
+    for tile in hand:
+        if tile not in JIHAI:
+            shapes[_suit_of(tile)].append(0 if tile in {51,52,53} else tile % 10)
+    return tuple(sorted(range(3), key=lambda suit: sorted(shapes[suit])))
+
 def get_waits(hand: Tuple[int, ...]) -> Set[int]:
     """Get all waits in a hand full of taatsus and no floating tiles, excluding pair waits"""
-    hand = sorted_hand(hand)
-
-    # parse out all the taatsus
+    # taatsus and pairs never span suits, so look up each suit's waits separately (see `taatsu_waits`)
+    keys = [0, 0, 0, 0]
+    lengths = [0, 0, 0, 0]
+    for tile in normalize_red_fives(hand):
+        keys[tile//10 - 1] += DIGIT[tile%10]
+        lengths[tile//10 - 1] += 1
+    # a suit with an odd number of tiles always has a tile left over, and we can only have one
+    if sum(length % 2 for length in lengths) > 1:
+        return set()
     waits = set()
-    to_update: Set[Tuple[Tuple[int, ...], Tuple[Tuple[int, int], ...]]] = {(hand, ())}
-    while len(to_update) > 0:
-        hand, taatsus = to_update.pop()
-        if len(hand) <= 1: # done
-            waits |= set().union(*map(get_taatsu_wait, taatsus))
-            continue
-        # try to find pairs, ryanmens, and kanchans, using every tile in the hand
-        for i, tile in enumerate(hand):
-            if tile in (*hand[:i], *hand[i+1:]): # pair, ignore
-                to_update.add((try_remove_all_tiles(hand, (tile, tile)), taatsus))
-            if SUCC[tile] in hand:
-                taatsu = (tile, SUCC[tile])
-                to_update.add((try_remove_all_tiles(hand, taatsu), (*taatsus, taatsu)))
-            if SUCC[SUCC[tile]] in hand:
-                taatsu = (tile, SUCC[SUCC[tile]])
-                to_update.add((try_remove_all_tiles(hand, taatsu), (*taatsus, taatsu)))
+    for i, key in enumerate(keys):
+        suit_waits = taatsu_waits(key, i == 3)
+        if suit_waits is None:
+            return set()
+        waits |= {10*(i+1) + rank for rank in suit_waits}
     return waits
 
 def calc_ko_oya_points(total_points: int, num_players: int, is_dealer: bool) -> Tuple[int, int]:
@@ -100,7 +136,7 @@ def to_dora_indicator(dora: int, num_players: int) -> int:
 
 SUJI_VALUES = {1: (4,), 2: (5,), 3: (6,), 4: (1,7), 5: (2,8), 6: (3,9), 7: (4,), 8: (5,), 9: (6,)}
 SUJI = {k+n: tuple(x+n for x in v) for k, v in SUJI_VALUES.items() for n in {10,20,30}}
-def is_safe(tile: int, opponent_genbutsu: Set[int], visible_tiles: List[int]) -> bool:
+def is_safe(tile: int, opponent_genbutsu: Set[int], visible_counts: "TileCounts") -> bool:
     """Returns true if the tile is any of genbutsu/suji/one-chance."""
     # genbutsu
     if tile in opponent_genbutsu:
@@ -113,23 +149,21 @@ def is_safe(tile: int, opponent_genbutsu: Set[int], visible_tiles: List[int]) ->
         # check all possible taatsu waiting on this tile
         # if every taatsu is one-chance or no-chance then consider it safe
         possible_taatsus = ((PRED[PRED[tile]], PRED[tile]), (PRED[tile], SUCC[tile]), (SUCC[tile], SUCC[SUCC[tile]]))
-        if all(any(visible_tiles.count(tile) >= 3 for tile in taatsu) for taatsu in possible_taatsus if 0 not in taatsu):
+        if all(any(visible_counts.count(tile) >= 3 for tile in taatsu) for taatsu in possible_taatsus if 0 not in taatsu):
             return True
     else:
         # check if there's 3 copies already
-        if visible_tiles.count(tile) >= 3:
+        if visible_counts.count(tile) >= 3:
             return True
 
     return False
 
+def load_cache(filename: str) -> bytes:
+    """Load data from a cache file, raising FileNotFoundError if it isn't cached"""
+    from .game_cache import get_game_cache
+    return get_game_cache().load(filename)
+
 def save_cache(filename: str, data: bytes) -> None:
     """Save data to a cache file"""
-    import os
-    # make sure the cache directory exists
-    if not os.path.isdir("cached_games"):
-        os.mkdir("cached_games")
-    # make sure we have enough space
-    dir_size = sum(os.path.getsize(os.path.join(dirpath, f)) for dirpath, _, filenames in os.walk("cached_games") for f in filenames)
-    if dir_size < (1024 ** 3): # 1GB
-        with open(f"cached_games/{filename}", "wb") as file:
-            file.write(data)
+    from .game_cache import get_game_cache
+    get_game_cache().save(filename, data)
@@ -1,7 +1,8 @@
+import os
 from typing import *
 from .classes import CallInfo, GameRules, Interpretation
-from .classes2 import Kyoku, Hand, Score
-from .constants import Event, Shanten, YakuForWait, DOUBLE_YAKUMAN, LIMIT_HANDS, YAOCHUUHAI
+from .classes2 import Kyoku, KyokuTimeline, Hand, Score, YakuState
+from .constants import Shanten, YakuForWait, DOUBLE_YAKUMAN, LIMIT_HANDS, YAOCHUUHAI
 from .display import ph, pt, round_name, shanten_name
 from .utils import get_score, get_taatsu_wait, is_mangan, normalize_red_five, normalize_red_fives, sorted_hand
 from pprint import pprint
@@ -235,54 +236,24 @@ def get_stateless_yaku(interpretation: Interpretation, shanten: Shanten, is_clos
 # this will always output houtei for haitei hands; add_tsumo_yaku will make it haitei
 def add_stateful_yaku(yaku_for_wait: YakuForWait,
                       hand: Hand,
-                      events: List[Event],
+                      yaku_state: YakuState,
                       doras: List[int],
                       uras: List[int],
                       round: int,
                       seat: int,
                       yakuhai: Tuple[int, ...],
                       is_last_tile: bool) -> YakuForWait:
-    is_closed_hand = len(hand.closed_part) == 13
     ctr = Counter(hand.tiles)
     waits = set(yaku_for_wait.keys())
-    # this is kind of a state machine over the events to figure out five yaku
-    # first state machine checks for self-riichis, self-discards, and all calls
-    # - riichi: check if there is a self-riichi event anywhere
-    # - double riichi: check if no discard event before a self-riichi event
-    # - ippatsu: check if there is are no call events or self-discard events after self-riichi
-    # second state machine checks for kans and draws and discards
-    # - chankan: check if there is any kakan and no draw after it
-    # - rinshan: check if there is any kan, then a draw, and no discard after it
-    double_riichi_eligible = True
-    is_ippatsu = False
-    is_chankan = False
-    is_rinshan = False
-    for event_seat, event_type, *event_data in events:
-        if event_seat != seat and event_type == "draw": # someone draws
-            if is_chankan:
-                is_ippatsu = False # kakan call succeeded
-            is_chankan = False
-        elif event_seat == seat and event_type == "discard": # self discard
-            double_riichi_eligible = False
-            is_ippatsu = False
-            is_rinshan = False
-        elif is_closed_hand and event_seat == seat and event_type == "riichi": # self riichi
-            is_ippatsu = True
-            is_rinshan = False
-            for wait in waits:
-                if double_riichi_eligible:
-                    yaku_for_wait[wait].append(("double riichi", 2))
-                else:
-                    yaku_for_wait[wait].append(("riichi", 1))
-        elif event_seat != seat and event_type == "kakan": # someone kakans
-            # ippatsu isn't cancelled yet; wait for a draw
-            is_chankan = True
-        elif event_seat != seat and event_type in {"chii", "pon", "minkan", "ankan", "kita"}: # any non-kakan call
-            double_riichi_eligible = False
-            is_ippatsu = False
-        elif event_seat == seat and event_type in {"minkan", "ankan", "kakan", "kita"}: # self kan
-            double_riichi_eligible = False
-            is_rinshan = True
+    # riichi, double riichi, ippatsu, chankan, and rinshan are all read off of
+    #   the kyoku's timeline (see KyokuTimeline in classes2.py)
+    riichis, _, is_ippatsu, is_chankan, is_rinshan = yaku_state
+    for is_double_riichi in riichis:
+        for wait in waits:
+            if is_double_riichi:
+                yaku_for_wait[wait].append(("double riichi", 2))
+            else:
+                yaku_for_wait[wait].append(("riichi", 1))
     if is_ippatsu:
         for wait in waits:
             yaku_for_wait[wait].append(("ippatsu", 1))
@@ -391,7 +362,7 @@ def add_tsumo_yaku(yaku_for_wait: YakuForWait, interpretation: Interpretation, i
 CheckYakumanFunc = Callable[[Hand], bool]
 
 # daisangen tenpai if we have 8 tiles of dragons (counting each dragon at most 3 times)
-is_daisangen: CheckYakumanFunc = lambda hand: sum(min(3, hand.tiles.count(tile)) for tile in {45,46,47}) >= 8
+is_daisangen: CheckYakumanFunc = lambda hand: sum(min(3, hand.counts.count(tile)) for tile in {45,46,47}) >= 8
 
 # kokushi musou tenpai if we have at least 12 terminal/honors
 is_kokushi: CheckYakumanFunc = lambda hand: len(YAOCHUUHAI.intersection(hand.tiles)) >= 12
@@ -402,11 +373,11 @@ is_suuankou: CheckYakumanFunc = lambda hand: all(call.type == "ankan" for call i
 
 # shousuushi if we have exactly 10 winds (counting each wind at most 3 times)
 # OR 11 tiles of winds + no pair (i.e. only 6 kinds of tiles in hand)
-is_shousuushi: CheckYakumanFunc = lambda hand: (count := sum(min(3, hand.tiles.count(tile)) for tile in {41,42,43,44}), count == 10 or count == 11 and len(set(normalize_red_fives(hand.tiles))) == 6)[1]
+is_shousuushi: CheckYakumanFunc = lambda hand: (count := sum(min(3, hand.counts.count(tile)) for tile in {41,42,43,44}), count == 10 or count == 11 and len(set(normalize_red_fives(hand.tiles))) == 6)[1]
 
 # daisuushi if we have 12 tiles of winds (counting each wind at most 3 times)
 # OR 11 tiles of winds + a pair (i.e. only 5 kinds of tiles in hand)
-is_daisuushi: CheckYakumanFunc = lambda hand: (count := sum(min(3, hand.tiles.count(tile)) for tile in {41,42,43,44}), count == 12 or count == 11 and len(set(normalize_red_fives(hand.tiles))) == 5)[1]
+is_daisuushi: CheckYakumanFunc = lambda hand: (count := sum(min(3, hand.counts.count(tile)) for tile in {41,42,43,44}), count == 12 or count == 11 and len(set(normalize_red_fives(hand.tiles))) == 5)[1]
 
 # tsuuiisou tenpai if all the tiles are honor tiles
 is_tsuuiisou: CheckYakumanFunc = lambda hand: set(hand.tiles).issubset({41,42,43,44,45,46,47})
@@ -450,7 +421,7 @@ def get_yakuman_waits(hand: Hand, name: str) -> Set[int]:
         # get only the relevant wait
         shousuushi_waits = set()
         daisuushi_waits = set()
-        num_winds = sum(min(3, hand.tiles.count(tile)) for tile in {41,42,43,44})
+        num_winds = sum(min(3, hand.counts.count(tile)) for tile in {41,42,43,44})
         if num_winds == 10:
             shousuushi_waits = {41,42,43,44} & set(hand.shanten[1])
         elif num_winds == 11:
@@ -517,7 +488,7 @@ def test_get_yakuman_tenpais() -> None:
 
 def add_yakuman(yaku_for_wait: YakuForWait,
                 hand: Hand,
-                events: List[Event],
+                tenhou_eligible: bool,
                 round: int,
                 seat: int,
                 is_tsumo: bool,
@@ -529,14 +500,6 @@ def add_yakuman(yaku_for_wait: YakuForWait,
 
     # tenhou, chiihou: tsumo, and we never discarded + no calls happened
     # renhou: same, but not tsumo
-    tenhou_eligible = True
-    for event_seat, event_type, *event_data in events:
-        if seat == event_seat and event_type == "discard":
-            tenhou_eligible = False
-            break
-        elif event_type in {"chii", "pon", "minkan", "ankan", "kakan", "kita"}:
-            tenhou_eligible = False
-            break
     if tenhou_eligible:
         if is_tsumo: # tenhou/chiihou
             if is_dealer:
@@ -568,12 +531,12 @@ def add_yakuman(yaku_for_wait: YakuForWait,
             # handle yasume possibilities
 
             # daisangen with 2 dragon triplets, you shanpon wait on the third but get the non-dragon wait
-            num_dragons = sum(min(3, tiles.count(tile)) for tile in {45,46,47})
+            num_dragons = sum(min(3, hand.counts.count(tile)) for tile in {45,46,47})
             if "daisangen" in actual_yakumans and num_dragons == 8 and wait not in {45,46,47}:
                 actual_yakumans.remove("daisangen")
 
             # daisuushi with 11 winds, you shanpon wait on the final wind but get the non-wind wait
-            num_winds = sum(min(3, tiles.count(tile)) for tile in {41,42,43,44})
+            num_winds = sum(min(3, hand.counts.count(tile)) for tile in {41,42,43,44})
             if "daisuushi" in actual_yakumans and num_winds == 11 and wait not in {41,42,43,44}:
                 actual_yakumans.remove("daisuushi")
                 actual_yakumans.add("shousuushi")
@@ -605,7 +568,7 @@ def add_yakuman(yaku_for_wait: YakuForWait,
 ###
 
 def get_yaku(hand: Hand,
-             events: List[Event],
+             timeline: KyokuTimeline,
              doras: List[int],
              uras: List[int],
              round: int,
@@ -614,7 +577,12 @@ def get_yaku(hand: Hand,
              num_players: int,
              rules: GameRules,
              check_rons: bool = True,
-             check_tsumos: bool = True) -> Dict[int, Score]:
+             check_tsumos: bool = True,
+             position: Optional[int] = None) -> Dict[int, Score]:
+    """
+    Get the best score for each wait of a tenpai hand, given the kyoku's timeline.
+    Pass `position` to only consider the first `position` events of the kyoku.
+    """
     if hand.shanten[0] != 0:
         return {}
 
@@ -640,21 +608,25 @@ def get_yaku(hand: Hand,
     if not rules.double_wind_4_fu:
         yakuhai = tuple(set(yakuhai)) # remove duplicates
     is_closed_hand = len(hand.closed_part) == 13
+    is_debug = bool(os.getenv("debug"))
+    yaku_state = timeline.get_yaku_state(seat, is_closed_hand, position)
+    tenhou_eligible = timeline.is_tenhou_eligible(seat, position)
 
     def process_interpretation(interpretation: Interpretation):
+        debug_info = (interpretation, hand) if is_debug else ()
         # print("========")
         # for k, v in best_score.items():
         #     print(f"{pt(k)}, {v.hand!s}, {v.yaku}")
         yaku_for_wait: YakuForWait = get_stateless_yaku(interpretation, hand.shanten, is_closed_hand)
         # pprint(yaku_for_wait)
-        yaku_for_wait = add_stateful_yaku(yaku_for_wait, hand, events, doras, uras, round, seat, yakuhai, is_last_tile)
+        yaku_for_wait = add_stateful_yaku(yaku_for_wait, hand, yaku_state, doras, uras, round, seat, yakuhai, is_last_tile)
         # print(round_name(round, 0), yaku_for_wait)
         # pprint([(a, b) for a, b, *_ in events])
         if check_tsumos:
             tsumo_yaku = add_tsumo_yaku(yaku_for_wait.copy(), interpretation, is_closed_hand)
-            tsumo_yaku = add_yakuman(yaku_for_wait, hand, events, round, seat, is_tsumo=True, use_renhou=rules.renhou)
+            tsumo_yaku = add_yakuman(yaku_for_wait, hand, tenhou_eligible, round, seat, is_tsumo=True, use_renhou=rules.renhou)
             # pprint(tsumo_yaku)
-        yaku_for_wait = add_yakuman(yaku_for_wait, hand, events, round, seat, is_tsumo=False, use_renhou=rules.renhou)
+        yaku_for_wait = add_yakuman(yaku_for_wait, hand, tenhou_eligible, round, seat, is_tsumo=False, use_renhou=rules.renhou)
 
         # if `interpretations.hand` is a pair, it's a shanpon wait
         # if it's a terminal pair then it's +4 fu for ron and +8 for tsumo
@@ -674,23 +646,24 @@ def get_yaku(hand: Hand,
                 han = sum(b for _, b in yaku_for_wait[wait])
                 ron_fu = interpretation.ron_fu + shanpon_fu[wait]
                 fixed_fu = fixed_fu or (30 if ron_fu == 20 else None) # open pinfu ron = 30
-                add_best_score(wait, Score(yaku_for_wait[wait], han, fixed_fu or round_fu(ron_fu), seat == round%4, False, num_players, rules, interpretation, hand))
+                add_best_score(wait, Score(yaku_for_wait[wait], han, fixed_fu or round_fu(ron_fu), seat == round%4, False, num_players, rules, *debug_info))
             if check_tsumos:
                 han = sum(b for _, b in tsumo_yaku[wait])
                 if is_closed_hand:
                     tsumo_fu = interpretation.tsumo_fu + 2*shanpon_fu[wait]
                     fixed_fu = fixed_fu or (20 if ("pinfu", 1) in tsumo_yaku[wait] else None) # closed pinfu tsumo = 20
-                    add_best_score(wait, Score(tsumo_yaku[wait], han, fixed_fu or round_fu(tsumo_fu), seat == round%4, True, num_players, rules, interpretation, hand))
+                    add_best_score(wait, Score(tsumo_yaku[wait], han, fixed_fu or round_fu(tsumo_fu), seat == round%4, True, num_players, rules, *debug_info))
                 else:
                     tsumo_fu = interpretation.tsumo_fu + 2*shanpon_fu[wait]
-                    add_best_score(wait, Score(tsumo_yaku[wait], han, fixed_fu or round_fu(tsumo_fu), seat == round%4, True, num_players, rules, interpretation, hand))
+                    add_best_score(wait, Score(tsumo_yaku[wait], han, fixed_fu or round_fu(tsumo_fu), seat == round%4, True, num_players, rules, *debug_info))
         # for k, v in best_score.items():
         #     print(f"{pt(k)}, {v!s}")
         # print("========")
 
-    is_tenhou = not any(event_type == "discard" for _, event_type, *_ in events)
+    is_tenhou = timeline.no_discards_yet(position)
     if is_tenhou: # for tenhou we'll try every possible wait
-        tenhou_draw = next(event_data[0] for _, event_type, *event_data in events if event_type == "draw")
+        tenhou_draw = timeline.get_first_draw()
+        assert tenhou_draw is not None, "got a tenhou hand without any draws"
         tiles = tuple(sorted_hand((*hand.tiles, tenhou_draw)))
         for i in range(len(tiles)):
             for interpretation in Interpretation((*tiles[:i], *tiles[i+1:]), calls=()) \
@@ -708,7 +681,7 @@ def get_final_yaku(kyoku: Kyoku,
                    check_tsumos: bool = True) -> Dict[int, Score]:
     assert kyoku.hands[seat].shanten[0] == 0, f"on {round_name(kyoku.round, kyoku.honba)}, get_seat_yaku was passed in seat {seat}'s non-tenpai hand {kyoku.hands[seat]!s} ({shanten_name(kyoku.hands[seat].shanten)})"
     ret = get_yaku(hand = kyoku.hands[seat],
-                   events = kyoku.events,
+                   timeline = kyoku.timeline,
                    doras = kyoku.doras,
                    uras = kyoku.uras,
                    round = kyoku.round,
@@ -1,10 +1,17 @@
 import asyncio
 from injustice_judge import analyze_game
+from injustice_judge.fetch import close_majsoul_session
 from typing import *
 import sys
 
 import argparse
 
+async def run(link: str, players: Set[int], mode: Set[str]) -> List[str]:
+    try:
+        return await analyze_game(link, players, look_for=mode)
+    finally:
+        await close_majsoul_session()
+
 def main():
 
     parser = argparse.ArgumentParser(description='Analyzes your Mahjong Soul, tenhou.net, or Riichi City game to find instances of mahjong injustice.')
@@ -12,6 +19,7 @@ def main():
     parser.add_argument('-l', '--link', type=str, help='Link to game log', required=True)
     parser.add_argument('-p', '--players', type=int, nargs='*',  help='Number of seat: 0 = East, 1 = South, 2 = West, 3 = North', default=[], choices=[0, 1, 2, 3])
     parser.add_argument('-m', '--mode', type=str, help='Output mode', choices=['skill', 'injustice', 'both'], default='injustice')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', metavar='FILE', help='Print a profiling report after analysis, or dump it as JSON to FILE')
 
     args = parser.parse_args()
     link = args.link
@@ -22,12 +30,23 @@ def main():
     else:
         mode = {args.mode,}
 
-    print("\n".join(asyncio.run(analyze_game(link, players, look_for=mode))))
+    if args.profile is not None:
+        from injustice_judge.profiler import enable_profiling
+        profiler = enable_profiling()
+
+    print("\n".join(asyncio.run(run(link, players, mode))))
+
+    if args.profile == '-':
+        print(profiler.to_str(), file=sys.stderr)
+    elif args.profile is not None:
+        import json
+        with open(args.profile, "w") as file:
+            json.dump(profiler.report(), file, indent=2)
     # print("\n".join(asyncio.run(analyze_game(link, players, look_for={"skill"}))))
     # print("\n".join(asyncio.run(analyze_game(link, players))))
 
-    # from injustice_judge.shanten import pair_shapes, complex_shapes
-    # print(len(pair_shapes), len(complex_shapes))
+    # from injustice_judge.utils import get_cache_info
+    # print(get_cache_info())
 
     # from injustice_judge.yaku import test_get_yakuman_tenpais
     # test_get_yakuman_tenpais()
@@ -109,12 +128,6 @@ def main():
     # assert calculate_shanten((13,16,18,19,27,28,31,35,38,42,44,45,46))[0] == 6   # 3689m78p158s2456z  6-shanten
     # assert calculate_shanten((12,15,51,23,25,33,39,41,42,44,45,45,46))[0] == 4   # 150m25p39s124556z  4-shanten for chiitoitsu
 
-    # from injustice_judge.shanten import _calculate_shanten
-    # print(_calculate_shanten.cache_info())
-    # from injustice_judge.shanten import timers
-    # from pprint import pprint
-    # pprint(timers)
-
     # unused:
     # this is perfect headless, but we don't rly count it as such
     # cause checking perfect headless hands is too expensive